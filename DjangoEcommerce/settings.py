@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,7 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.metrics.MetricsMiddleware',
+    'shop.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'shop.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,7 +59,7 @@ ROOT_URLCONF = 'DjangoEcommerce.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'shop.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,13 +79,122 @@ WSGI_APPLICATION = 'DjangoEcommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Applied to every new connection through init_command.
+SHOP_SQLITE_PRAGMAS = {
+    # Readers and the writer no longer block each other.
+    'journal_mode': 'WAL',
+    # fsync at checkpoints only; with WAL a crash can lose the last commits but
+    # never corrupts the database.
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB, per connection.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 plus a per-process FIFO queue for write
+        # transactions; see shop.sqlite_backend.base.
+        'ENGINE': 'shop.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep each thread's connection across requests instead of reopening it.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # atomic() takes the write lock at BEGIN, so writers queue up
+            # instead of deadlocking on an upgraded read lock.
+            'transaction_mode': 'IMMEDIATE',
+            # Seconds a writer waits for the lock (busy timeout and write queue).
+            'timeout': 20,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SHOP_SQLITE_PRAGMAS.items()),
+        },
+    }
+}
+
+# Optional read replica serving catalog reads (see shop.routers). Locally it can
+# be a read-only SQLite snapshot of the primary refreshed by
+# ``manage.py sync_replica --interval 10``.
+SHOP_REPLICA_PATH = os.environ.get('SHOP_REPLICA_PATH')
+if SHOP_REPLICA_PATH:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{SHOP_REPLICA_PATH}?mode=ro',
+        'OPTIONS': {'uri': True},
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['shop.routers.PrimaryReplicaRouter']
+SHOP_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# How long a client reads only from the primary after it writes, and everyone
+# does after a catalog change; must exceed the replicas' lag. Catalog changes
+# are seen across workers through the shop_catalogversion row unless the
+# default cache below is shared.
+SHOP_REPLICA_PIN_SECONDS = 30
+# How long a failed replica is left out of rotation.
+SHOP_REPLICA_RETRY_SECONDS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Local memory is per process; point this at a shared backend (Redis, Memcached)
+# in production so fragment and cart caches agree across workers; the
+# fragment_cache_stats counters also live here and need it shared.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop',
+    },
+    # Sessions (and so carts) live here first when this is shared by every
+    # worker; a local-memory cache makes shop/sessions.py use the database.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    },
 }
 
+SESSION_ENGINE = 'shop.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+# Keep sessions in the cache and write them to the database in batches. None
+# turns this on only when the 'sessions' cache is not local memory.
+SHOP_SESSION_WRITE_BEHIND = None
+# Seconds between write-behind flushes of changed sessions to the database.
+SHOP_SESSION_FLUSH_INTERVAL = 5
+SHOP_SESSION_PURGE_BATCH_SIZE = 1000
+
+# Route the catalog and cart pages to shop.async_views. Only worth it when
+# serving DjangoEcommerce.asgi; under WSGI each async view runs in its own loop.
+SHOP_ASYNC_VIEWS = False
+
+SHOP_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Request metrics are kept per process. With several gunicorn workers, point this
+# at a directory shared by them (emptied on deploy) so /metrics reports the sum.
+SHOP_METRICS_DIR = None
+# /metrics answers 403 unless the request sends "Authorization: Bearer <token>"
+# with this token or comes from one of these addresses or networks
+# (e.g. ["10.0.0.0/8"] for the Prometheus scraper). Behind a reverse proxy on
+# the same host every request comes from 127.0.0.1, so prefer the token there.
+SHOP_METRICS_TOKEN = None
+SHOP_METRICS_ALLOWED_IPS = []
+
+# Background tasks (shop/tasks.py), run by ``manage.py run_worker``.
+SHOP_TASK_MAX_ATTEMPTS = 5
+# Seconds before the first retry of a failed task; doubles with each attempt.
+SHOP_TASK_RETRY_DELAY = 10
+# A running task is handed to another worker when its worker has not finished it by then.
+SHOP_TASK_LEASE_SECONDS = 300
+# After an order, rebuild the recommendations at most once per this many
+# seconds (None leaves it to the nightly build_recommendations).
+SHOP_RECOMMENDATIONS_REBUILD_DELAY = 60 * 60
+
+# Requests carrying a signed token (see /admin/profiles/) are always profiled;
+# SHOP_PROFILE_SAMPLE_RATE additionally profiles that fraction of all requests.
+SHOP_PROFILE_DIR = BASE_DIR / 'profiles'
+SHOP_PROFILE_SAMPLE_RATE = 0.0
+SHOP_PROFILE_MAX_FILES = 200
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -120,6 +233,11 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Hashed file names plus .gz/.br copies; build them with ``manage.py build_assets``.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'shop.storage.CompressedManifestStaticFilesStorage'},
+}
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
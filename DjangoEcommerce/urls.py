@@ -6,8 +6,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from shop.admin import profile_detail_view, profile_list_view
+from shop.metrics import metrics_view
+
 urlpatterns = [
+    path("admin/profiles/", admin.site.admin_view(profile_list_view), name="admin_profiles"),
+    path("admin/profiles/<str:profile_id>/", admin.site.admin_view(profile_detail_view), name="admin_profile"),
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("", include("shop.urls")),
 ]
 
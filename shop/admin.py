@@ -1,5 +1,29 @@
-from django.contrib import admin
-from .models import Category, Product, ProductImage, Order, OrderItem
+import re
+from decimal import Decimal
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+from . import bulk, exports, profiling, search
+from .models import Category, Product, ProductImage, ProductSales, Order, OrderItem, Task
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow without bound.
+
+    One estimated or cached count instead of two exact ``COUNT(*)`` per page
+    view; subclasses join what ``list_display`` shows.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class ProductImageInline(admin.TabularInline):
@@ -7,33 +31,238 @@ class ProductImageInline(admin.TabularInline):
     extra = 1
 
 
+class RepriceForm(forms.Form):
+    mode = forms.ChoiceField(label="نوع تغییر", choices=[("percent", "درصد"), ("amount", "مبلغ ثابت")])
+    value = forms.DecimalField(label="مقدار", max_digits=12, decimal_places=4,
+                               help_text="مثبت برای افزایش و منفی برای کاهش؛ ۱۰ با نوع درصد یعنی ۱۰٪ گران‌تر")
+    round_to = forms.DecimalField(label="گرد کردن به مضرب", required=False, min_value=Decimal("0.01"),
+                                  max_digits=10, decimal_places=2)
+
+    def clean(self):
+        data = super().clean()
+        if data.get("mode") == "percent" and data.get("value") is not None and data["value"] <= -100:
+            raise forms.ValidationError("کاهش قیمت باید کمتر از ۱۰۰٪ باشد.")
+        return data
+
+
+class SaleForm(forms.Form):
+    percent = forms.DecimalField(label="درصد تخفیف", min_value=Decimal("0.01"), max_value=Decimal("99.99"),
+                                 max_digits=4, decimal_places=2)
+    round_to = forms.DecimalField(label="گرد کردن به مضرب", required=False, min_value=Decimal("0.01"),
+                                  max_digits=10, decimal_places=2)
+
+
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ("name", "category", "price", "is_active", "created_at")
     list_filter = ("category", "is_active")
-    search_fields = ("name", "description")
+    list_select_related = ("category",)
+    # Searched by get_search_results below; listed so the changelist shows the box.
+    search_fields = ("name",)
+    search_help_text = "ابتدای نام محصول، یا واژه‌ای از نام و توضیحات محصولات فعال"
+    date_hierarchy = "created_at"
+    autocomplete_fields = ("category",)
     prepopulated_fields = {"slug": ("name",)}
     inlines = [ProductImageInline]
+    # Set-based edits from shop.bulk; with "select all" they cover the whole filtered changelist.
+    actions = ["reprice", "start_sale", "end_sale", "activate", "deactivate"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Two index lookups instead of an icontains scan: a name prefix on
+        # product_name_prefix_idx, which covers inactive products, and the
+        # storefront full-text index, which holds the active ones.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        matches = Q(name__istartswith=term)
+        if search.is_enabled():
+            matches |= search.matching(term)
+        return queryset.filter(matches), False
+
+    def _report(self, request, updated: int):
+        self.message_user(request, f"{updated} محصول به‌روز شد.", messages.SUCCESS)
+
+    def _with_form(self, request, queryset, form_class, title, apply):
+        """Ask for the action's parameters on an intermediate page, then ``apply(queryset, cleaned_data)``."""
+        form = form_class(request.POST if "apply" in request.POST else None)
+        if form.is_valid():
+            self._report(request, apply(queryset, form.cleaned_data))
+            return None
+        context = {
+            **self.admin_site.each_context(request),
+            "title": title,
+            "opts": self.model._meta,
+            "form": form,
+            "count": queryset.count(),
+            "action": request.POST["action"],
+            "select_across": request.POST.get("select_across") == "1",
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        }
+        return TemplateResponse(request, "admin/shop/product/bulk_action.html", context)
+
+    @admin.action(description="تغییر قیمت محصولات انتخاب‌شده", permissions=["change"])
+    def reprice(self, request, queryset):
+        def apply(products, data):
+            change = {data["mode"]: data["value"]}
+            return bulk.reprice(products, round_to=data["round_to"], **change)
+
+        return self._with_form(request, queryset, RepriceForm, "تغییر گروهی قیمت", apply)
+
+    @admin.action(description="شروع حراج برای محصولات انتخاب‌شده", permissions=["change"])
+    def start_sale(self, request, queryset):
+        def apply(products, data):
+            return bulk.start_sale(products, data["percent"], round_to=data["round_to"])
+
+        return self._with_form(request, queryset, SaleForm, "شروع حراج", apply)
+
+    @admin.action(description="پایان حراج و بازگرداندن قیمت قبلی", permissions=["change"])
+    def end_sale(self, request, queryset):
+        self._report(request, bulk.end_sale(queryset))
+
+    @admin.action(description="فعال کردن محصولات انتخاب‌شده", permissions=["change"])
+    def activate(self, request, queryset):
+        self._report(request, bulk.set_active(queryset, True))
+
+    @admin.action(description="غیرفعال کردن محصولات انتخاب‌شده", permissions=["change"])
+    def deactivate(self, request, queryset):
+        self._report(request, bulk.set_active(queryset, False))
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "slug")
+    search_fields = ("name",)
     prepopulated_fields = {"slug": ("name",)}
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
+    autocomplete_fields = ("product",)
     readonly_fields = ("name", "price", "quantity")
 
 
+ORDER_NUMBER_RE = re.compile(r"(?:EC-?)?0*(\d+)", re.IGNORECASE)
+
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ("order_number", "status", "full_name", "total", "created_at")
     list_filter = ("status", "created_at")
+    search_fields = ("email",)
+    search_help_text = "شماره سفارش (EC-000123) یا ایمیل دقیق"
+    date_hierarchy = "created_at"
+    raw_id_fields = ("user",)
     inlines = [OrderItemInline]
     readonly_fields = ("subtotal", "shipping", "tax", "total", "created_at")
+    actions = ["export_csv", "export_jsonl"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Both lookups hit an index: the primary key or ``order_email_idx``.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        match = ORDER_NUMBER_RE.fullmatch(term)
+        if match:
+            return queryset.filter(pk=int(match[1])), False
+        return queryset.filter(email=term), False
+
+    def _export(self, queryset, export_format):
+        # "Select all" passes the changelist's filtered queryset, so the status and
+        # date filters (including ?created_at__gte=...&created_at__lt=...) apply.
+        content_type, _ = exports.FORMATS[export_format]
+        response = StreamingHttpResponse(exports.rows(queryset, export_format), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{exports.filename(export_format)}"'
+        return response
+
+    @admin.action(description="خروجی CSV سفارش‌ها", permissions=["view"])
+    def export_csv(self, request, queryset):
+        return self._export(queryset, "csv")
+
+    @admin.action(description="خروجی JSONL سفارش‌ها", permissions=["view"])
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, "jsonl")
+
+
+@admin.register(ProductSales)
+class ProductSalesAdmin(LargeTableAdmin):
+    """Sales report; rows are maintained by ``shop.sales`` and are read-only here."""
+
+    list_display = ("product", "units_7d", "units_30d", "revenue_30d", "units", "revenue")
+    list_select_related = ("product",)
+    ordering = ("-units_30d", "-units")
+    search_fields = ("product__name",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Queue contents; tasks are added by the shop and run by ``run_worker``."""
+
+    list_display = ("id", "name", "status", "attempts", "run_at", "locked_by", "last_error")
+    list_filter = ("status", "name")
+    ordering = ("run_at", "id")
+    readonly_fields = ("name", "payload", "key", "status", "attempts", "locked_by", "locked_until", "last_error",
+                       "created_at")
+    actions = ["retry_now"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="اجرای دوباره در اولین فرصت", permissions=["change"])
+    def retry_now(self, request, queryset):
+        retried = 0
+        # Running tasks belong to a worker; only failed ones are put back.
+        for task in queryset.filter(status="failed"):
+            try:
+                with transaction.atomic():
+                    retried += Task.objects.filter(pk=task.pk, status="failed").update(
+                        status="queued", attempts=0, run_at=timezone.now(), last_error=""
+                    )
+            except IntegrityError:
+                # A queued task with the same key will do the work.
+                task.delete()
+        self.message_user(request, f"{retried} کار دوباره در صف قرار گرفت.")
+
+
+def profile_list_view(request):
+    context = {
+        **admin.site.each_context(request),
+        "title": "پروفایل درخواست‌ها",
+        "profiles": profiling.list_profiles(),
+        "token": profiling.make_token(),
+        "header": profiling.HEADER,
+        "query_param": profiling.QUERY_PARAM,
+    }
+    return TemplateResponse(request, "admin/profiles/list.html", context)
 
 
-# Register your models here.
+def profile_detail_view(request, profile_id):
+    try:
+        profile = profiling.load(profile_id)
+        if request.GET.get("format") == "collapsed":
+            return HttpResponse(profiling.collapsed_stacks(profile_id), content_type="text/plain; charset=utf-8")
+        sort = request.GET.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "ncalls"):
+            sort = "cumulative"
+        limit = request.GET.get("limit", "40")
+        limit = min(int(limit), 500) if limit.isdigit() else 40
+        table = profiling.top_functions(profile_id, limit=limit, sort=sort)
+    except FileNotFoundError:
+        raise Http404("Profile not found")
+    context = {
+        **admin.site.each_context(request),
+        "title": f"پروفایل {profile['view'] or profile['path']}",
+        "profile": profile,
+        "table": table,
+        "sort": sort,
+    }
+    return TemplateResponse(request, "admin/profiles/detail.html", context)
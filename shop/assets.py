@@ -0,0 +1,629 @@
+"""Offline build of the site stylesheet.
+
+The pages are styled with Tailwind utility classes. Instead of compiling them
+in the browser with the Play CDN, ``build_css()`` scans the templates, scripts
+and Python sources for class-like tokens, compiles the ones it recognises and
+writes a single minified ``static/css/app.css``; tokens that are not utilities
+(plain words, template syntax) are ignored, like Tailwind's own scanner does.
+
+Only the part of Tailwind this site uses is implemented: the default spacing,
+type and colour scales for the palettes below, the ``brand`` colours and the
+``soft`` shadow from the old CDN config, arbitrary values (``text-[11px]``),
+opacity modifiers (``bg-white/10``) and the ``hover``/``focus``/``group-hover``
+and ``sm``/``md``/``lg``/``xl`` variants. A class the compiler does not know
+simply gets no rule; ``ShopAssetTests`` checks that every class used in a
+template compiles.
+
+Vazirmatn is self-hosted: ``@font-face`` rules are emitted for the files of
+``FONT_FILES`` present in ``static/fonts``, which are committed with the font's
+OFL licence (``build_assets --fonts-from`` vendors them from a release).
+``build_assets`` refuses to build without them; ``build_css()`` alone skips the
+missing faces and the pages fall back to the system UI font.
+"""
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from django.conf import settings
+
+SOURCE_GLOBS = ("templates/**/*.html", "static/js/**/*.js", "shop/**/*.py", "DjangoEcommerce/settings.py")
+# Test modules mention classes no page uses.
+EXCLUDED_SOURCES = ("tests.py", "test_*.py", "tests/*")
+OUTPUT = Path("css") / "app.css"
+FONT_DIR = Path("fonts")
+FONT_FILES = {
+    "Vazirmatn-Regular.woff2": 400,
+    "Vazirmatn-Medium.woff2": 500,
+    "Vazirmatn-SemiBold.woff2": 600,
+    "Vazirmatn-Bold.woff2": 700,
+}
+FONT_LICENSE = "OFL.txt"
+FONT_STACK = "Vazirmatn,ui-sans-serif,system-ui,-apple-system,Segoe UI,Tahoma,sans-serif"
+
+COLORS = {
+    "brand": {
+        "50": "#ecfdf3", "100": "#d1fae5", "200": "#a7f3d0", "300": "#6ee7b7", "400": "#34d399",
+        "500": "#10b981", "600": "#059669", "700": "#047857", "800": "#065f46", "900": "#064e3b",
+    },
+    "slate": {
+        "50": "#f8fafc", "100": "#f1f5f9", "200": "#e2e8f0", "300": "#cbd5e1", "400": "#94a3b8",
+        "500": "#64748b", "600": "#475569", "700": "#334155", "800": "#1e293b", "900": "#0f172a",
+    },
+    "emerald": {
+        "50": "#ecfdf5", "100": "#d1fae5", "200": "#a7f3d0", "300": "#6ee7b7", "400": "#34d399",
+        "500": "#10b981", "600": "#059669", "700": "#047857", "800": "#065f46", "900": "#064e3b",
+    },
+    "red": {
+        "50": "#fef2f2", "100": "#fee2e2", "200": "#fecaca", "300": "#fca5a5", "400": "#f87171",
+        "500": "#ef4444", "600": "#dc2626", "700": "#b91c1c", "800": "#991b1b", "900": "#7f1d1d",
+    },
+    "amber": {
+        "50": "#fffbeb", "100": "#fef3c7", "200": "#fde68a", "300": "#fcd34d", "400": "#fbbf24",
+        "500": "#f59e0b", "600": "#d97706", "700": "#b45309", "800": "#92400e", "900": "#78350f",
+    },
+    "yellow": {
+        "50": "#fefce8", "100": "#fef9c3", "200": "#fef08a", "300": "#fde047", "400": "#facc15",
+        "500": "#eab308", "600": "#ca8a04", "700": "#a16207", "800": "#854d0e", "900": "#713f12",
+    },
+    "blue": {
+        "50": "#eff6ff", "100": "#dbeafe", "200": "#bfdbfe", "300": "#93c5fd", "400": "#60a5fa",
+        "500": "#3b82f6", "600": "#2563eb", "700": "#1d4ed8", "800": "#1e40af", "900": "#1e3a8a",
+    },
+}
+NAMED_COLORS = {"white": "#ffffff", "black": "#000000", "transparent": "transparent", "current": "currentColor"}
+FONT_SIZES = {
+    "xs": ("0.75rem", "1rem"), "sm": ("0.875rem", "1.25rem"), "base": ("1rem", "1.5rem"),
+    "lg": ("1.125rem", "1.75rem"), "xl": ("1.25rem", "1.75rem"), "2xl": ("1.5rem", "2rem"),
+    "3xl": ("1.875rem", "2.25rem"), "4xl": ("2.25rem", "2.5rem"), "5xl": ("3rem", "1"), "6xl": ("3.75rem", "1"),
+}
+FONT_WEIGHTS = {"light": "300", "normal": "400", "medium": "500", "semibold": "600", "bold": "700", "extrabold": "800"}
+LEADING = {"none": "1", "tight": "1.25", "snug": "1.375", "normal": "1.5", "relaxed": "1.625", "loose": "2"}
+RADII = {"none": "0px", "sm": "0.125rem", "": "0.25rem", "md": "0.375rem", "lg": "0.5rem", "xl": "0.75rem",
+         "2xl": "1rem", "3xl": "1.5rem", "full": "9999px"}
+SHADOWS = {
+    "sm": "0 1px 2px 0 rgb(0 0 0/.05)",
+    "": "0 1px 3px 0 rgb(0 0 0/.1),0 1px 2px -1px rgb(0 0 0/.1)",
+    "md": "0 4px 6px -1px rgb(0 0 0/.1),0 2px 4px -2px rgb(0 0 0/.1)",
+    "lg": "0 10px 15px -3px rgb(0 0 0/.1),0 4px 6px -4px rgb(0 0 0/.1)",
+    "xl": "0 20px 25px -5px rgb(0 0 0/.1),0 8px 10px -6px rgb(0 0 0/.1)",
+    "2xl": "0 25px 50px -12px rgb(0 0 0/.25)",
+    "none": "0 0 #0000",
+    "soft": "0 15px 60px rgba(15,23,42,0.08)",
+}
+MAX_WIDTHS = {"sm": "24rem", "md": "28rem", "lg": "32rem", "xl": "36rem", "2xl": "42rem", "3xl": "48rem",
+              "4xl": "56rem", "5xl": "64rem", "6xl": "72rem", "7xl": "80rem", "full": "100%", "none": "none"}
+SIZES = {"auto": "auto", "full": "100%", "screen": None, "fit": "fit-content", "min": "min-content", "max": "max-content"}
+BREAKPOINTS = {"sm": "640px", "md": "768px", "lg": "1024px", "xl": "1280px", "2xl": "1536px"}
+STATES = {"hover": ":hover", "focus": ":focus", "focus-visible": ":focus-visible", "active": ":active",
+          "disabled": ":disabled"}
+GRADIENT_DIRECTIONS = {"t": "top", "tr": "top right", "r": "right", "br": "bottom right", "b": "bottom",
+                       "bl": "bottom left", "l": "left", "tl": "top left"}
+
+CHILDREN = ">:not([hidden])~:not([hidden])"
+TRANSITION = (
+    "transition-property:color,background-color,border-color,text-decoration-color,fill,stroke,opacity,"
+    "box-shadow,transform,filter,-webkit-backdrop-filter,backdrop-filter;"
+    "transition-timing-function:cubic-bezier(.4,0,.2,1);transition-duration:150ms"
+)
+
+# Trimmed Tailwind preflight, followed by the site's own components.
+BASE_CSS = (
+    "*,::before,::after{box-sizing:border-box;border:0 solid #e5e7eb;--tw-ring-color:rgb(59 130 246/.5)}"
+    f"html{{line-height:1.5;-webkit-text-size-adjust:100%;tab-size:4;font-family:{FONT_STACK}}}"
+    "body{margin:0;line-height:inherit}"
+    "hr{height:0;color:inherit;border-top-width:1px}"
+    "h1,h2,h3,h4,h5,h6{font-size:inherit;font-weight:inherit}"
+    "a{color:inherit;text-decoration:inherit}"
+    "b,strong{font-weight:bolder}"
+    "small{font-size:80%}"
+    "table{text-indent:0;border-color:inherit;border-collapse:collapse}"
+    "button,input,optgroup,select,textarea{font-family:inherit;font-size:100%;font-weight:inherit;"
+    "line-height:inherit;color:inherit;margin:0;padding:0}"
+    "button,select{text-transform:none}"
+    "button,[type=button],[type=reset],[type=submit]{-webkit-appearance:button;background-color:transparent;"
+    "background-image:none}"
+    "blockquote,dl,dd,h1,h2,h3,h4,h5,h6,hr,figure,p,pre,fieldset{margin:0}"
+    "fieldset,legend{padding:0}"
+    "ol,ul,menu{list-style:none;margin:0;padding:0}"
+    "textarea{resize:vertical}"
+    "input::placeholder,textarea::placeholder{opacity:1;color:#9ca3af}"
+    "button,[role=button]{cursor:pointer}"
+    ":disabled{cursor:default}"
+    "img,svg,video,canvas,audio,iframe,embed,object{display:block;vertical-align:middle}"
+    "img,video{max-width:100%;height:auto}"
+    "[hidden]{display:none}"
+    ".glass{-webkit-backdrop-filter:blur(10px);backdrop-filter:blur(10px);background:rgba(255,255,255,.72)}"
+    ".hide-scrollbar{scrollbar-width:none;-ms-overflow-style:none}"
+    ".hide-scrollbar::-webkit-scrollbar{display:none}"
+)
+
+
+class Rule(NamedTuple):
+    media: int  # index into BREAKPOINTS + 1; 0 for no media query
+    state: int  # 0 plain, 1 with a state variant
+    order: int  # position of the utility in UTILITIES
+    sub: int  # order among rules of the same utility (``border`` before ``border-t``)
+    selector: str
+    declarations: str
+
+    @property
+    def css(self) -> str:
+        return f"{self.selector}{{{self.declarations}}}"
+
+
+# --- values -------------------------------------------------------------------
+
+
+def _arbitrary(value: str) -> Optional[str]:
+    if value.startswith("[") and value.endswith("]"):
+        return value[1:-1].replace("_", " ")
+    return None
+
+
+def _spacing(value: str) -> Optional[str]:
+    if value == "px":
+        return "1px"
+    if value == "0":
+        return "0px"
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        return f"{float(value) * 0.25:g}rem"
+    return _arbitrary(value)
+
+
+def _negate(value: Optional[str], negative: str) -> Optional[str]:
+    if value is None or not negative:
+        return value
+    return f"calc({value} * -1)" if value.startswith(("var(", "calc(")) else f"-{value}"
+
+
+def _rgb(hex_color: str) -> Tuple[int, int, int]:
+    return tuple(int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def _color(value: str, alpha: Optional[float] = None) -> Optional[str]:
+    """CSS colour for ``slate-200``, ``white``, ``white/10`` or ``[#123456]``."""
+    if "/" in value and alpha is None:
+        value, _, opacity = value.partition("/")
+        if not opacity.isdigit():
+            return None
+        alpha = int(opacity) / 100
+    arbitrary = _arbitrary(value)
+    if arbitrary is not None:
+        color = arbitrary if arbitrary.startswith("#") else None
+    elif value in NAMED_COLORS:
+        color = NAMED_COLORS[value]
+    else:
+        family, _, shade = value.rpartition("-")
+        color = COLORS.get(family, {}).get(shade)
+    if color is None or alpha is None or not color.startswith("#"):
+        return color
+    r, g, b = _rgb(color)
+    return f"rgb({r} {g} {b}/{alpha:g})"
+
+
+def _transparent(value: str) -> Optional[str]:
+    color = _color(value.partition("/")[0], alpha=0)
+    return "rgb(0 0 0/0)" if color in ("transparent", "currentColor") else color
+
+
+def _size(value: str, axis: str) -> Optional[str]:
+    if value == "screen":
+        return "100vw" if axis == "width" else "100vh"
+    if value in SIZES:
+        return SIZES[value]
+    if re.fullmatch(r"\d+/\d+", value):
+        numerator, denominator = map(int, value.split("/"))
+        return f"{numerator / denominator * 100:g}%"
+    return _spacing(value)
+
+
+def _declare(**properties) -> str:
+    return ";".join(f"{name.replace('_', '-')}:{value}" for name, value in properties.items())
+
+
+def _sides(prefix: str, sides: str, value: str, suffix: str = "") -> str:
+    names = {
+        "": [""], "x": ["-left", "-right"], "y": ["-top", "-bottom"], "s": ["-inline-start"], "e": ["-inline-end"],
+        "t": ["-top"], "r": ["-right"], "b": ["-bottom"], "l": ["-left"],
+    }[sides]
+    return ";".join(f"{prefix}{side}{suffix}:{value}" for side in names)
+
+
+# --- utilities ----------------------------------------------------------------
+#
+# Each entry is (pattern, builder); the builder gets the match and returns the
+# declarations, ``(declarations, selector suffix)``, or None when the value is
+# not one it knows. Entries are listed in Tailwind's plugin order, which is the
+# order rules are written in, so later utilities win over earlier ones.
+
+Built = Optional[object]
+
+
+def _static(declarations: str) -> Callable[[re.Match], str]:
+    return lambda match: declarations
+
+
+def _inset(match: re.Match) -> Built:
+    negative, side, value = match.groups()
+    value = _negate(_size(value, "width") if value in ("auto", "full") else _spacing(value), negative)
+    if value is None:
+        return None
+    properties = {
+        "inset": ["inset"], "inset-x": ["left", "right"], "inset-y": ["top", "bottom"],
+        "start": ["inset-inline-start"], "end": ["inset-inline-end"],
+        "top": ["top"], "right": ["right"], "bottom": ["bottom"], "left": ["left"],
+    }[side]
+    return ";".join(f"{name}:{value}" for name in properties)
+
+
+def _margin(match: re.Match) -> Built:
+    negative, sides, value = match.groups()
+    value = "auto" if value == "auto" else _negate(_spacing(value), negative)
+    return value and _sides("margin", sides, value)
+
+
+def _padding(match: re.Match) -> Built:
+    sides, value = match.groups()
+    value = _spacing(value)
+    return value and _sides("padding", sides, value)
+
+
+def _dimension(prop: str, axis: str) -> Callable[[re.Match], Built]:
+    def build(match: re.Match) -> Built:
+        value = _size(match.group(1), axis)
+        return value and f"{prop}:{value}"
+
+    return build
+
+
+def _min_height(match: re.Match) -> Built:
+    value = {"screen": "100vh", "full": "100%", "0": "0px"}.get(match.group(1)) or _arbitrary(match.group(1))
+    return value and f"min-height:{value}"
+
+
+def _min_width(match: re.Match) -> Built:
+    value = {"full": "100%", "0": "0px"}.get(match.group(1)) or _arbitrary(match.group(1))
+    return value and f"min-width:{value}"
+
+
+def _max_width(match: re.Match) -> Built:
+    value = MAX_WIDTHS.get(match.group(1)) or _arbitrary(match.group(1))
+    return value and f"max-width:{value}"
+
+
+def _aspect(match: re.Match) -> Built:
+    value = {"square": "1/1", "video": "16/9", "auto": "auto"}.get(match.group(1)) or _arbitrary(match.group(1))
+    return value and f"aspect-ratio:{value}"
+
+
+def _translate(match: re.Match) -> Built:
+    negative, axis, value = match.groups()
+    value = _negate(_size(value, "width") if value == "full" else _spacing(value), negative)
+    return value and f"transform:translate{axis.upper()}({value})"
+
+
+def _scale(match: re.Match) -> Built:
+    return f"transform:scale({int(match.group(1)) / 100:g})"
+
+
+def _gap(match: re.Match) -> Built:
+    axis, value = match.groups()
+    value = _spacing(value)
+    prop = {"": "gap", "x-": "column-gap", "y-": "row-gap"}[axis or ""]
+    return value and f"{prop}:{value}"
+
+
+def _space(match: re.Match) -> Built:
+    axis, value = match.groups()
+    value = _spacing(value)
+    if value is None:
+        return None
+    prop = "margin-top" if axis == "y" else "margin-inline-start"
+    return f"{prop}:{value}", CHILDREN
+
+
+def _divide_width(match: re.Match) -> Built:
+    axis, width = match.groups()
+    width = f"{width or 1}px"
+    if axis == "y":
+        return f"border-top-width:{width};border-bottom-width:0", CHILDREN
+    return f"border-inline-start-width:{width};border-inline-end-width:0", CHILDREN
+
+
+def _divide_color(match: re.Match) -> Built:
+    color = _color(match.group(1))
+    return color and (f"border-color:{color}", CHILDREN)
+
+
+def _rounded(match: re.Match) -> Built:
+    side, size = match.groups()
+    radius = RADII.get(size or "")
+    if radius is None:
+        return None
+    corners = {
+        None: ["border-radius"],
+        "t": ["border-top-left-radius", "border-top-right-radius"],
+        "b": ["border-bottom-left-radius", "border-bottom-right-radius"],
+        "s": ["border-start-start-radius", "border-end-start-radius"],
+        "e": ["border-start-end-radius", "border-end-end-radius"],
+    }[side]
+    return ";".join(f"{corner}:{radius}" for corner in corners)
+
+
+def _border_width(match: re.Match) -> Built:
+    sides, width = match.groups()
+    return _sides("border", sides or "", f"{width or 1}px", suffix="-width")
+
+
+def _border_color(match: re.Match) -> Built:
+    color = _color(match.group(1))
+    return color and f"border-color:{color}"
+
+
+def _background(match: re.Match) -> Built:
+    value = match.group(1)
+    arbitrary = _arbitrary(value)
+    if arbitrary and ("gradient(" in arbitrary or arbitrary.startswith("url(")):
+        return f"background-image:{arbitrary}"
+    color = _color(value)
+    return color and f"background-color:{color}"
+
+
+def _gradient(match: re.Match) -> Built:
+    direction = GRADIENT_DIRECTIONS.get(match.group(1))
+    return direction and f"background-image:linear-gradient(to {direction},var(--tw-gradient-stops))"
+
+
+def _gradient_from(match: re.Match) -> Built:
+    color = _color(match.group(1))
+    return color and (
+        f"--tw-gradient-from:{color};--tw-gradient-to:{_transparent(match.group(1))};"
+        "--tw-gradient-stops:var(--tw-gradient-from),var(--tw-gradient-to)"
+    )
+
+
+def _gradient_via(match: re.Match) -> Built:
+    color = _color(match.group(1))
+    return color and (
+        f"--tw-gradient-to:{_transparent(match.group(1))};"
+        f"--tw-gradient-stops:var(--tw-gradient-from),{color},var(--tw-gradient-to)"
+    )
+
+
+def _gradient_to(match: re.Match) -> Built:
+    color = _color(match.group(1))
+    return color and f"--tw-gradient-to:{color}"
+
+
+def _font_size(match: re.Match) -> Built:
+    value = match.group(1)
+    if value in FONT_SIZES:
+        size, line_height = FONT_SIZES[value]
+        return f"font-size:{size};line-height:{line_height}"
+    arbitrary = _arbitrary(value)
+    if arbitrary and re.fullmatch(r"[\d.]+(px|rem|em|%|vw)", arbitrary):
+        return f"font-size:{arbitrary}"
+    return None
+
+
+def _text_color(match: re.Match) -> Built:
+    color = _color(match.group(1))
+    return color and f"color:{color}"
+
+
+def _leading(match: re.Match) -> Built:
+    value = LEADING.get(match.group(1)) or _spacing(match.group(1))
+    return value and f"line-height:{value}"
+
+
+def _shadow(match: re.Match) -> Built:
+    shadow = SHADOWS.get(match.group(1) or "")
+    return shadow and f"box-shadow:{shadow}"
+
+
+def _ring_width(match: re.Match) -> Built:
+    return f"box-shadow:0 0 0 {match.group(1) or 3}px var(--tw-ring-color)"
+
+
+def _ring_color(match: re.Match) -> Built:
+    color = _color(match.group(1))
+    return color and f"--tw-ring-color:{color}"
+
+
+UTILITIES: List[Tuple[str, Callable[[re.Match], Built]]] = [
+    (r"(static|fixed|absolute|relative|sticky)", lambda match: f"position:{match.group(1)}"),
+    (r"(-?)(inset-x|inset-y|inset|start|end|top|right|bottom|left)-(.+)", _inset),
+    (r"z-(\d+|auto)", lambda match: f"z-index:{match.group(1)}"),
+    (r"col-span-(\d+)", lambda match: f"grid-column:span {match.group(1)}/span {match.group(1)}"),
+    (r"col-span-full", _static("grid-column:1/-1")),
+    (r"(-?)m([xysetrbl]?)-(.+)", _margin),
+    (r"line-clamp-(\d+)", lambda match: (
+        f"overflow:hidden;display:-webkit-box;-webkit-box-orient:vertical;-webkit-line-clamp:{match.group(1)}"
+    )),
+    (r"block", _static("display:block")),
+    (r"inline-block", _static("display:inline-block")),
+    (r"inline", _static("display:inline")),
+    (r"flex", _static("display:flex")),
+    (r"inline-flex", _static("display:inline-flex")),
+    (r"grid", _static("display:grid")),
+    (r"hidden", _static("display:none")),
+    (r"aspect-(.+)", _aspect),
+    (r"h-(.+)", _dimension("height", "height")),
+    (r"min-h-(.+)", _min_height),
+    (r"w-(.+)", _dimension("width", "width")),
+    (r"min-w-(.+)", _min_width),
+    (r"max-w-(.+)", _max_width),
+    (r"flex-1", _static("flex:1 1 0%")),
+    (r"flex-none", _static("flex:none")),
+    (r"shrink-0", _static("flex-shrink:0")),
+    (r"(-?)translate-([xy])-(.+)", _translate),
+    (r"scale-(\d+)", _scale),
+    (r"cursor-pointer", _static("cursor:pointer")),
+    (r"grid-cols-(\d+)", lambda match: f"grid-template-columns:repeat({match.group(1)},minmax(0,1fr))"),
+    (r"flex-row", _static("flex-direction:row")),
+    (r"flex-col", _static("flex-direction:column")),
+    (r"flex-wrap", _static("flex-wrap:wrap")),
+    (r"place-items-center", _static("place-items:center")),
+    (r"items-(start|end|center|baseline|stretch)", lambda match: (
+        f"align-items:{ {'start': 'flex-start', 'end': 'flex-end'}.get(match.group(1), match.group(1)) }"
+    )),
+    (r"justify-(start|end|center|between|around)", lambda match: (
+        "justify-content:" + {"start": "flex-start", "end": "flex-end", "between": "space-between",
+                              "around": "space-around"}.get(match.group(1), match.group(1))
+    )),
+    (r"gap-([xy]-)?(.+)", _gap),
+    (r"space-([xy])-(.+)", _space),
+    (r"divide-([xy])(?:-(\d+))?", _divide_width),
+    (r"divide-(.+)", _divide_color),
+    (r"overflow-(hidden|auto|scroll|visible)", lambda match: f"overflow:{match.group(1)}"),
+    (r"overflow-([xy])-(hidden|auto|scroll|visible)", lambda match: f"overflow-{match.group(1)}:{match.group(2)}"),
+    (r"rounded(?:-([tbse]))?(?:-(.+))?", _rounded),
+    (r"border(?:-([xysetrbl]))?(?:-(\d+))?", _border_width),
+    (r"border-(.+)", _border_color),
+    (r"bg-(.+)", _background),
+    (r"bg-gradient-to-(\w+)", _gradient),
+    (r"from-(.+)", _gradient_from),
+    (r"via-(.+)", _gradient_via),
+    (r"to-(.+)", _gradient_to),
+    (r"object-(cover|contain)", lambda match: f"object-fit:{match.group(1)}"),
+    (r"p([xysetrbl]?)-(.+)", _padding),
+    (r"text-(left|center|right|start|end)", lambda match: f"text-align:{match.group(1)}"),
+    (r"text-(.+)", _font_size),
+    (r"font-(\w+)", lambda match: FONT_WEIGHTS.get(match.group(1)) and f"font-weight:{FONT_WEIGHTS[match.group(1)]}"),
+    (r"leading-(.+)", _leading),
+    (r"text-(.+)", _text_color),
+    (r"line-through", _static("text-decoration-line:line-through")),
+    (r"underline", _static("text-decoration-line:underline")),
+    (r"opacity-(\d+)", lambda match: f"opacity:{int(match.group(1)) / 100:g}"),
+    (r"shadow(?:-(.+))?", _shadow),
+    (r"outline-none", _static("outline:2px solid transparent;outline-offset:2px")),
+    (r"ring(?:-(\d+))?", _ring_width),
+    (r"ring-(.+)", _ring_color),
+    (r"backdrop-blur", _static("-webkit-backdrop-filter:blur(8px);backdrop-filter:blur(8px)")),
+    (r"transition", _static(TRANSITION)),
+    (r"duration-(\d+)", lambda match: f"transition-duration:{match.group(1)}ms"),
+    (r"scroll-smooth", _static("scroll-behavior:smooth")),
+]
+_UTILITIES = [(re.compile(pattern), build) for pattern, build in UTILITIES]
+
+
+def _escape(name: str) -> str:
+    return re.sub(r"([^\w-])", r"\\\1", name)
+
+
+def _split_variants(name: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in name:
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        if char == ":" and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    return parts + [current]
+
+
+def compile_class(name: str) -> Optional[Rule]:
+    """The rule for one class name, or None if it is not a utility this compiler knows."""
+    *variants, utility = _split_variants(name)
+    media, state, prefix, pseudo = 0, 0, "", ""
+    for variant in variants:
+        if variant in BREAKPOINTS and not media:
+            media = list(BREAKPOINTS).index(variant) + 1
+        elif variant in STATES:
+            state, pseudo = 1, pseudo + STATES[variant]
+        elif variant == "group-hover":
+            state, prefix = 1, ".group:hover "
+        else:
+            return None
+    for order, (pattern, build) in enumerate(_UTILITIES):
+        match = pattern.fullmatch(utility)
+        if not match:
+            continue
+        built = build(match)
+        if not built:
+            continue
+        declarations, suffix = built if isinstance(built, tuple) else (built, "")
+        sub = sum(1 for group in match.groups() if group)
+        return Rule(media, state, order, sub, f"{prefix}.{_escape(name)}{pseudo}{suffix}", declarations)
+    return None
+
+
+TEMPLATE_SYNTAX = re.compile(r"\{%|%\}|\{\{|\}\}")
+TOKEN_SPLIT = re.compile(r"[\s\"'`<>=|]+")
+
+
+def candidates(text: str) -> Set[str]:
+    """Every token of ``text`` that could be a class name."""
+    return {token for token in TOKEN_SPLIT.split(TEMPLATE_SYNTAX.sub(" ", text)) if token}
+
+
+def scan(paths: Iterable[Path]) -> Set[str]:
+    tokens = set()
+    for path in paths:
+        tokens |= candidates(path.read_text(encoding="utf-8"))
+    return tokens
+
+
+def source_files(base_dir: Optional[Path] = None) -> List[Path]:
+    base_dir = Path(base_dir or settings.BASE_DIR)
+    paths = {path for pattern in SOURCE_GLOBS for path in base_dir.glob(pattern)}
+    return sorted(path for path in paths if not any(path.match(pattern) for pattern in EXCLUDED_SOURCES))
+
+
+def compile_classes(names: Iterable[str]) -> List[Rule]:
+    """The rules for ``names`` in stylesheet order; names that are not utilities are skipped."""
+    rules = [rule for rule in map(compile_class, names) if rule]
+    rules.sort(key=lambda rule: (rule.media, rule.state, rule.order, rule.sub, rule.selector))
+    return rules
+
+
+def font_faces(font_dir: Path) -> str:
+    faces = []
+    for filename, weight in FONT_FILES.items():
+        if (font_dir / filename).exists():
+            faces.append(
+                "@font-face{font-family:Vazirmatn;font-style:normal;font-display:swap;"
+                f"font-weight:{weight};src:url(../{FONT_DIR.as_posix()}/{filename}) format(\"woff2\")}}"
+            )
+    return "".join(faces)
+
+
+def stylesheet(rules: Iterable[Rule], fonts: str = "") -> str:
+    css = [fonts, BASE_CSS]
+    media = None
+    for rule in rules:
+        if rule.media != media:
+            if media:
+                css.append("}")
+            if rule.media:
+                css.append(f"@media (min-width:{list(BREAKPOINTS.values())[rule.media - 1]}){{")
+            media = rule.media
+        css.append(rule.css)
+    if media:
+        css.append("}")
+    return "".join(css) + "\n"
+
+
+def static_dir() -> Path:
+    return Path(settings.STATICFILES_DIRS[0])
+
+
+def missing_fonts() -> List[str]:
+    """The vendored font files (and licence) absent from ``static/fonts``."""
+    font_dir = static_dir() / FONT_DIR
+    return [name for name in (*FONT_FILES, FONT_LICENSE) if not (font_dir / name).exists()]
+
+
+def build_css(output: Optional[Path] = None, sources: Optional[Iterable[Path]] = None) -> Dict[str, object]:
+    """Write the stylesheet; returns what went into it."""
+    output = Path(output or static_dir() / OUTPUT)
+    rules = compile_classes(scan(source_files() if sources is None else sources))
+    fonts = font_faces(static_dir() / FONT_DIR)
+    css = stylesheet(rules, fonts)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(css, encoding="utf-8")
+    return {"path": output, "rules": len(rules), "bytes": len(css.encode()), "fonts": fonts.count("@font-face")}
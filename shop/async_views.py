@@ -0,0 +1,103 @@
+"""Async versions of the catalog and cart pages, routed instead of ``views`` when
+``SHOP_ASYNC_VIEWS`` is on (serve ``DjangoEcommerce.asgi`` in that case).
+
+Templates still render synchronously, so everything a template or context
+processor would load lazily (the user, the cart summary) is loaded first.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render
+
+from . import conditional, facets, fragments, recommendations, search
+from .models import Category, Product
+from .pagination import KeysetPaginator, acached_count
+from .utils import aget_cart_items, aget_cart_summary, alist, astore_cart_summary
+from .views import (
+    filter_products,
+    home_page_validators,
+    product_detail_validators,
+    product_list_context,
+    product_list_params,
+    product_list_validators,
+)
+
+
+async def _load_render_context(request):
+    request.user = await request.auser()
+    request.cart_summary = await aget_cart_summary(request)
+
+
+async def home_validators(request):
+    # The sections load concurrently here, once; the visitor's session is read in a thread.
+    request.home_sections = await fragments.aget_home_sections()
+    return await sync_to_async(home_page_validators)(request, request.home_sections)
+
+
+@conditional.conditional_page(home_validators)
+async def home(request):
+    sections = getattr(request, "home_sections", None) or await fragments.aget_home_sections()
+    await _load_render_context(request)
+    return render(request, "shop/home.html", sections)
+
+
+@conditional.conditional_page(product_list_validators)
+async def product_list(request):
+    query, category_slug, price_bucket, sort, ordering = product_list_params(request)
+    products = filter_products(
+        Product.objects.filter(is_active=True).select_related("category"), query, category_slug, price_bucket
+    )
+
+    cursor = request.GET.get("cursor")
+    page_obj = await KeysetPaginator(products, ordering, per_page=12).aget_page(cursor)
+    total_count = None
+    if not cursor:
+        key = f"product_list:{category_slug}:{price_bucket}:{search.normalize(query)}"
+        total_count = await acached_count(products, key)
+    context = product_list_context(
+        page_obj, total_count, await alist(Category.objects.all()), await facets.afacet_rows(query),
+        query, category_slug, price_bucket, sort,
+    )
+    await _load_render_context(request)
+    return render(request, "shop/product_list.html", context)
+
+
+@conditional.conditional_page(product_detail_validators)
+async def product_detail(request, slug):
+    # The validators, run first, usually loaded both already.
+    product = getattr(request, "detail_product", None)
+    if product is None:
+        product = await aget_object_or_404(
+            Product.objects.select_related("category").prefetch_related("gallery"),
+            slug=slug,
+            is_active=True,
+        )
+    related = getattr(request, "related_products", None)
+    if related is None:
+        related = await recommendations.afor_product(product)
+    await _load_render_context(request)
+    return render(
+        request,
+        "shop/product_detail.html",
+        {
+            "product": product,
+            "related": related,
+        },
+    )
+
+
+async def cart_view(request):
+    items, subtotal, shipping, tax, total = await aget_cart_items(request)
+    await astore_cart_summary(request, items, subtotal, total)
+    recommended = await recommendations.afor_cart(item["product"] for item in items)
+    await _load_render_context(request)
+    return render(
+        request,
+        "shop/cart.html",
+        {
+            "items": items,
+            "subtotal": subtotal,
+            "shipping": shipping,
+            "tax": tax,
+            "total": total,
+            "recommended": recommended,
+        },
+    )
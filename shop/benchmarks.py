@@ -0,0 +1,469 @@
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from importlib import import_module
+from io import BytesIO
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.utils import load_backend
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from . import facets, sessions
+from . import urls as shop_urls
+from .models import Category, Product
+from .pagination import KeysetPaginator
+from .sessions import SessionStore
+from .views import PRODUCT_ORDERINGS
+
+# Reading and writing ``django_session`` in the request, less the flush slack it no longer needs.
+DB_SESSION_QUERIES = 3
+
+CHECKOUT_DATA = {
+    "full_name": "کاربر بنچمارک",
+    "email": "bench@example.com",
+    "address": "خیابان ولیعصر، پلاک ۱",
+    "city": "تهران",
+    "postal_code": "1234567890",
+    "country": "ایران",
+}
+
+
+@dataclass
+class Scenario:
+    """One request to benchmark; budgets leave one query of slack for a write-behind session flush.
+
+    ``max_queries`` is for write-behind sessions; ``build_scenarios`` raises it
+    for scenarios that use the session when sessions go to the database
+    instead (see ``shop.sessions.write_behind``).
+    """
+
+    name: str
+    method: str
+    url: str
+    data: dict = field(default_factory=dict)
+    max_queries: int = 10
+    p95_ms: float = 250.0
+    expected_status: int = 200
+    login: bool = False
+    # Loads and saves the session, e.g. the cart.
+    uses_session: bool = False
+    # Runs before every iteration, outside the timed section (e.g. refilling the cart).
+    prepare: Optional[Callable[[Client], None]] = None
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class Result:
+    name: str
+    timings_ms: List[float] = field(default_factory=list)
+    queries: List[int] = field(default_factory=list)
+    bytes: List[int] = field(default_factory=list)
+
+    def percentile(self, pct: float) -> float:
+        return _percentile(self.timings_ms, pct)
+
+    def summary(self) -> dict:
+        return {
+            "iterations": len(self.timings_ms),
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "mean_ms": round(statistics.fmean(self.timings_ms), 3),
+            "queries_max": max(self.queries),
+            "queries_min": min(self.queries),
+            "bytes": max(self.bytes),
+        }
+
+
+def build_scenarios(user=None) -> List[Scenario]:
+    """The catalog, cart and checkout paths, built from whatever catalog is loaded."""
+    products = list(Product.objects.filter(is_active=True).order_by("-created_at")[:5])
+    if not products:
+        raise ValueError("No active products; run generate_dataset first.")
+    product = products[0]
+    category = Category.objects.filter(products__is_active=True).first()
+    product_list = reverse("shop:product_list")
+
+    def fill_cart(client):
+        for item in products:
+            client.post(reverse("shop:add_to_cart"), {"product_id": item.id, "quantity": 1})
+
+    deep_cursor = _deep_cursor(pages=20)
+    scenarios = [
+        Scenario("home", "get", reverse("shop:home"), max_queries=3, p95_ms=150),
+        Scenario("product_list", "get", product_list, max_queries=3, p95_ms=200),
+        Scenario("product_list_search", "get", product_list, {"q": product.name.split()[0]}, max_queries=4, p95_ms=250),
+        Scenario("product_list_category", "get", product_list, {"category": category.slug}, max_queries=4, p95_ms=200),
+        Scenario(
+            "product_list_price", "get", product_list, {"price": facets.bucket_for(product.price)},
+            max_queries=3, p95_ms=200,
+        ),
+        Scenario("product_list_newest", "get", product_list, {"sort": "newest"}, max_queries=3, p95_ms=200),
+        Scenario("product_list_price_asc", "get", product_list, {"sort": "price_asc"}, max_queries=3, p95_ms=200),
+        Scenario("product_list_price_desc", "get", product_list, {"sort": "price_desc"}, max_queries=3, p95_ms=200),
+        Scenario("product_list_deep_page", "get", product_list, {"cursor": deep_cursor}, max_queries=3, p95_ms=200),
+        Scenario("product_detail", "get", product.get_absolute_url(), max_queries=4, p95_ms=150),
+        # Cart lines, co-purchase neighbours and, for never-bought products, the category fallback.
+        Scenario(
+            "cart_view", "get", reverse("shop:cart"), max_queries=4, p95_ms=150, uses_session=True, prepare=fill_cart,
+        ),
+        Scenario(
+            "add_to_cart", "post", reverse("shop:add_to_cart"), {"product_id": product.id, "quantity": 1},
+            max_queries=2, p95_ms=100, expected_status=302, uses_session=True,
+        ),
+        Scenario(
+            "checkout", "post", reverse("shop:checkout"), CHECKOUT_DATA,
+            max_queries=10, p95_ms=300, expected_status=302, login=True, uses_session=True, prepare=fill_cart,
+        ),
+    ]
+    if user is None:
+        scenarios = [s for s in scenarios if not s.login]
+    if not sessions.write_behind():
+        for scenario in scenarios:
+            if scenario.uses_session:
+                scenario.max_queries += DB_SESSION_QUERIES
+    return scenarios
+
+
+def _deep_cursor(pages: int) -> Optional[str]:
+    """Cursor for the ``pages``-th page of the default product listing (or the last one)."""
+    paginator = KeysetPaginator(Product.objects.filter(is_active=True), PRODUCT_ORDERINGS["newest"], per_page=12)
+    cursor = None
+    for _ in range(pages):
+        page = paginator.get_page(cursor)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    return cursor
+
+
+def run(scenarios: List[Scenario], iterations: int = 50, warmup: int = 5, user=None) -> Dict[str, Result]:
+    results = {}
+    for scenario in scenarios:
+        client = Client()
+        if scenario.login:
+            client.force_login(user)
+        result = Result(scenario.name)
+        for i in range(warmup + iterations):
+            if scenario.prepare:
+                scenario.prepare(client)
+            request = getattr(client, scenario.method)
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = request(scenario.url, scenario.data)
+                elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != scenario.expected_status:
+                raise AssertionError(
+                    f"{scenario.name}: expected {scenario.expected_status}, got {response.status_code}"
+                )
+            if i >= warmup:
+                result.timings_ms.append(elapsed)
+                result.queries.append(len(ctx.captured_queries))
+                result.bytes.append(len(response.content))
+        results[scenario.name] = result
+    return results
+
+
+def check_budgets(scenarios: List[Scenario], results: Dict[str, Result]) -> List[str]:
+    failures = []
+    for scenario in scenarios:
+        summary = results[scenario.name].summary()
+        if summary["queries_max"] > scenario.max_queries:
+            failures.append(f"{scenario.name}: {summary['queries_max']} queries > budget {scenario.max_queries}")
+        if summary["p95_ms"] > scenario.p95_ms:
+            failures.append(f"{scenario.name}: p95 {summary['p95_ms']:.1f} ms > budget {scenario.p95_ms} ms")
+    return failures
+
+
+def benchmark_user():
+    user, _ = get_user_model().objects.get_or_create(
+        username="benchmark-user", defaults={"email": CHECKOUT_DATA["email"]}
+    )
+    return user
+
+
+@dataclass
+class LoadResult:
+    """Throughput and latency of one page under concurrent load through a real handler."""
+
+    timings_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall_seconds: float = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "requests": len(self.timings_ms),
+            "errors": self.errors,
+            "rps": round(len(self.timings_ms) / self.wall_seconds, 1) if self.wall_seconds else 0.0,
+            "p50_ms": round(_percentile(self.timings_ms, 50), 3),
+            "p95_ms": round(_percentile(self.timings_ms, 95), 3),
+            "p99_ms": round(_percentile(self.timings_ms, 99), 3),
+        }
+
+
+def root_urlconf(use_async: bool) -> ModuleType:
+    """The project URLconf with the catalog pages routed to the sync or the async views."""
+    shop = include((shop_urls.catalog_patterns(use_async) + shop_urls.common_patterns, shop_urls.app_name))
+    module = ModuleType(f"shop_{'async' if use_async else 'sync'}_urls")
+    module.urlpatterns = [
+        path("", shop) if getattr(pattern, "app_name", None) == shop_urls.app_name else pattern
+        for pattern in import_module(settings.ROOT_URLCONF).urlpatterns
+    ]
+    return module
+
+
+def load_targets() -> Dict[str, tuple]:
+    """``name -> (path, query string, cookie)`` for the pages that have async versions."""
+    products = list(Product.objects.filter(is_active=True).order_by("-created_at")[:5])
+    if not products:
+        raise ValueError("No active products; run generate_dataset first.")
+    session = SessionStore()
+    session["cart"] = {str(product.id): 1 for product in products}
+    session.save()
+    cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+    return {
+        "home": (reverse("shop:home"), "", ""),
+        "product_list": (reverse("shop:product_list"), "", ""),
+        "product_list_search": (reverse("shop:product_list"), urlencode({"q": products[0].name.split()[0]}), ""),
+        "product_detail": (products[0].get_absolute_url(), "", ""),
+        "cart_view": (reverse("shop:cart"), "", cookie),
+    }
+
+
+def wsgi_load(target: tuple, requests: int, concurrency: int) -> LoadResult:
+    """``requests`` GETs through ``WSGIHandler`` from ``concurrency`` threads, like a threaded WSGI server."""
+    handler = WSGIHandler()
+    page, query_string, cookie = target
+
+    def one(_):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": page,
+            "QUERY_STRING": query_string,
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "testserver",
+            "HTTP_COOKIE": cookie,
+            "wsgi.input": BytesIO(),
+            "wsgi.errors": BytesIO(),
+            "wsgi.url_scheme": "http",
+        }
+        statuses = []
+        started = time.perf_counter()
+        body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b"".join(body)
+        finally:
+            body.close()
+        return (time.perf_counter() - started) * 1000, statuses[0].startswith("200")
+
+    result = LoadResult()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for elapsed, ok in pool.map(one, range(requests)):
+            result.timings_ms.append(elapsed)
+            result.errors += not ok
+    result.wall_seconds = time.perf_counter() - started
+    return result
+
+
+def asgi_load(target: tuple, requests: int, concurrency: int) -> LoadResult:
+    """``requests`` GETs through ``ASGIHandler`` on one event loop, at most ``concurrency`` at a time."""
+    return asyncio.run(_asgi_load(target, requests, concurrency))
+
+
+async def _asgi_load(target: tuple, requests: int, concurrency: int) -> LoadResult:
+    app = ASGIHandler()
+    page, query_string, cookie = target
+    headers = [(b"host", b"testserver")] + ([(b"cookie", cookie.encode())] if cookie else [])
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": page,
+            "raw_path": page.encode(),
+            "root_path": "",
+            "query_string": query_string.encode(),
+            "headers": headers,
+            "server": ("testserver", 80),
+        }
+        finished = asyncio.Event()
+        requested = False
+        statuses = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                finished.set()
+
+        async with slots:
+            started = time.perf_counter()
+            await app(scope, receive, send)
+            return (time.perf_counter() - started) * 1000, statuses[0] == 200
+
+    result = LoadResult()
+    started = time.perf_counter()
+    for elapsed, ok in await asyncio.gather(*(one() for _ in range(requests))):
+        result.timings_ms.append(elapsed)
+        result.errors += not ok
+    result.wall_seconds = time.perf_counter() - started
+    return result
+
+
+SQLITE_STRESS_ALIAS = "sqlite_stress"
+SQLITE_STRESS_PRODUCTS = 200
+SQLITE_STRESS_SCHEMA = [
+    "CREATE TABLE stress_product (id INTEGER PRIMARY KEY, price INTEGER NOT NULL, sold INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE stress_order (id INTEGER PRIMARY KEY, total INTEGER NOT NULL, created_at REAL NOT NULL)",
+    "CREATE TABLE stress_item (id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, product_id INTEGER NOT NULL, "
+    "price INTEGER NOT NULL)",
+    "CREATE TABLE stress_session (key TEXT PRIMARY KEY, data TEXT NOT NULL)",
+]
+
+
+def sqlite_profiles() -> Dict[str, dict]:
+    """``name -> settings dict``: Django's stock SQLite connection, the configured one, and that without the write queue."""
+    configured = connections[DEFAULT_DB_ALIAS].settings_dict
+    stock = {
+        **configured,
+        "ENGINE": "django.db.backends.sqlite3",
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "OPTIONS": {},
+    }
+    return {
+        "stock": stock,
+        "no-queue": {**configured, "ENGINE": "django.db.backends.sqlite3"},
+        "tuned": dict(configured),
+    }
+
+
+def _stress_connection(profile: dict, path: Path):
+    settings_dict = {**profile, "NAME": str(path)}
+    wrapper = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, SQLITE_STRESS_ALIAS)
+    # Connections are per thread, so this only registers it for the caller.
+    connections[SQLITE_STRESS_ALIAS] = wrapper
+    return wrapper
+
+
+def _release_stress_connection(wrapper):
+    wrapper.close()
+    del connections[SQLITE_STRESS_ALIAS]
+
+
+def _stress_setup(profile: dict, path: Path):
+    # Through the profile's own connection, so a WAL journal is in place before the workers start.
+    wrapper = _stress_connection(profile, path)
+    try:
+        with wrapper.cursor() as cursor:
+            for statement in SQLITE_STRESS_SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany(
+                "INSERT INTO stress_product (id, price) VALUES (%s, %s)",
+                [(pk, 1000 + pk) for pk in range(1, SQLITE_STRESS_PRODUCTS + 1)],
+            )
+    finally:
+        _release_stress_connection(wrapper)
+
+
+def _checkout_like(wrapper, rng: random.Random, worker: int):
+    """A catalog read, a checkout transaction and a session write, like one visitor placing an order."""
+    ids = rng.sample(range(1, SQLITE_STRESS_PRODUCTS + 1), 3)
+    with wrapper.cursor() as cursor:
+        cursor.execute("SELECT id, price FROM stress_product ORDER BY sold DESC LIMIT 8")
+        cursor.fetchall()
+    with transaction.atomic(using=SQLITE_STRESS_ALIAS), wrapper.cursor() as cursor:
+        cursor.execute("SELECT id, price FROM stress_product WHERE id IN (%s, %s, %s)", ids)
+        prices = cursor.fetchall()
+        cursor.execute(
+            "INSERT INTO stress_order (total, created_at) VALUES (%s, %s)",
+            [sum(price for _, price in prices), time.time()],
+        )
+        order_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO stress_item (order_id, product_id, price) VALUES (%s, %s, %s)",
+            [(order_id, pk, price) for pk, price in prices],
+        )
+        cursor.execute("UPDATE stress_product SET sold = sold + 1 WHERE id IN (%s, %s, %s)", ids)
+    with wrapper.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO stress_session (key, data) VALUES (%s, %s) "
+            "ON CONFLICT (key) DO UPDATE SET data = excluded.data",
+            [f"worker-{worker}", f'{{"last_order": {order_id}}}'],
+        )
+
+
+def _stress_worker(profile: dict, path: Path, transactions: int, worker: int) -> Tuple[List[float], int]:
+    wrapper = _stress_connection(profile, path)
+    rng = random.Random(worker)
+    timings, errors = [], 0
+    try:
+        for _ in range(transactions):
+            started = time.perf_counter()
+            try:
+                _checkout_like(wrapper, rng, worker)
+            except OperationalError:
+                errors += 1
+            else:
+                timings.append((time.perf_counter() - started) * 1000)
+            # What request_finished does: closes the connection unless CONN_MAX_AGE keeps it.
+            wrapper.close_if_unusable_or_obsolete()
+    finally:
+        _release_stress_connection(wrapper)
+    return timings, errors
+
+
+def sqlite_write_load(profile: dict, threads: int, transactions: int) -> LoadResult:
+    """``threads`` workers each placing ``transactions`` orders against a scratch database with ``profile``.
+
+    Failed attempts ("database is locked") are counted in ``errors`` and left out of the timings.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "stress.sqlite3")
+        _stress_setup(profile, path)
+        result = LoadResult()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            runs = pool.map(lambda worker: _stress_worker(profile, path, transactions, worker), range(threads))
+            for timings, errors in runs:
+                result.timings_ms += timings
+                result.errors += errors
+        result.wall_seconds = time.perf_counter() - started
+    return result
+
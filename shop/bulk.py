@@ -0,0 +1,129 @@
+"""Set-based edits of many products at once: repricing, sales, activation.
+
+Each operation is one ``UPDATE`` per chunk of ``chunk_size`` products (by id),
+written with ``F()`` expressions, so nothing is loaded into Python and the
+write lock is only held for one chunk at a time while checkouts go on.
+``update()`` skips ``Product.save`` and its signals, so the edits set
+``updated_at`` themselves and refresh what the signals would have: each
+chunk's product fragments and, when activation changes, its search index
+entries (only active products are indexed); then once at the end the facet
+table and the catalog version.
+
+Prices stay consistent with ``compare_at_price``: a sale keeps the regular
+price there, ending it puts that price back, and repricing moves both
+prices together and drops a ``compare_at_price`` that is no longer above the
+price.
+"""
+from decimal import Decimal
+from typing import Callable, List, Optional
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from . import facets, fragments, search
+from .models import Product
+
+CHUNK_SIZE = 5000
+
+PRICE = DecimalField(max_digits=10, decimal_places=2)
+
+
+def _rounded(expression, round_to: Optional[Decimal]):
+    """``expression`` rounded to cents, or to a multiple of ``round_to`` (e.g. 1000 Toman), and never negative."""
+    if round_to:
+        step = Value(Decimal(round_to), output_field=PRICE)
+        expression = Round(expression / step, output_field=PRICE) * step
+    else:
+        expression = Round(expression, 2, output_field=PRICE)
+    return Greatest(expression, Value(Decimal("0"), output_field=PRICE), output_field=PRICE)
+
+
+def update_in_chunks(products, changes: dict, chunk_size: int = CHUNK_SIZE,
+                     after_chunk: Optional[Callable[[List[int]], None]] = None) -> int:
+    """Apply ``changes`` to ``products`` chunk by chunk; returns the number of rows updated.
+
+    All SET expressions of a chunk see the row as it was, so a change may read
+    a column another one writes. ``after_chunk(ids)`` runs in each chunk's
+    transaction, after its ``UPDATE``.
+    """
+    products = products.order_by()
+    changes = {**changes, "updated_at": timezone.now()}
+    updated, last_id = 0, None
+    while True:
+        remaining = products if last_id is None else products.filter(pk__gt=last_id)
+        ids = list(remaining.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            updated += products.filter(pk__gte=ids[0], pk__lte=ids[-1]).update(**changes)
+            if after_chunk is not None:
+                after_chunk(ids)
+        fragments.bump_product_versions(ids)
+        last_id = ids[-1]
+        if len(ids) < chunk_size:
+            break
+    if updated:
+        # Rebuilding is one GROUP BY, cheaper than moving counts row by row; it bumps the catalog version.
+        facets.rebuild()
+    return updated
+
+
+def _keep_compare_at(compare_at, price):
+    """``compare_at`` while it is above ``price``, otherwise NULL: no "discount" that is not one."""
+    return Case(When(GreaterThan(compare_at, price), then=compare_at), default=Value(None), output_field=PRICE)
+
+
+def reprice(products, *, percent: Optional[Decimal] = None, amount: Optional[Decimal] = None,
+            round_to: Optional[Decimal] = None, chunk_size: int = CHUNK_SIZE) -> int:
+    """Change prices by ``percent`` (10 for +10%) or by a fixed ``amount``; exactly one of them.
+
+    ``compare_at_price`` moves the same way, so products on sale keep their discount.
+    """
+    if (percent is None) == (amount is None):
+        raise ValueError("Pass exactly one of percent and amount.")
+    if percent is not None:
+        if Decimal(percent) <= -100:
+            raise ValueError("Prices cannot drop by 100 percent or more.")
+        factor = Value(1 + Decimal(percent) / 100, output_field=PRICE)
+        price, compare_at = F("price") * factor, F("compare_at_price") * factor
+    else:
+        delta = Value(Decimal(amount), output_field=PRICE)
+        price, compare_at = F("price") + delta, F("compare_at_price") + delta
+    price, compare_at = _rounded(price, round_to), _rounded(compare_at, round_to)
+    changes = {"price": price, "compare_at_price": _keep_compare_at(compare_at, price)}
+    return update_in_chunks(products, changes, chunk_size)
+
+
+def start_sale(products, percent: Decimal, *, round_to: Optional[Decimal] = None,
+               chunk_size: int = CHUNK_SIZE) -> int:
+    """Put products on sale at ``percent`` off their regular price, kept in ``compare_at_price``.
+
+    Products already on sale are re-discounted from their regular price, not from the sale price.
+    """
+    if not 0 < Decimal(percent) < 100:
+        raise ValueError("A sale takes between 0 and 100 percent off.")
+    regular = Coalesce(F("compare_at_price"), F("price"), output_field=PRICE)
+    price = _rounded(regular * Value(1 - Decimal(percent) / 100, output_field=PRICE), round_to)
+    changes = {"price": price, "compare_at_price": _keep_compare_at(regular, price)}
+    return update_in_chunks(products, changes, chunk_size)
+
+
+def end_sale(products, chunk_size: int = CHUNK_SIZE) -> int:
+    """Restore the regular price of products on sale and clear ``compare_at_price``."""
+    changes = {"price": F("compare_at_price"), "compare_at_price": None}
+    return update_in_chunks(products.filter(compare_at_price__isnull=False), changes, chunk_size)
+
+
+def set_active(products, active: bool, chunk_size: int = CHUNK_SIZE) -> int:
+    """Activate or deactivate products; returns how many changed."""
+
+    def reindex(ids):
+        if active:
+            search.index_products(Product.objects.filter(pk__in=ids, is_active=True).select_related("category"))
+        else:
+            search.remove_products(ids)
+
+    return update_in_chunks(products.exclude(is_active=active), {"is_active": active}, chunk_size, reindex)
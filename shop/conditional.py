@@ -0,0 +1,123 @@
+"""Conditional GET for catalog pages.
+
+``conditional_page`` is ``django.views.decorators.http.condition`` with one
+validator function returning ``(etag, last_modified)``, and async support: the
+validators may touch the session or database, so async views run them in a
+thread. A matching ``If-None-Match``/``If-Modified-Since`` gets a 304 before
+the view renders anything.
+
+Pages embed per-visitor parts (navbar name, cart count, CSRF tokens, flash
+messages), so every ETag carries ``visitor_tag``. ``Last-Modified`` cannot, and
+is only sent to visitors without such state, e.g. crawlers.
+
+Catalog validators come from ``catalog_changed_at()`` rather than the cached
+version, so a worker that did not handle an edit stops answering 304 too.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.messages import get_messages
+from django.utils import translation
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+
+def visitor_tag(request) -> Optional[str]:
+    """Digest of what the per-visitor parts of a page depend on; None while flash messages are pending."""
+    if len(get_messages(request)):
+        return None
+    parts = [
+        request.session.get(SESSION_KEY, ""),
+        request.session.get(HASH_SESSION_KEY, ""),
+        json.dumps(request.session.get("cart", {}), sort_keys=True),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        translation.get_language() or "",
+    ]
+    return hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()[:16]
+
+
+def is_stateless_visitor(request) -> bool:
+    return not request.session.get(SESSION_KEY) and not request.session.get("cart")
+
+
+def make_etag(*parts) -> str:
+    return quote_etag(hashlib.md5("|".join(map(str, parts)).encode()).hexdigest())
+
+
+def page_validators(request, *parts, last_modified: Optional[datetime] = None):
+    """``(etag, last_modified)`` for a page built from ``parts`` plus the visitor's own state."""
+    tag = visitor_tag(request)
+    if tag is None:
+        return None, None
+    if not is_stateless_visitor(request):
+        last_modified = None
+    return make_etag(*parts, tag), last_modified
+
+
+def catalog_last_modified(version: int) -> datetime:
+    """``catalog_changed_at()``, a ``time_ns`` stamp, as a datetime."""
+    return datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
+
+
+def _precondition(request, etag, last_modified):
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _finish(request, response, etag, last_modified):
+    if response.status_code == 200:
+        if etag and not response.has_header("ETag"):
+            response.headers["ETag"] = etag
+        if last_modified and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+        # Revalidate every time: heuristic freshness from Last-Modified would
+        # show a stale cart count without asking.
+        patch_cache_control(response, no_cache=True, private=not is_stateless_visitor(request))
+    return response
+
+
+def conditional_page(validators):
+    """Decorate a view with ``validators(request, *args, **kwargs) -> (etag, last_modified)``.
+
+    Either value may be None; both None skips conditional handling. An async
+    view may have async validators, which are awaited instead of run in a thread.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_view(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+                if iscoroutinefunction(validators):
+                    etag, last_modified = await validators(request, *args, **kwargs)
+                else:
+                    etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+                response = _precondition(request, etag, last_modified)
+                if response is None:
+                    response = _finish(request, await view(request, *args, **kwargs), etag, last_modified)
+                return response
+
+            return async_view
+
+        @wraps(view)
+        def sync_view(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, *args, **kwargs)
+            response = _precondition(request, etag, last_modified)
+            if response is None:
+                response = _finish(request, view(request, *args, **kwargs), etag, last_modified)
+            return response
+
+        return sync_view
+
+    return decorator
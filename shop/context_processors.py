@@ -1,11 +1,13 @@
-from decimal import Decimal
-from shop.utils import get_cart_items
+from django.utils.functional import SimpleLazyObject
+
+from shop.utils import get_cart_summary
 
 
 def cart_counts(request):
-    cart_items, subtotal, shipping, tax, total = get_cart_items(request)
+    # Async views load the summary before rendering, since templates render synchronously.
+    summary = getattr(request, "cart_summary", None) or SimpleLazyObject(lambda: get_cart_summary(request))
     return {
-        "cart_count": sum(item['quantity'] for item in cart_items),
-        "cart_subtotal": subtotal,
-        "cart_total": total,
+        "cart_count": SimpleLazyObject(lambda: summary["count"]),
+        "cart_subtotal": SimpleLazyObject(lambda: summary["subtotal"]),
+        "cart_total": SimpleLazyObject(lambda: summary["total"]),
     }
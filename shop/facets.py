@@ -0,0 +1,177 @@
+import hashlib
+from bisect import bisect_right
+from collections import Counter
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+
+from . import search
+from .models import FacetCount, Product
+from .utils import alist, bump_catalog_version, get_catalog_version
+
+# Lower bounds of the price buckets; the last bucket is open-ended. Changing
+# them needs ``rebuild_facets``.
+PRICE_BUCKETS = (0, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+SEARCH_FACET_TIMEOUT = 300
+
+Row = Tuple[int, int, int]
+
+
+def bucket_for(price) -> int:
+    return max(0, bisect_right(PRICE_BUCKETS, price) - 1)
+
+
+def bucket_bounds(bucket: int) -> Tuple[int, Optional[int]]:
+    upper = PRICE_BUCKETS[bucket + 1] if bucket + 1 < len(PRICE_BUCKETS) else None
+    return PRICE_BUCKETS[bucket], upper
+
+
+def parse_bucket(value) -> Optional[int]:
+    if value is None or not str(value).isdigit() or int(value) >= len(PRICE_BUCKETS):
+        return None
+    return int(value)
+
+
+def price_filter(bucket: int) -> Q:
+    lower, upper = bucket_bounds(bucket)
+    condition = Q(price__gte=lower)
+    if upper is not None:
+        condition &= Q(price__lt=upper)
+    return condition
+
+
+def bucket_expression() -> Case:
+    whens = [When(price__gte=lower, then=Value(i)) for i, lower in reversed(list(enumerate(PRICE_BUCKETS)))]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def _contribution(category_id, price, is_active) -> Optional[Tuple[int, int]]:
+    return (category_id, bucket_for(price)) if is_active else None
+
+
+def snapshot(product) -> Optional[Tuple[int, int]]:
+    """The (category, bucket) cell ``product`` counts towards, or None if it is inactive."""
+    return _contribution(product.category_id, Decimal(product.price), product.is_active)
+
+
+def stored_snapshot(product_id) -> Optional[Tuple[int, int]]:
+    row = Product.objects.filter(pk=product_id).values_list("category_id", "price", "is_active").first()
+    return _contribution(*row) if row else None
+
+
+def adjust(cell: Optional[Tuple[int, int]], delta: int):
+    if cell is None:
+        return
+    category_id, bucket = cell
+    cells = FacetCount.objects.filter(category_id=category_id, bucket=bucket)
+    if cells.update(count=F("count") + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            FacetCount.objects.create(category_id=category_id, bucket=bucket, count=delta)
+    except IntegrityError:
+        # Another request created the cell first.
+        cells.update(count=F("count") + delta)
+
+
+def move(before: Optional[Tuple[int, int]], after: Optional[Tuple[int, int]]):
+    if before != after:
+        adjust(before, -1)
+        adjust(after, 1)
+
+
+def aggregate_rows(products) -> List[Row]:
+    """``(category_id, bucket, count)`` rows for ``products``, computed with one GROUP BY."""
+    return list(_aggregate(products).values_list("category_id", "bucket", "count"))
+
+
+def _aggregate(products):
+    return (
+        products.order_by()
+        .annotate(bucket=bucket_expression())
+        .values("category_id", "bucket")
+        .annotate(count=Count("id"))
+    )
+
+
+def rebuild() -> int:
+    """Recompute the whole table from ``Product``; returns the number of cells."""
+    cells = [
+        FacetCount(category_id=category_id, bucket=bucket, count=count)
+        for category_id, bucket, count in aggregate_rows(Product.objects.filter(is_active=True))
+    ]
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(cells)
+    bump_catalog_version()
+    return len(cells)
+
+
+def _table_key() -> str:
+    return f"shop:facets:{get_catalog_version()}"
+
+
+def _search_key(query: str) -> str:
+    digest = hashlib.md5(search.normalize(query).encode()).hexdigest()
+    return f"shop:facets:{get_catalog_version()}:q:{digest}"
+
+
+def _search_queryset(query: str):
+    return search.search_products(Product.objects.filter(is_active=True), query).order_by()
+
+
+def facet_rows(query: str = "") -> List[Row]:
+    """Rows from the facet table, or for a search, from its result set.
+
+    Both are cached until the catalog version changes, so repeat visits and later
+    pages cost no queries.
+    """
+    if query:
+        key = _search_key(query)
+        rows = cache.get(key)
+        if rows is None:
+            rows = aggregate_rows(_search_queryset(query))
+            cache.set(key, rows, SEARCH_FACET_TIMEOUT)
+        return rows
+    return cache.get_or_set(
+        _table_key(), lambda: list(FacetCount.objects.values_list("category_id", "bucket", "count")), None
+    )
+
+
+async def afacet_rows(query: str = "") -> List[Row]:
+    key = _search_key(query) if query else _table_key()
+    rows = cache.get(key)
+    if rows is None:
+        if query:
+            rows = await alist(_aggregate(_search_queryset(query)).values_list("category_id", "bucket", "count"))
+            cache.set(key, rows, SEARCH_FACET_TIMEOUT)
+        else:
+            rows = await alist(FacetCount.objects.values_list("category_id", "bucket", "count"))
+            cache.set(key, rows, None)
+    return rows
+
+
+def summarize(rows: Iterable[Row], categories, category_id: Optional[int], bucket: Optional[int]) -> dict:
+    """Counts for the sidebar.
+
+    Each facet ignores its own selection, so a shopper sees how many products
+    the other choices would give: category counts respect the price bucket,
+    price counts respect the category.
+    """
+    by_category = Counter()
+    by_bucket = Counter()
+    for row_category, row_bucket, count in rows:
+        if bucket is None or row_bucket == bucket:
+            by_category[row_category] += count
+        if category_id is None or row_category == category_id:
+            by_bucket[row_bucket] += count
+    return {
+        "categories": [(category, by_category[category.id]) for category in categories],
+        "prices": [
+            {"bucket": i, "lower": bucket_bounds(i)[0], "upper": bucket_bounds(i)[1], "count": by_bucket[i]}
+            for i in range(len(PRICE_BUCKETS))
+        ],
+    }
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import mark_safe
+
+from . import sales
+from .models import Category, Product
+from .utils import alist, get_catalog_version
+
+FRAGMENT_TIMEOUT = getattr(settings, "SHOP_FRAGMENT_CACHE_TIMEOUT", 60 * 60)
+CSRF_PLACEHOLDER = "__shop_csrf_token__"
+STATS_KINDS = ("card", "home")
+
+
+def _version_key(product_id: int) -> str:
+    return f"shop:product_version:{product_id}"
+
+
+def bump_product_version(product_id: int):
+    cache.set(_version_key(product_id), time.time_ns(), None)
+
+
+def bump_product_versions(product_ids: Iterable[int]):
+    version = time.time_ns()
+    cache.set_many({_version_key(pk): version for pk in product_ids}, None)
+
+
+def get_product_versions(product_ids: Iterable[int]) -> dict:
+    keys = {_version_key(pk): pk for pk in product_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    missing = {key: time.time_ns() for key, pk in keys.items() if pk not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update({keys[key]: version for key, version in missing.items()})
+    return versions
+
+
+def record_stats(kind: str, hits: int, misses: int):
+    """Count fragment cache hits and misses in the ``default`` cache.
+
+    Only a shared cache sums every worker; a local-memory one counts this
+    process alone, so ``fragment_cache_stats`` refuses to read it.
+    """
+    for name, count in (("hits", hits), ("misses", misses)):
+        if not count:
+            continue
+        key = f"shop:fragment_stats:{kind}:{name}"
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+
+def get_stats() -> dict:
+    keys = [f"shop:fragment_stats:{kind}:{name}" for kind in STATS_KINDS for name in ("hits", "misses")]
+    values = cache.get_many(keys)
+    stats = {}
+    for kind in STATS_KINDS:
+        hits = values.get(f"shop:fragment_stats:{kind}:hits", 0)
+        misses = values.get(f"shop:fragment_stats:{kind}:misses", 0)
+        total = hits + misses
+        stats[kind] = {"hits": hits, "misses": misses, "hit_rate": hits / total if total else None}
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([f"shop:fragment_stats:{kind}:{name}" for kind in STATS_KINDS for name in ("hits", "misses")])
+
+
+def render_product_cards(products: Iterable[Product], request=None, compact: bool = False) -> List[str]:
+    """Render ``product_card.html`` for each product, reusing cached HTML across pages and users.
+
+    Cards are cached with a CSRF placeholder and the visitor's token is swapped in on
+    the way out, so one cached copy is safe to share.
+    """
+    products = list(products)
+    if not products:
+        return []
+    versions = get_product_versions(product.id for product in products)
+    language = translation.get_language()
+    keys = {
+        product.id: f"shop:fragment:card:{product.id}:{versions[product.id]}:{int(bool(compact))}:{language}"
+        for product in products
+    }
+    cached = cache.get_many(keys.values())
+
+    rendered = {}
+    for product in products:
+        if keys[product.id] not in cached:
+            html = render_to_string(
+                "shop/includes/product_card.html",
+                {"product": product, "compact": compact, "csrf_token": CSRF_PLACEHOLDER},
+            )
+            rendered[keys[product.id]] = html
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+    record_stats("card", len(products) - len(rendered), len(rendered))
+
+    token = get_token(request) if request is not None else ""
+    return [
+        mark_safe((cached.get(keys[product.id]) or rendered[keys[product.id]]).replace(CSRF_PLACEHOLDER, token))
+        for product in products
+    ]
+
+
+def _home_querysets() -> dict:
+    return {
+        "categories": Category.objects.all()[:6],
+        "featured_products": Product.objects.filter(is_active=True).order_by("-created_at")[:8],
+    }
+
+
+def _home_key() -> str:
+    return f"shop:fragment:home:{get_catalog_version()}"
+
+
+def get_home_sections() -> dict:
+    key = _home_key()
+    sections = cache.get(key)
+    if sections is None:
+        sections = {name: list(queryset) for name, queryset in _home_querysets().items()}
+        # Ranked by the sales aggregates; refreshed when this entry expires.
+        sections["best_sellers"] = sales.best_sellers()
+        cache.set(key, sections, FRAGMENT_TIMEOUT)
+        record_stats("home", 0, 1)
+    else:
+        record_stats("home", 1, 0)
+    return sections
+
+
+async def aget_home_sections() -> dict:
+    """``get_home_sections`` for async views, running the three section queries together."""
+    key = _home_key()
+    sections = cache.get(key)
+    if sections is None:
+        querysets = _home_querysets()
+        results = await asyncio.gather(*(alist(queryset) for queryset in querysets.values()), sales.abest_sellers())
+        sections = dict(zip([*querysets, "best_sellers"], results))
+        cache.set(key, sections, FRAGMENT_TIMEOUT)
+        record_stats("home", 0, 1)
+    else:
+        record_stats("home", 1, 0)
+    return sections
@@ -0,0 +1,112 @@
+import hashlib
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+DERIVATIVE_ROOT = "derivatives"
+# Target widths; heights follow the source aspect ratio and sources are never upscaled.
+VARIANTS = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 900,
+    "zoom": 1600,
+}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def generate_variants(name: str, storage=default_storage) -> dict:
+    """Write every variant of the image stored at ``name`` and describe them.
+
+    File names carry a hash of the source bytes plus the width, so a variant URL
+    never changes content and can be served with a far-future cache header.
+    """
+    with storage.open(name, "rb") as source_file:
+        data = source_file.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    stem = PurePosixPath(name).stem[:60]
+
+    with Image.open(BytesIO(data)) as opened:
+        source = ImageOps.exif_transpose(opened)
+        source.load()
+
+    variants = {"source": name, "width": source.width, "height": source.height}
+    for variant, target_width in VARIANTS.items():
+        width = min(target_width, source.width)
+        height = max(1, round(source.height * width / source.width))
+        resized = None
+        entry = {"width": width, "height": height}
+        for fmt, (pil_format, save_options) in FORMATS.items():
+            path = f"{DERIVATIVE_ROOT}/{stem}-{digest}-{width}.{fmt}"
+            if not storage.exists(path):
+                if resized is None:
+                    resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+                image = resized
+                if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                buffer = BytesIO()
+                image.save(buffer, format=pil_format, **save_options)
+                storage.save(path, ContentFile(buffer.getvalue()))
+            entry[fmt] = path
+        variants[variant] = entry
+    return variants
+
+
+def ensure_variants(instance, field_name: str = "image") -> bool:
+    """Generate variants for ``instance``'s image unless they match the current upload.
+
+    Returns True when ``image_variants`` was updated. A missing or unreadable
+    source is left alone; templates then fall back to the original file.
+    """
+    field = getattr(instance, field_name)
+    if not field or (instance.image_variants or {}).get("source") == field.name:
+        return False
+    try:
+        variants = generate_variants(field.name, storage=field.storage)
+    except OSError:
+        return False
+    # The srcset changes the rendered page, so move the conditional-GET validators too.
+    updated_at = timezone.now()
+    type(instance).objects.filter(pk=instance.pk).update(image_variants=variants, updated_at=updated_at)
+    instance.image_variants = variants
+    instance.updated_at = updated_at
+    return True
+
+
+def srcset(variants: dict, fmt: str) -> str:
+    entries = {}
+    for variant in VARIANTS:
+        entry = (variants or {}).get(variant)
+        if entry and fmt in entry:
+            entries[entry["width"]] = default_storage.url(entry[fmt])
+    return ", ".join(f"{url} {width}w" for width, url in sorted(entries.items()))
+
+
+def variant_url(image, variants: dict, variant: str, fmt: str = "jpeg") -> str:
+    entry = (variants or {}).get(variant)
+    if entry and fmt in entry:
+        return default_storage.url(entry[fmt])
+    return image.url if image else ""
+
+
+def render_placeholder(path, text: str, color, size=(900, 1100)):
+    """Solid-colour JPEG with ``text`` centred, used for demo and generated catalogs."""
+    width, height = size
+    img = Image.new("RGB", (width, height), color)
+    draw = ImageDraw.Draw(img)
+    short = text[:18]
+    try:
+        font = ImageFont.truetype("arial.ttf", 42)
+    except Exception:
+        font = ImageFont.load_default()
+    bbox = draw.textbbox((0, 0), short, font=font)
+    text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    draw.text(((width - text_width) / 2, (height - text_height) / 2), short, fill=(255, 255, 255), font=font)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    img.save(path, format="JPEG", quality=85)
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from shop import facets
+from shop.models import FacetCount, Product
+from shop.search import FTS_TABLE
+
+FACET_TABLE = FacetCount._meta.db_table
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN QUERY PLAN on the catalog views' queries and fail on full scans or temp B-tree sorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan, not only problems")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN auditing is only implemented for SQLite.")
+        product = Product.objects.filter(is_active=True).select_related("category").first()
+        if product is None:
+            raise CommandError("No active products to audit against; seed the catalog first.")
+
+        # A dummy cache makes every view run its full set of queries.
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            CACHES={**settings.CACHES, "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+        ):
+            problems = self._audit(product, options["verbose_plans"])
+
+        if problems:
+            for name, sql, detail in problems:
+                self.stderr.write(f"{name}: {detail}\n    {sql}")
+            raise CommandError(f"{len(problems)} query plan problem(s) found.")
+        self.stdout.write(self.style.SUCCESS("All catalog queries use indexes."))
+
+    def _scenarios(self, product):
+        product_list = reverse("shop:product_list")
+        search_term = product.name.split()[0]
+        # (name, url, params, temp B-tree allowed): search results are sorted by
+        # BM25 rank, which only exists for the matching rows; a price filter is
+        # a range on the price index whose rows are re-sorted by date.
+        return [
+            ("home", reverse("shop:home"), {}, False),
+            ("product_list", product_list, {}, False),
+            ("product_list newest", product_list, {"sort": "newest"}, False),
+            ("product_list price_asc", product_list, {"sort": "price_asc"}, False),
+            ("product_list price_desc", product_list, {"sort": "price_desc"}, False),
+            ("product_list category", product_list, {"category": product.category.slug}, False),
+            ("product_list price", product_list, {"price": facets.bucket_for(product.price)}, True),
+            ("product_list search", product_list, {"q": search_term}, True),
+            ("product_detail", product.get_absolute_url(), {}, False),
+            ("cart", reverse("shop:cart"), {}, False),
+        ]
+
+    def _audit(self, product, verbose):
+        client = Client()
+        client.post(reverse("shop:add_to_cart"), {"product_id": product.id, "quantity": 1})
+
+        problems = []
+        for name, url, params, allow_temp_sort in self._scenarios(product):
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url, params)
+            if response.status_code != 200:
+                raise CommandError(f"{name}: {url} returned {response.status_code}")
+            for query in ctx.captured_queries:
+                sql = query["sql"]
+                if not sql.lstrip().upper().startswith("SELECT") or "shop_" not in sql:
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                    plan = [row[-1] for row in cursor.fetchall()]
+                for detail in plan:
+                    if verbose:
+                        self.stdout.write(f"{name}: {detail}")
+                    if _is_full_scan(detail) or ("TEMP B-TREE" in detail and not allow_temp_sort):
+                        problems.append((name, sql, detail))
+        return problems
+
+
+def _is_full_scan(detail: str) -> bool:
+    # The facet table is read whole on purpose: one row per category and price bucket.
+    if not detail.startswith("SCAN ") or " USING " in detail or FTS_TABLE in detail or FACET_TABLE in detail:
+        return False
+    return "shop_" in detail
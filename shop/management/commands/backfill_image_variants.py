@@ -0,0 +1,81 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop import fragments, images
+from shop.models import Product, ProductImage
+from shop.utils import bump_catalog_version
+
+
+def _init_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def _generate(name):
+    try:
+        return name, images.generate_variants(name), None
+    except OSError as exc:
+        return name, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate responsive image variants for every product and gallery image"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--force", action="store_true", help="Regenerate even if variants are up to date")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Many rows share one upload (seed data, gallery copies), so work is keyed by file name.
+        pending = defaultdict(list)
+        for model in (Product, ProductImage):
+            for pk, name, variants in model.objects.values_list("pk", "image", "image_variants").iterator():
+                if name and (options["force"] or (variants or {}).get("source") != name):
+                    pending[name].append((model, pk))
+
+        if not pending:
+            self.stdout.write("All image variants are up to date.")
+            return
+
+        started = time.perf_counter()
+        updates = defaultdict(list)
+        updated_at = timezone.now()
+        failures = 0
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as pool:
+            futures = [pool.submit(_generate, name) for name in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                name, variants, error = future.result()
+                if error:
+                    failures += 1
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    for model, pk in pending[name]:
+                        updates[model].append(model(pk=pk, image_variants=variants, updated_at=updated_at))
+                if done % 100 == 0:
+                    self.stdout.write(f"{done}/{len(pending)} files processed")
+
+        for model, objs in updates.items():
+            model.objects.bulk_update(objs, ["image_variants", "updated_at"], batch_size=options["batch_size"])
+        if updates:
+            product_ids = {obj.pk for obj in updates[Product]}
+            product_ids.update(
+                ProductImage.objects.filter(pk__in=[obj.pk for obj in updates[ProductImage]]).values_list("product_id", flat=True)
+            )
+            fragments.bump_product_versions(product_ids)
+            bump_catalog_version()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {len(pending)} files for {sum(len(objs) for objs in updates.values())} rows "
+                f"in {elapsed:.1f}s ({failures} failed)."
+            )
+        )
@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from shop import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Compare requests/second and tail latency of the sync views under WSGI with the async views under ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per page and mode")
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--only", nargs="*", help="Page names to run")
+        parser.add_argument("--output", help="Write results as JSON to this path")
+
+    def handle(self, *args, **options):
+        try:
+            targets = benchmarks.load_targets()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options["only"]:
+            targets = {name: target for name, target in targets.items() if name in options["only"]}
+
+        modes = {
+            "wsgi": (False, benchmarks.wsgi_load),
+            "asgi": (True, benchmarks.asgi_load),
+        }
+        report = {"requests": options["requests"], "concurrency": options["concurrency"], "pages": {}}
+        self.stdout.write(f"{'page':<22}{'mode':<6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+        for name, target in targets.items():
+            report["pages"][name] = {}
+            for mode, (use_async, load) in modes.items():
+                with override_settings(
+                    DEBUG=False,
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                    ROOT_URLCONF=benchmarks.root_urlconf(use_async),
+                ):
+                    load(target, min(options["requests"], 20), options["concurrency"])  # warm caches
+                    summary = load(target, options["requests"], options["concurrency"]).summary()
+                report["pages"][name][mode] = summary
+                self.stdout.write(
+                    f"{name:<22}{mode:<6}{summary['rps']:>9.1f}{summary['p50_ms']:>9.1f}"
+                    f"{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}{summary['errors']:>8}"
+                )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        if any(summary["errors"] for page in report["pages"].values() for summary in page.values()):
+            raise CommandError("Some requests did not return 200.")
@@ -0,0 +1,88 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from shop import benchmarks, sessions
+from shop.models import Order, Product
+
+
+class Command(BaseCommand):
+    help = "Benchmark the shop views through the test client and enforce query-count and p95 latency budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--only", nargs="*", help="Scenario names to run")
+        parser.add_argument("--output", help="Write results as JSON to this path")
+        parser.add_argument("--budgets", help='JSON file overriding budgets: {"home": {"max_queries": 2, "p95_ms": 80}}')
+        parser.add_argument("--no-latency-budgets", action="store_true",
+                            help="Only enforce query budgets (useful on noisy CI machines)")
+        parser.add_argument("--cold-cache", action="store_true", help="Run with a dummy cache backend")
+
+    def handle(self, *args, **options):
+        overrides = {"ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"]}
+        if options["cold_cache"]:
+            overrides["CACHES"] = {**settings.CACHES, "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+        # Everything runs in one transaction that is rolled back, so checkout and
+        # cart writes never reach the benchmarked database.
+        with override_settings(**overrides), transaction.atomic():
+            user = benchmarks.benchmark_user()
+            try:
+                scenarios = benchmarks.build_scenarios(user)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            if options["only"]:
+                scenarios = [s for s in scenarios if s.name in options["only"]]
+            self._apply_budgets(scenarios, options["budgets"], options["no_latency_budgets"])
+            dataset = {"products": Product.objects.count(), "orders": Order.objects.count()}
+            try:
+                results = benchmarks.run(scenarios, options["iterations"], options["warmup"], user)
+            except AssertionError as exc:
+                raise CommandError(str(exc))
+            transaction.set_rollback(True)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "cache": "dummy" if options["cold_cache"] else settings.CACHES["default"]["BACKEND"],
+            "sessions": "write-behind" if sessions.write_behind() else "database",
+            "dataset": dataset,
+            "scenarios": {},
+        }
+        self.stdout.write(f"{'scenario':<26}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'bytes':>10}")
+        for scenario in scenarios:
+            summary = results[scenario.name].summary()
+            summary["budget"] = {"max_queries": scenario.max_queries, "p95_ms": scenario.p95_ms}
+            report["scenarios"][scenario.name] = summary
+            self.stdout.write(
+                f"{scenario.name:<26}{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}"
+                f"{summary['queries_max']:>9}{summary['bytes']:>10}"
+            )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+        failures = benchmarks.check_budgets(scenarios, results)
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f"{len(failures)} budget(s) exceeded.")
+        self.stdout.write(self.style.SUCCESS("All views within budget."))
+
+    def _apply_budgets(self, scenarios, path, skip_latency):
+        overrides = json.loads(Path(path).read_text(encoding="utf-8")) if path else {}
+        for scenario in scenarios:
+            for key, value in overrides.get(scenario.name, {}).items():
+                setattr(scenario, key, value)
+            if skip_latency:
+                scenario.p95_ms = float("inf")
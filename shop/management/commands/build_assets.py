@@ -0,0 +1,52 @@
+import shutil
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile static/css/app.css from the utility classes the templates use, then collect static files "
+        "under hashed names with precompressed copies"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fonts-from", type=Path,
+                            help="Unpacked Vazirmatn release to vendor the .woff2 files and OFL.txt from "
+                                 "into static/fonts")
+        parser.add_argument("--allow-missing-fonts", action="store_true",
+                            help="Build even when static/fonts lacks Vazirmatn (pages use the system font)")
+        parser.add_argument("--no-collect", action="store_true",
+                            help="Only write the stylesheet; skip collectstatic")
+
+    def handle(self, *args, **options):
+        if options["fonts_from"]:
+            self._vendor_fonts(options["fonts_from"])
+        missing = assets.missing_fonts()
+        if missing and not options["allow_missing_fonts"]:
+            raise CommandError(
+                f"static/fonts is missing {', '.join(missing)}; vendor them with --fonts-from "
+                "<unpacked Vazirmatn release>."
+            )
+        built = assets.build_css()
+        self.stdout.write(
+            f"Wrote {built['path']} ({built['rules']} rules, {built['bytes'] / 1024:.1f} KiB, "
+            f"{built['fonts']} font faces)."
+        )
+        if not options["no_collect"]:
+            call_command("collectstatic", interactive=False, verbosity=options["verbosity"])
+        self.stdout.write(self.style.SUCCESS("Static assets built."))
+
+    def _vendor_fonts(self, source: Path):
+        target = assets.static_dir() / assets.FONT_DIR
+        target.mkdir(parents=True, exist_ok=True)
+        files = {filename: sorted(source.rglob(filename)) for filename in (*assets.FONT_FILES, assets.FONT_LICENSE)}
+        missing = [filename for filename, matches in files.items() if not matches]
+        if missing:
+            raise CommandError(f"{', '.join(missing)} not found under {source}.")
+        for filename, matches in files.items():
+            shutil.copyfile(matches[0], target / filename)
+        self.stdout.write(f"Vendored {len(files)} files into {target}.")
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the co-purchase recommendation table from order history; run it nightly"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=recommendations.TOP_K, help="Neighbours kept per product")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Order lines read per query")
+        parser.add_argument("--partition-size", type=int, default=50_000,
+                            help="Products whose counts are held in memory per pass over the orders")
+        parser.add_argument("--min-support", type=int, default=1,
+                            help="Orders two products must share before one is recommended for the other")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(lower, upper, rows):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  products {lower}-{upper - 1}: {rows} rows")
+
+        written = recommendations.build(
+            top_k=options["top_k"],
+            chunk_size=options["chunk_size"],
+            partition_size=options["partition_size"],
+            min_support=options["min_support"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {written} recommendations in {time.perf_counter() - started:.1f}s.")
+        )
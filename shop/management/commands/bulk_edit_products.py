@@ -0,0 +1,63 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import bulk
+from shop.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprice, put on or take off sale, activate or deactivate products in bulk, "
+        "with set-based updates instead of per-product saves"
+    )
+
+    def add_arguments(self, parser):
+        scope = parser.add_mutually_exclusive_group(required=True)
+        scope.add_argument("--category", action="append", metavar="SLUG",
+                           help="Only products of this category; repeat for several")
+        scope.add_argument("--all", action="store_true", help="Every product in the catalog")
+        operation = parser.add_mutually_exclusive_group(required=True)
+        operation.add_argument("--percent", type=Decimal, help="Change prices by this percentage (-10 for 10%% off)")
+        operation.add_argument("--amount", type=Decimal, help="Change prices by this fixed amount")
+        operation.add_argument("--sale", type=Decimal, metavar="PERCENT",
+                               help="Sell at this percentage off the regular price, kept in compare_at_price")
+        operation.add_argument("--end-sale", action="store_true", help="Restore regular prices from compare_at_price")
+        operation.add_argument("--activate", action="store_true")
+        operation.add_argument("--deactivate", action="store_true")
+        parser.add_argument("--round-to", type=Decimal, help="Round new prices to a multiple of this (e.g. 1000)")
+        parser.add_argument("--chunk-size", type=int, default=bulk.CHUNK_SIZE, help="Products updated per statement")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many products match")
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options["category"]:
+            slugs = set(options["category"])
+            categories = list(Category.objects.filter(slug__in=slugs).values_list("pk", "slug"))
+            missing = slugs - {slug for _, slug in categories}
+            if missing:
+                raise CommandError(f"Unknown categories: {', '.join(sorted(missing))}.")
+            products = products.filter(category__in=[pk for pk, _ in categories])
+        if options["dry_run"]:
+            self.stdout.write(f"{products.count()} products match; nothing changed.")
+            return
+
+        started = time.perf_counter()
+        chunk_size, round_to = options["chunk_size"], options["round_to"]
+        try:
+            if options["percent"] is not None:
+                updated = bulk.reprice(products, percent=options["percent"], round_to=round_to, chunk_size=chunk_size)
+            elif options["amount"] is not None:
+                updated = bulk.reprice(products, amount=options["amount"], round_to=round_to, chunk_size=chunk_size)
+            elif options["sale"] is not None:
+                updated = bulk.start_sale(products, options["sale"], round_to=round_to, chunk_size=chunk_size)
+            elif options["end_sale"]:
+                updated = bulk.end_sale(products, chunk_size)
+            else:
+                updated = bulk.set_active(products, options["activate"], chunk_size)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {updated} products in {time.perf_counter() - started:.1f}s."
+        ))
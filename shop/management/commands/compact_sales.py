@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop import sales
+
+
+class Command(BaseCommand):
+    help = "Roll the 7/30-day sales windows forward and drop expired daily rows; run it daily"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Recompute every aggregate from order history first (after bulk order writes)")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            products = sales.rebuild()
+            self.stdout.write(f"Rebuilt sales for {products} products.")
+        active = sales.compact()
+        self.stdout.write(self.style.SUCCESS(f"Compacted sales windows; {active} products sold in the last {sales.LONG_WINDOW} days."))
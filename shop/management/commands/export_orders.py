@@ -0,0 +1,47 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from shop import exports
+from shop.models import Order
+
+
+class Command(BaseCommand):
+    help = "Stream orders with their lines and line totals to CSV or JSON Lines in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--output", help="File to write; defaults to stdout")
+        parser.add_argument("--since", help="First day to include (YYYY-MM-DD, local time)")
+        parser.add_argument("--until", help="Last day to include (YYYY-MM-DD, local time)")
+        parser.add_argument("--status", action="append", choices=[value for value, _ in Order.STATUS_CHOICES],
+                            help="Only these statuses; repeat for several")
+        parser.add_argument("--chunk-size", type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options["since"]:
+            orders = orders.filter(created_at__gte=self._day_start(options["since"]))
+        if options["until"]:
+            orders = orders.filter(created_at__lt=self._day_start(options["until"]) + timedelta(days=1))
+        if options["status"]:
+            orders = orders.filter(status__in=options["status"])
+
+        rows = exports.rows(orders, options["format"], options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(rows)
+        else:
+            for row in rows:
+                self.stdout.write(row, ending="")
+
+    def _day_start(self, value):
+        try:
+            day = parse_date(value)
+        except ValueError:  # well formed but impossible, e.g. 2024-13-45
+            day = None
+        if day is None:
+            raise CommandError(f"Not a date: {value!r}; use YYYY-MM-DD.")
+        return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,27 @@
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import fragments
+from shop.sessions import PROCESS_LOCAL_CACHES
+
+
+class Command(BaseCommand):
+    help = "Show hit rates of the product card and home page fragment caches (needs a shared default cache)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counters after printing them")
+
+    def handle(self, *args, **options):
+        # The web workers count into the default cache; a process-local one is
+        # this command's own, empty copy.
+        if isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES):
+            raise CommandError(
+                "The default cache is local to each process, so the workers' counters cannot be read; "
+                "configure a shared cache such as Redis or Memcached."
+            )
+        for kind, stats in fragments.get_stats().items():
+            rate = "-" if stats["hit_rate"] is None else f"{stats['hit_rate']:.1%}"
+            self.stdout.write(f"{kind:<6} hits={stats['hits']:<10} misses={stats['misses']:<10} hit_rate={rate}")
+        if options["reset"]:
+            fragments.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
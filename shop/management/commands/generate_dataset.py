@@ -0,0 +1,259 @@
+import itertools
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop import facets, recommendations, sales, search
+from shop.images import render_placeholder
+from shop.models import Category, Order, OrderItem, Product, ProductImage
+from shop.utils import calculate_totals
+
+CATEGORY_WORDS = [
+    "کالای دیجیتال", "مد و پوشاک", "خانه و آشپزخانه", "زیبایی و سلامت", "ورزش و سفر",
+    "کتاب و لوازم تحریر", "اسباب بازی", "ابزار و تجهیزات", "خودرو و موتور", "سوپرمارکت",
+]
+NOUNS = [
+    "هدفون", "ساعت هوشمند", "کفش", "کت", "بلندگو", "زودپز", "ماسک صورت", "دمبل", "کتانی", "گلدان",
+    "برس", "کوله پشتی", "هودی", "مانیتور", "چراغ مطالعه", "کیف", "لیوان", "تی‌شرت", "شلوار", "قابلمه",
+    "دوچرخه", "چادر", "کرم", "عطر", "ماوس", "کیبورد", "فلاسک", "پتو", "بالش", "میز تحریر",
+]
+ADJECTIVES = [
+    "بی‌سیم", "ضدآب", "سبک", "حرفه‌ای", "کلاسیک", "مینیمال", "اسپرت", "نرم", "تاشو", "هوشمند",
+    "چرمی", "سرامیکی", "استیل", "پنبه‌ای", "قابل حمل", "مسافرتی", "روزمره", "زمستانی", "تابستانی", "لوکس",
+]
+BRANDS = ["آلفا", "نوا", "پارسه", "آریا", "سپهر", "کاوه", "رادین", "ماهان", "ترنج", "آوا", "زاگرس", "البرز"]
+SENTENCES = [
+    "مناسب برای استفاده روزمره و سفر.",
+    "با کیفیت ساخت بالا و ضمانت بازگشت هفت روزه.",
+    "طراحی ارگونومیک برای راحتی بیشتر.",
+    "دارای گارانتی اصالت و سلامت فیزیکی کالا.",
+    "بسته‌بندی ویژه و ارسال سریع به سراسر ایران.",
+    "ساخته شده از مواد اولیه مرغوب و بادوام.",
+    "انتخابی محبوب میان خریداران این دسته.",
+    "قابل شستشو و نگهداری آسان.",
+]
+FIRST_NAMES = ["سارا", "علی", "مریم", "رضا", "زهرا", "محمد", "نرگس", "حسین", "فاطمه", "امیر", "الهام", "مهدی"]
+LAST_NAMES = ["محمدی", "حسینی", "رضایی", "کریمی", "احمدی", "موسوی", "جعفری", "صادقی", "کاظمی", "رحیمی"]
+CITIES = ["تهران", "مشهد", "اصفهان", "شیراز", "تبریز", "کرج", "اهواز", "قم", "رشت", "کرمان"]
+STREETS = ["ولیعصر", "انقلاب", "آزادی", "شریعتی", "بهار", "فردوسی", "حافظ", "سعدی"]
+# Order amounts are DecimalField(max_digits=10, decimal_places=2).
+MAX_PRICE = 20_000_000
+MAX_ORDER_SUBTOTAL = Decimal("80000000")
+STATUS_WEIGHTS = [("delivered", 60), ("shipped", 12), ("processing", 10), ("pending", 10), ("cancelled", 8)]
+# Dates are spread back from here, not from today, so a seed always gives the same rows.
+DEFAULT_END_DATE = date(2026, 1, 1)
+
+
+def _render(args):
+    path, text, color = args
+    if not path.exists():
+        render_placeholder(path, text, color)
+    return path
+
+
+class Command(BaseCommand):
+    help = "Generate a large, reproducible synthetic catalog with users and order history for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--gallery", type=int, default=2, help="Gallery images per product")
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--max-items", type=int, default=5, help="Maximum lines per order")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--prefix", default="gen", help="Slug/username prefix, to keep datasets apart")
+        parser.add_argument("--days", type=int, default=365, help="Spread products and orders over this many days")
+        parser.add_argument("--end-date", type=date.fromisoformat, default=DEFAULT_END_DATE,
+                            help="Date everything is created before (YYYY-MM-DD); pass today's for recent sales")
+        parser.add_argument("--image-pool", type=int, default=24,
+                            help="Distinct placeholder images shared by all products; 0 renders one per product")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--popularity-skew", type=float, default=1.1,
+                            help="Zipf exponent for how often products appear in orders")
+        parser.add_argument("--skip-index", action="store_true", help="Do not rebuild the search index afterwards")
+
+    def handle(self, *args, **options):
+        if Category.objects.filter(slug__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Data with prefix {options['prefix']!r} already exists; pass another --prefix.")
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.end = timezone.make_aware(datetime.combine(options["end_date"], dt_time.min))
+        self.days = options["days"]
+        prefix = options["prefix"]
+        started = time.perf_counter()
+
+        categories = self._step("categories", self._categories, options["categories"], prefix)
+        images = self._step("images", self._images, options, prefix)
+        products = self._step("products", self._products, options["products"], categories, images, prefix)
+        self._step("gallery", self._gallery, products, options["gallery"], images)
+        users = self._step("users", self._users, options["users"], prefix)
+        self._step("orders", self._orders, options, products, users)
+
+        # Bulk inserts skip the facet and sales hooks; facets.rebuild() also bumps the catalog version.
+        self._step("facets", facets.rebuild)
+        self._step("sales", sales.rebuild)
+        self._step("recommendations", recommendations.build)
+        if not options["skip_index"]:
+            self._step("search index", search.rebuild_index)
+        self.stdout.write(self.style.SUCCESS(f"Dataset generated in {time.perf_counter() - started:.1f}s."))
+
+    def _step(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        count = len(result) if hasattr(result, "__len__") else result
+        self.stdout.write(f"{label}: {count} in {time.perf_counter() - started:.1f}s")
+        return result
+
+    def _spread_dates(self, objs):
+        for obj in objs:
+            obj.created_at = self.end - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    def _insert(self, model, objs, dated=False):
+        """bulk_create in batches; ``created_at`` is auto_now_add, so spread dates are written back after insert."""
+        created = []
+        for start in range(0, len(objs), self.batch_size):
+            batch = model.objects.bulk_create(objs[start:start + self.batch_size])
+            if dated:
+                self._spread_dates(batch)
+                model.objects.bulk_update(batch, ["created_at"])
+            created.extend(batch)
+        return created
+
+    def _categories(self, count, prefix):
+        objs = []
+        for i in range(count):
+            base = CATEGORY_WORDS[i % len(CATEGORY_WORDS)]
+            name = base if i < len(CATEGORY_WORDS) else f"{base} {i // len(CATEGORY_WORDS) + 1}"
+            objs.append(Category(name=f"{name} ({prefix})", slug=f"{prefix}-cat-{i}"))
+        return Category.objects.bulk_create(objs)
+
+    def _images(self, options, prefix):
+        pool = options["image_pool"] or options["products"]
+        directory = Path(settings.MEDIA_ROOT) / "generated" / prefix
+        jobs = []
+        for i in range(pool):
+            color = (self.rng.randint(80, 140), self.rng.randint(160, 220), self.rng.randint(120, 200))
+            jobs.append((directory / f"{i:07d}.jpg", f"{prefix} #{i}", color))
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            list(executor.map(_render, jobs, chunksize=max(1, len(jobs) // (options["workers"] * 4))))
+        return [f"generated/{prefix}/{path.name}" for path, _, _ in jobs]
+
+    def _price(self):
+        # Log-normal around ~1.5M toman, rounded to the nearest 10,000 like real listings.
+        value = math.exp(self.rng.gauss(14.2, 1.0))
+        return Decimal(min(MAX_PRICE, max(10000, int(round(value, -4)))))
+
+    def _products(self, count, categories, images, prefix):
+        objs = []
+        for i in range(count):
+            noun, adjective, brand = self.rng.choice(NOUNS), self.rng.choice(ADJECTIVES), self.rng.choice(BRANDS)
+            price = self._price()
+            on_sale = self.rng.random() < 0.35
+            description = " ".join(self.rng.sample(SENTENCES, 3))
+            objs.append(
+                Product(
+                    category=self.rng.choice(categories),
+                    name=f"{noun} {adjective} {brand} مدل {i + 1}",
+                    slug=f"{prefix}-{i}",
+                    description=f"{noun} {adjective} از برند {brand}. {description}",
+                    price=price,
+                    compare_at_price=(price * Decimal(self.rng.choice(["1.1", "1.2", "1.3", "1.5"]))).quantize(Decimal("1"))
+                    if on_sale else None,
+                    image=images[i % len(images)] if len(images) == count else self.rng.choice(images),
+                    is_active=self.rng.random() > 0.03,
+                    rating=Decimal(self.rng.randint(30, 50)) / 10,
+                )
+            )
+        return self._insert(Product, objs, dated=True)
+
+    def _gallery(self, products, per_product, images):
+        objs = [
+            ProductImage(product=product, image=self.rng.choice(images), alt_text=product.name, sort_order=n)
+            for product in products
+            for n in range(per_product)
+        ]
+        return len(self._insert(ProductImage, objs))
+
+    def _users(self, count, prefix):
+        password = make_password(f"{prefix}-password")
+        User = get_user_model()
+        objs = []
+        for i in range(count):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            objs.append(
+                User(
+                    username=f"{prefix}-user-{i}",
+                    email=f"{prefix}-user-{i}@example.com",
+                    first_name=first,
+                    last_name=last,
+                    password=password,
+                )
+            )
+        return self._insert(User, objs)
+
+    def _orders(self, options, products, users):
+        if not products or not options["orders"]:
+            return 0
+        # Skewed popularity: the product at rank r is picked with weight 1 / r**skew.
+        ranked = products[:]
+        self.rng.shuffle(ranked)
+        cum_weights = list(itertools.accumulate(1 / (rank ** options["popularity_skew"]) for rank in range(1, len(ranked) + 1)))
+        statuses, status_weights = zip(*STATUS_WEIGHTS)
+
+        created = 0
+        remaining = options["orders"]
+        while remaining:
+            size = min(self.batch_size, remaining)
+            orders, lines = [], []
+            for _ in range(size):
+                user = self.rng.choice(users) if users else None
+                picked = {p.pk: p for p in self.rng.choices(ranked, cum_weights=cum_weights, k=self.rng.randint(1, options["max_items"]))}
+                order_lines, subtotal = [], Decimal("0")
+                for product in picked.values():
+                    quantity = self.rng.choice([1, 1, 1, 2, 3])
+                    if order_lines and subtotal + product.price * quantity > MAX_ORDER_SUBTOTAL:
+                        break
+                    order_lines.append((product, quantity))
+                    subtotal += product.price * quantity
+                subtotal, shipping, tax, total = calculate_totals(subtotal)
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                orders.append(
+                    Order(
+                        user=user,
+                        status=self.rng.choices(statuses, weights=status_weights)[0],
+                        full_name=f"{first} {last}",
+                        email=user.email if user else "guest@example.com",
+                        address=f"خیابان {self.rng.choice(STREETS)}، پلاک {self.rng.randint(1, 300)}",
+                        city=self.rng.choice(CITIES),
+                        postal_code=f"{self.rng.randrange(10 ** 9, 10 ** 10)}",
+                        subtotal=subtotal,
+                        shipping=shipping,
+                        tax=tax,
+                        total=total,
+                    )
+                )
+                lines.append(order_lines)
+            orders = self._insert(Order, orders, dated=True)
+            items = [
+                OrderItem(order=order, product=product, name=product.name, price=product.price, quantity=quantity)
+                for order, order_lines in zip(orders, lines)
+                for product, quantity in order_lines
+            ]
+            OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+            created += size
+            remaining -= size
+            self.stdout.write(f"  orders {created}/{options['orders']}")
+        return created
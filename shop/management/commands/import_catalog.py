@@ -0,0 +1,201 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from shop import facets, fragments, search
+from shop.models import Category, Product
+
+# Columns a feed may carry besides the required name/category/price.
+OPTIONAL_FIELDS = ("description", "compare_at_price", "image", "is_active", "rating")
+TRUE_VALUES = {"1", "true", "yes", "y", "on", "بله"}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _decimal(value, field, required=False):
+    if value in (None, ""):
+        if required:
+            raise RowError(f"missing {field}")
+        return None
+    try:
+        return Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        raise RowError(f"invalid {field}: {value!r}")
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSONL product feed into the catalog with batched upserts keyed on slug"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file; columns: name, category, price, and optionally "
+                                         "slug, category_slug, description, compare_at_price, image, is_active, rating")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Validate the feed without writing anything")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist.")
+        fmt = options["format"] or ("jsonl" if path.suffix.lower() in (".jsonl", ".ndjson") else "csv")
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+
+        self.categories = {category.slug: category for category in Category.objects.all()}
+        self.categories_by_name = {category.name: category for category in self.categories.values()}
+        started = time.perf_counter()
+        self.skipped = 0
+        imported = batches = 0
+        batch = []
+
+        with path.open(encoding="utf-8-sig", newline="") as handle:
+            for line_no, row in self._rows(handle, fmt):
+                try:
+                    batch.append(self._build(row))
+                except RowError as exc:
+                    self.skipped += 1
+                    self.stderr.write(f"line {line_no}: {exc}")
+                    continue
+                if len(batch) >= batch_size:
+                    imported += self._flush(batch, batches + 1, dry_run)
+                    batches += 1
+                    batch = []
+        if batch:
+            imported += self._flush(batch, batches + 1, dry_run)
+            batches += 1
+
+        if imported and not dry_run:
+            # Bulk upserts skip the facet signals; rebuild() also bumps the catalog version.
+            facets.rebuild()
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        verb = "Validated" if dry_run else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {imported} products in {batches} batches, skipped {self.skipped}, "
+                f"{elapsed:.1f}s ({rate:,.0f} rows/s)."
+            )
+        )
+
+    def _rows(self, handle, fmt):
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(handle), start=2):
+                yield line_no, row
+            return
+        for line_no, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise CommandError(f"line {line_no}: invalid JSON ({exc.msg})")
+
+    def _build(self, row):
+        name = (row.get("name") or "").strip()
+        category_name = (row.get("category") or "").strip()
+        if not name:
+            raise RowError("missing name")
+        if not category_name:
+            raise RowError("missing category")
+
+        product = Product(
+            name=name,
+            slug=(row.get("slug") or "").strip() or slugify(name, allow_unicode=True),
+            category=self._category(category_name, (row.get("category_slug") or "").strip()),
+            description=row.get("description") or "",
+            price=_decimal(row.get("price"), "price", required=True),
+            compare_at_price=_decimal(row.get("compare_at_price"), "compare_at_price"),
+            image=(row.get("image") or "").strip(),
+            is_active=_bool(row["is_active"]) if row.get("is_active") not in (None, "") else True,
+        )
+        rating = _decimal(row.get("rating"), "rating")
+        if rating is not None:
+            product.rating = rating
+        # Each row owns the columns it carries; absent ones are left untouched on update.
+        product._feed_fields = tuple(field for field in OPTIONAL_FIELDS if field in row)
+        return product
+
+    def _category(self, name, slug):
+        if slug:
+            category = self.categories.get(slug)
+            if category is None and name in self.categories_by_name:
+                raise RowError(
+                    f"category {name!r} already exists with slug {self.categories_by_name[name].slug!r}, not {slug!r}"
+                )
+        else:
+            # Without a slug the name identifies the category, whatever slug it was created with.
+            category = self.categories_by_name.get(name)
+            slug = slugify(name, allow_unicode=True)
+            if category is None:
+                category = self.categories.get(slug)
+        if category is None:
+            category = Category(name=name, slug=slug)
+            self.categories[slug] = category
+            self.categories_by_name[name] = category
+        return category
+
+    def _save_categories(self, batch):
+        """Insert the batch's new categories; returns the rows whose category could not be saved."""
+        new_categories = {p.category.slug: p.category for p in batch if p.category.pk is None}
+        if not new_categories:
+            return []
+        Category.objects.bulk_create(new_categories.values(), ignore_conflicts=True)
+        # A conflict on the unique name or slug inserts nothing; only an exact match is ours to use.
+        saved = {
+            (slug, name): pk for pk, slug, name in Category.objects.filter(slug__in=new_categories).values_list(
+                "pk", "slug", "name"
+            )
+        }
+        for category in new_categories.values():
+            category.pk = saved.get((category.slug, category.name))
+        return [product for product in batch if product.category.pk is None]
+
+    def _flush(self, batch, number, dry_run):
+        started = time.perf_counter()
+        # A slug repeated within one batch keeps its last row; one upsert cannot touch a row twice.
+        batch = list({product.slug: product for product in batch}.values())
+        if not dry_run:
+            with transaction.atomic():
+                failed = self._save_categories(batch)
+                for product in failed:
+                    self.stderr.write(
+                        f"{product.slug}: category {product.category.name!r} ({product.category.slug}) "
+                        "conflicts with an existing category"
+                    )
+                    batch.remove(product)
+                self.skipped += len(failed)
+                groups = defaultdict(list)
+                for product in batch:
+                    product.category_id = product.category.pk
+                    groups[product._feed_fields].append(product)
+                for feed_fields, products in groups.items():
+                    Product.objects.bulk_create(
+                        products,
+                        update_conflicts=True,
+                        unique_fields=["slug"],
+                        update_fields=["name", "category", "price", "updated_at", *feed_fields],
+                    )
+                # Index the rows as stored: columns a feed row leaves out keep their old values.
+                saved = list(Product.objects.filter(slug__in=[p.slug for p in batch]).select_related("category"))
+                search.index_products([product for product in saved if product.is_active])
+                search.remove_products([product.pk for product in saved if not product.is_active])
+            fragments.bump_product_versions(product.pk for product in saved)
+        self.stdout.write(f"batch {number}: {len(batch)} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return len(batch)
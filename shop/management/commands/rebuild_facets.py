@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop import facets
+
+
+class Command(BaseCommand):
+    help = "Recompute the category and price-bucket facet counts from the product table"
+
+    def handle(self, *args, **options):
+        cells = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {cells} facet cells."))
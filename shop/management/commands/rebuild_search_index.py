@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 product search index from the products table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=search.INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            raise CommandError("Full-text search index requires the SQLite backend.")
+        count = search.rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
@@ -0,0 +1,98 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from shop import metrics, tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background tasks (order follow-ups and the like) from the database queue; "
+        "stop with SIGTERM or Ctrl-C, which lets the current batch finish"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=1,
+                            help="Worker threads per process; tasks mostly wait on I/O such as SMTP")
+        parser.add_argument("--processes", type=int, default=1,
+                            help="Worker processes to fork, each running --threads threads")
+        parser.add_argument("--batch-size", type=int, default=20, help="Tasks claimed per query")
+        parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="Seconds to wait before looking again when nothing is due")
+        parser.add_argument("--stats-interval", type=float, default=60,
+                            help="Seconds between throughput and queue depth log lines; 0 turns them off")
+        parser.add_argument("--once", action="store_true", help="Exit once nothing is due instead of polling")
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1 or options["processes"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--threads, --processes and --batch-size must be at least 1.")
+        if options["processes"] == 1:
+            self.serve(options)
+            return
+        # Children must not share the parent's database connections.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        children = [context.Process(target=self.serve, args=(options,)) for _ in range(options["processes"])]
+        for child in children:
+            child.start()
+        # Pass SIGTERM on; each child stops after its current batch.
+        signal.signal(signal.SIGTERM, lambda *_: [child.terminate() for child in children])
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            # Ctrl-C reached the whole process group; wait for the batches in flight.
+            for child in children:
+                child.join()
+
+    def serve(self, options):
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+        workers = [
+            tasks.Worker(tasks.worker_name(index), options["batch_size"], options["poll_interval"], stop)
+            for index in range(options["threads"])
+        ]
+        threads = [
+            threading.Thread(target=self._work, args=(worker, options["once"]), name=worker.name, daemon=True)
+            for worker in workers
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Worker {tasks.worker_name()} started with {len(threads)} threads.")
+        started = last_report = time.monotonic()
+        last_processed = 0
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+            now = time.monotonic()
+            if options["stats_interval"] and now - last_report >= options["stats_interval"]:
+                processed = sum(worker.processed for worker in workers)
+                self._report(processed - last_processed, now - last_report)
+                last_report, last_processed = now, processed
+        processed = sum(worker.processed for worker in workers)
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker {tasks.worker_name()} ran {processed} tasks in {time.monotonic() - started:.1f}s."
+        ))
+        connections.close_all()
+
+    def _work(self, worker, once):
+        try:
+            worker.run(once=once)
+        finally:
+            connections.close_all()
+
+    def _report(self, processed: int, seconds: float):
+        gauges = metrics.queue_gauges()
+        depth = ", ".join(
+            f"{dict(labels)['status']} {count:g}"
+            for (name, labels), count in sorted(gauges.items())
+            if name == "shop_task_queue_depth"
+        )
+        lag = gauges[("shop_task_queue_lag_seconds", ())]
+        self.stdout.write(f"{processed / seconds:.1f} tasks/s; queue: {depth}; lag {lag:.1f}s")
+        connections.close_all()
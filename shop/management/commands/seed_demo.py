@@ -4,8 +4,8 @@ from random import randint
 
 from django.core.management.base import BaseCommand
 from django.utils.text import slugify
-from PIL import Image, ImageDraw, ImageFont
 
+from shop.images import render_placeholder
 from shop.models import Category, Product, ProductImage
 
 CATEGORIES = [
@@ -75,17 +75,5 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS("Seed data created."))
 
     def _create_placeholder(self, path: Path, text: str):
-        width, height = 900, 1100
         color = (randint(80, 140), randint(160, 220), randint(120, 200))
-        img = Image.new("RGB", (width, height), color)
-        draw = ImageDraw.Draw(img)
-        short = text[:18]
-        try:
-            font = ImageFont.truetype("arial.ttf", 42)
-        except Exception:
-            font = ImageFont.load_default()
-        bbox = draw.textbbox((0, 0), short, font=font)
-        text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
-        draw.text(((width - text_width) / 2, (height - text_height) / 2), short, fill=(255, 255, 255), font=font)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        img.save(path, format="JPEG", quality=85)
+        render_placeholder(path, text, color)
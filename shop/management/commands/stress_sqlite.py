@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Place orders from many threads against a scratch SQLite file with Django's stock connection, the "
+        "configured profile without its write queue, and the full profile; compare lock errors and throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--transactions", type=int, default=50, help="Orders per thread")
+        parser.add_argument("--profile", nargs="*", choices=["stock", "no-queue", "tuned"],
+                            default=["stock", "no-queue", "tuned"])
+        parser.add_argument("--output", help="Write results as JSON to this path")
+
+    def handle(self, *args, **options):
+        profiles = benchmarks.sqlite_profiles()
+        if profiles["tuned"]["ENGINE"] == profiles["stock"]["ENGINE"] and not profiles["tuned"]["OPTIONS"]:
+            self.stdout.write(self.style.WARNING("The default database has no connection profile; both runs match."))
+        if "sqlite" not in profiles["tuned"]["ENGINE"]:
+            raise CommandError("The default database is not SQLite.")
+        attempts = options["threads"] * options["transactions"]
+        report = {"threads": options["threads"], "transactions": options["transactions"], "profiles": {}}
+        self.stdout.write(f"{'profile':<10}{'tx/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}{'error %':>9}")
+        for name in options["profile"]:
+            result = benchmarks.sqlite_write_load(profiles[name], options["threads"], options["transactions"])
+            summary = result.summary()
+            summary["error_rate"] = round(result.errors / attempts, 4)
+            report["profiles"][name] = summary
+            self.stdout.write(
+                f"{name:<10}{summary['rps']:>9.1f}{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}"
+                f"{summary['p99_ms']:>9.1f}{summary['errors']:>8}{summary['error_rate'] * 100:>8.1f}%"
+            )
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.connection import ConnectionDoesNotExist
+
+
+def sqlite_path(name) -> Path:
+    """The file behind a SQLite ``NAME``, which may be a ``file:...?mode=ro`` URI."""
+    name = str(name)
+    if name.startswith("file:"):
+        name = name[len("file:"):].split("?", 1)[0]
+    return Path(name)
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary into a read replica's file as a consistent snapshot; "
+        "with --interval, keep doing so (a local stand-in for real replication)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="replica", help="Replica alias to refresh (default: replica)")
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Seconds between snapshots; keep it under SHOP_REPLICA_PIN_SECONDS. 0 copies once")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        try:
+            replica = connections[alias]
+        except ConnectionDoesNotExist:
+            raise CommandError(f"Unknown replica alias {alias!r}; set SHOP_REPLICA_PATH to configure one.")
+        if alias == DEFAULT_DB_ALIAS:
+            raise CommandError("The primary cannot be its own replica.")
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+            raise CommandError("Only SQLite files can be snapshotted; use the database's own replication.")
+        target = sqlite_path(replica.settings_dict["NAME"])
+        while True:
+            started = time.monotonic()
+            self.snapshot(primary, target)
+            self.stdout.write(f"Copied the primary to {target} in {time.monotonic() - started:.2f}s.")
+            if not options["interval"]:
+                break
+            time.sleep(max(0.0, options["interval"] - (time.monotonic() - started)))
+
+    def snapshot(self, primary, target: Path):
+        # The backup API copies a consistent snapshot even while the primary is
+        # written to; swapping the file in with a rename means readers see either
+        # the old or the new snapshot, never a partial one.
+        primary.ensure_connection()
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        destination = sqlite3.connect(tmp)
+        try:
+            primary.connection.backup(destination)
+            # A rollback-journal file can be opened read-only without -wal/-shm files.
+            destination.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            destination.close()
+        os.replace(tmp, target)
@@ -0,0 +1,357 @@
+import ipaddress
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.models import Count, Min
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+from django.utils import timezone
+
+from .models import Task
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+FLUSH_INTERVAL = 1.0
+
+METRICS = {
+    "shop_http_requests_total": ("counter", "Requests by resolved view and status code."),
+    "shop_http_request_duration_seconds": ("histogram", "Request latency by resolved view."),
+    "shop_http_response_size_bytes": ("histogram", "Response body size by resolved view."),
+    "shop_db_queries_total": ("counter", "SQL statements executed by resolved view."),
+    "shop_db_query_duration_seconds_total": ("counter", "Time spent in SQL by resolved view."),
+    "shop_template_render_seconds_total": ("counter", "Time spent rendering templates by resolved view."),
+    "shop_tasks_total": ("counter", "Background tasks run, by task and outcome (done, retried, failed)."),
+    "shop_task_duration_seconds": ("histogram", "Background task run time by task."),
+    "shop_task_queue_depth": ("gauge", "Background tasks in the queue table by status."),
+    "shop_task_queue_lag_seconds": ("gauge", "How long the oldest due task has been waiting."),
+}
+
+HISTOGRAM_BUCKETS = {
+    "shop_http_request_duration_seconds": DURATION_BUCKETS,
+    "shop_http_response_size_bytes": SIZE_BUCKETS,
+    "shop_task_duration_seconds": DURATION_BUCKETS,
+}
+
+_current = ContextVar("shop_request_stats", default=None)
+_sql_observers = ContextVar("shop_sql_observers", default=())
+
+
+@contextmanager
+def observe_sql(observer):
+    """Call ``observer(sql, seconds)`` for every statement run in this context.
+
+    Context variables follow a request into ``sync_to_async`` threads, so this
+    also sees the queries of async views, unlike ``connection.execute_wrapper``.
+    """
+    token = _sql_observers.set(_sql_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _sql_observers.reset(token)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    observers = _sql_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for observer in observers:
+            observer(sql, elapsed)
+
+
+def install_sql_wrapper(connection):
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_time", "template_time", "rendering")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, sql, seconds):
+        self.queries += 1
+        self.sql_time += seconds
+
+
+class _Registry:
+    """Per-thread counter dicts, so recording never takes a lock.
+
+    Each thread only ever writes to its own dict; readers sum all of them. The lock
+    is taken once per thread, when its dict is registered.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tables = []
+        self._last_flush = 0.0
+
+    def table(self) -> dict:
+        table = getattr(self._local, "table", None)
+        if table is None:
+            table = defaultdict(float)
+            self._local.table = table
+            with self._lock:
+                self._tables.append(table)
+        return table
+
+    def snapshot(self) -> dict:
+        totals = defaultdict(float)
+        with self._lock:
+            tables = list(self._tables)
+        for table in tables:
+            for key, value in list(table.items()):
+                totals[key] += value
+        return totals
+
+    def reset(self):
+        with self._lock:
+            for table in self._tables:
+                table.clear()
+
+
+registry = _Registry()
+
+
+def _observe(table, name, labels, value):
+    buckets = HISTOGRAM_BUCKETS[name]
+    index = bisect_left(buckets, value)
+    le = str(buckets[index]) if index < len(buckets) else "+Inf"
+    table[(f"{name}_bucket", labels + (("le", le),))] += 1
+    table[(f"{name}_sum", labels)] += value
+    table[(f"{name}_count", labels)] += 1
+
+
+def record_request(view: str, status: int, duration: float, stats: RequestStats, size: int):
+    table = registry.table()
+    labels = (("view", view),)
+    table[("shop_http_requests_total", labels + (("status", str(status)),))] += 1
+    _observe(table, "shop_http_request_duration_seconds", labels, duration)
+    _observe(table, "shop_http_response_size_bytes", labels, size)
+    table[("shop_db_queries_total", labels)] += stats.queries
+    table[("shop_db_query_duration_seconds_total", labels)] += stats.sql_time
+    table[("shop_template_render_seconds_total", labels)] += stats.template_time
+    maybe_flush()
+
+
+def record_task(name: str, outcome: str, duration: float):
+    table = registry.table()
+    labels = (("task", name),)
+    table[("shop_tasks_total", labels + (("outcome", outcome),))] += 1
+    _observe(table, "shop_task_duration_seconds", labels, duration)
+
+
+def queue_gauges() -> dict:
+    """Current queue depth and lag, read from the ``Task`` table (the same for every process)."""
+    now = timezone.now()
+    depth = {status: 0 for status, _ in Task.STATUS_CHOICES}
+    for status, count in Task.objects.values_list("status").annotate(count=Count("id")).order_by():
+        depth[status] = count
+    oldest = Task.objects.filter(status="queued", run_at__lte=now).aggregate(oldest=Min("run_at"))["oldest"]
+    gauges = {("shop_task_queue_depth", (("status", status),)): count for status, count in depth.items()}
+    gauges[("shop_task_queue_lag_seconds", ())] = (now - oldest).total_seconds() if oldest else 0.0
+    return gauges
+
+
+def _metrics_dir():
+    directory = getattr(settings, "SHOP_METRICS_DIR", None)
+    return Path(directory) if directory else None
+
+
+def maybe_flush(force: bool = False):
+    """Write this process's totals to ``SHOP_METRICS_DIR`` at most once per ``FLUSH_INTERVAL``."""
+    directory = _metrics_dir()
+    now = time.monotonic()
+    if directory is None or (not force and now - registry._last_flush < FLUSH_INTERVAL):
+        return
+    registry._last_flush = now
+    directory.mkdir(parents=True, exist_ok=True)
+    rows = [[name, list(labels), value] for (name, labels), value in registry.snapshot().items()]
+    tmp = directory / f".metrics-{os.getpid()}-{threading.get_ident()}.tmp"
+    tmp.write_text(json.dumps(rows))
+    os.replace(tmp, directory / f"metrics-{os.getpid()}.json")
+
+
+def collect() -> dict:
+    """Totals across every worker process that has flushed into ``SHOP_METRICS_DIR``."""
+    directory = _metrics_dir()
+    if directory is None:
+        return registry.snapshot()
+    maybe_flush(force=True)
+    totals = defaultdict(float)
+    for path in directory.glob("metrics-*.json"):
+        try:
+            rows = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in rows:
+            totals[(name, tuple(tuple(label) for label in labels))] += value
+    return totals
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _bucket_order(le: str) -> float:
+    return float("inf") if le == "+Inf" else float(le)
+
+
+def render_prometheus(totals: dict) -> str:
+    by_metric = defaultdict(list)
+    for (name, labels), value in totals.items():
+        base = name
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+                base = name[: -len(suffix)]
+        by_metric[base].append((name, labels, value))
+
+    lines = []
+    for base, (kind, help_text) in METRICS.items():
+        samples = by_metric.get(base)
+        if not samples:
+            continue
+        lines.append(f"# HELP {base} {help_text}")
+        lines.append(f"# TYPE {base} {kind}")
+        if kind != "histogram":
+            for name, labels, value in sorted(samples):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            continue
+        buckets = defaultdict(dict)
+        rest = []
+        for name, labels, value in samples:
+            if name.endswith("_bucket"):
+                le = dict(labels)["le"]
+                buckets[tuple(label for label in labels if label[0] != "le")][le] = value
+            else:
+                rest.append((name, labels, value))
+        for labels, counts in sorted(buckets.items()):
+            bounds = [str(b) for b in HISTOGRAM_BUCKETS[base]] + ["+Inf"]
+            running = 0.0
+            for le in sorted(set(bounds) | set(counts), key=_bucket_order):
+                running += counts.get(le, 0)
+                lines.append(f"{base}_bucket{_format_labels(labels + (('le', le),))} {running:g}")
+        for name, labels, value in sorted(rest):
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def scrape_allowed(request) -> bool:
+    """Closed unless ``SHOP_METRICS_TOKEN`` or ``SHOP_METRICS_ALLOWED_IPS`` lets the request in."""
+    token = getattr(settings, "SHOP_METRICS_TOKEN", None)
+    if token and request.headers.get("Authorization") == f"Bearer {token}":
+        return True
+    networks = getattr(settings, "SHOP_METRICS_ALLOWED_IPS", ())
+    if not networks:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in networks)
+
+
+def metrics_view(request):
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    totals = collect()
+    totals.update(queue_gauges())
+    return HttpResponse(render_prometheus(totals), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with observe_sql(stats):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with observe_sql(stats):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, stats, started)
+        return response
+
+    def _record(self, request, response, stats, started):
+        duration = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        size = 0 if response.streaming else len(response.content)
+        record_request(view, response.status_code, duration, stats, size)
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None or stats.rendering:
+            return self._template.render(context, request)
+        # Only the outermost render is timed; nested renders (cached cards) are part of it.
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The stock Django template backend, reporting render time to ``MetricsMiddleware``."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
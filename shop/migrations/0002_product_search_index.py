@@ -0,0 +1,65 @@
+import re
+
+from django.db import migrations
+
+# A frozen copy of shop.search as of this migration, so later changes there
+# cannot change what it does. ``rebuild_search_index`` reindexes with the
+# current rules.
+FTS_TABLE = "shop_product_fts"
+
+_TRANSLATION = str.maketrans(
+    {
+        "\u064a": "\u06cc",  # Arabic yeh -> Persian yeh
+        "\u0649": "\u06cc",  # alef maksura -> Persian yeh
+        "\u0643": "\u06a9",  # Arabic kaf -> Persian keheh
+        "\u0629": "\u0647",  # teh marbuta -> heh
+        "\u0640": None,  # tatweel
+        "\u200c": None,  # ZWNJ
+        **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+        **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic digits
+    }
+)
+_DIACRITICS = re.compile("[\u064b-\u0652\u0670]")
+
+
+def normalize(text):
+    text = _DIACRITICS.sub("", (text or "").translate(_TRANSLATION))
+    return " ".join(text.lower().split())
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Product = apps.get_model("shop", "Product")
+    rows = [
+        (p.id, normalize(p.name), normalize(p.description), normalize(p.category.name), p.category.slug)
+        for p in Product.objects.filter(is_active=True).select_related("category").iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, description, category, category_slug UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, category_slug) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, IntegerField, Value, When
+
+# shop.facets.PRICE_BUCKETS as of this migration; ``rebuild_facets`` recounts with the current ones.
+PRICE_BUCKETS = (0, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+
+def populate_facets(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    FacetCount = apps.get_model("shop", "FacetCount")
+    whens = [When(price__gte=lower, then=Value(i)) for i, lower in reversed(list(enumerate(PRICE_BUCKETS)))]
+    rows = (
+        Product.objects.filter(is_active=True)
+        .order_by()
+        .annotate(bucket=Case(*whens, default=Value(0), output_field=IntegerField()))
+        .values("category_id", "bucket")
+        .annotate(count=Count("id"))
+    )
+    FacetCount.objects.bulk_create(FacetCount(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField(verbose_name='بازه قیمت')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='تعداد')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='shop.category', verbose_name='دسته\u200cبندی')),
+            ],
+            options={
+                'verbose_name': 'شمارش فیلتر',
+                'verbose_name_plural': 'شمارش فیلترها',
+                'constraints': [models.UniqueConstraint(fields=('category', 'bucket'), name='facetcount_category_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
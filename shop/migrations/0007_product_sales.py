@@ -0,0 +1,98 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:43
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+# shop.sales as of this migration; ``compact_sales`` and ``rebuild()`` use the current rules.
+SHORT_WINDOW = 7
+LONG_WINDOW = 30
+MONEY = models.DecimalField(max_digits=14, decimal_places=2)
+
+
+def _window_start(today, days):
+    return timezone.make_aware(datetime.combine(today - timedelta(days=days - 1), time.min))
+
+
+def _total(expression, output_field=models.IntegerField(), **filters):
+    condition = Q(**filters) if filters else None
+    zero = Decimal("0") if isinstance(output_field, models.DecimalField) else 0
+    return Coalesce(Sum(expression, filter=condition, output_field=output_field), Value(zero), output_field=output_field)
+
+
+def populate_sales(apps, schema_editor):
+    OrderItem = apps.get_model("shop", "OrderItem")
+    ProductSales = apps.get_model("shop", "ProductSales")
+    ProductSalesDay = apps.get_model("shop", "ProductSalesDay")
+    lines = OrderItem.objects.filter(product__isnull=False).exclude(order__status="cancelled")
+    today = timezone.localdate()
+    short_start, long_start = _window_start(today, SHORT_WINDOW), _window_start(today, LONG_WINDOW)
+    line_total = F("price") * F("quantity")
+    totals = (
+        lines.order_by()
+        .values("product_id")
+        .annotate(
+            units=_total("quantity"),
+            revenue=_total(line_total, MONEY),
+            units_7d=_total("quantity", order__created_at__gte=short_start),
+            units_30d=_total("quantity", order__created_at__gte=long_start),
+            revenue_30d=_total(line_total, MONEY, order__created_at__gte=long_start),
+        )
+    )
+    days = (
+        lines.filter(order__created_at__gte=long_start)
+        .order_by()
+        .annotate(day=TruncDate("order__created_at"))
+        .values("product_id", "day")
+        .annotate(units=_total("quantity"), revenue=_total(line_total, MONEY))
+    )
+    ProductSales.objects.bulk_create((ProductSales(**row) for row in totals), batch_size=1000)
+    ProductSalesDay.objects.bulk_create((ProductSalesDay(**row) for row in days), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_product_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='shop.product', verbose_name='محصول')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='تعداد فروش')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='درآمد')),
+                ('units_7d', models.PositiveIntegerField(default=0, verbose_name='فروش ۷ روز')),
+                ('units_30d', models.PositiveIntegerField(default=0, verbose_name='فروش ۳۰ روز')),
+                ('revenue_30d', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='درآمد ۳۰ روز')),
+            ],
+            options={
+                'verbose_name': 'آمار فروش محصول',
+                'verbose_name_plural': 'آمار فروش محصولات',
+                'indexes': [models.Index(fields=['-units_30d', '-units'], name='productsales_best_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='روز')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='تعداد فروش')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='درآمد')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.product', verbose_name='محصول')),
+            ],
+            options={
+                'verbose_name': 'فروش روزانه',
+                'verbose_name_plural': 'فروش روزانه',
+                'indexes': [models.Index(fields=['day'], name='productsalesday_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='productsalesday_product_day_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_recorded_orders(apps, schema_editor):
+    # Until now checkout counted every order in the sales aggregates right away.
+    Order = apps.get_model("shop", "Order")
+    Order.objects.exclude(status="cancelled").update(sales_recorded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='sales_recorded',
+            field=models.BooleanField(default=False, editable=False, verbose_name='ثبت در آمار فروش'),
+        ),
+        migrations.RunPython(mark_recorded_orders, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='نام')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='داده\u200cها')),
+                ('key', models.CharField(blank=True, default='', max_length=100, verbose_name='کلید')),
+                ('status', models.CharField(choices=[('queued', 'در صف'), ('running', 'در حال اجرا'), ('failed', 'ناموفق')], default='queued', max_length=10, verbose_name='وضعیت')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='تعداد تلاش')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='زمان اجرا')),
+                ('locked_by', models.CharField(blank=True, default='', max_length=100, verbose_name='پردازشگر')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='قفل تا')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='آخرین خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+            ],
+            options={
+                'verbose_name': 'کار پس\u200cزمینه',
+                'verbose_name_plural': 'کارهای پس\u200cزمینه',
+                'indexes': [models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'queued'), models.Q(('key', ''), _negated=True)), fields=('key',), name='task_queued_key_uniq')],
+            },
+        ),
+    ]
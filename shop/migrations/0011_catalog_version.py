@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(verbose_name='نسخه')),
+            ],
+            options={
+                'verbose_name': 'نسخه کاتالوگ',
+                'verbose_name_plural': 'نسخه کاتالوگ',
+            },
+        ),
+    ]
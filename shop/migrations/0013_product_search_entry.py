@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_admin_name_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='shop.product', verbose_name='محصول')),
+                ('document', models.TextField(db_column='shop_product_fts', editable=False)),
+                ('category_slug', models.CharField(max_length=140, verbose_name='اسلاگ دسته\u200cبندی')),
+            ],
+            options={
+                'verbose_name': 'نمایه جستجوی محصول',
+                'verbose_name_plural': 'نمایه جستجوی محصولات',
+                'db_table': 'shop_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,12 +1,15 @@
 from decimal import Decimal
 from django.db import models
+from django.db.models.functions import Collate
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.text import slugify
 
 
 class Category(models.Model):
     name = models.CharField(max_length=120, unique=True, verbose_name="دسته‌بندی")
     slug = models.SlugField(max_length=140, unique=True, verbose_name="اسلاگ")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ به‌روزرسانی")
 
     class Meta:
         ordering = ["name"]
@@ -30,12 +33,24 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="قیمت")
     compare_at_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="قیمت قبل")
     image = models.ImageField(upload_to="products/", verbose_name="تصویر اصلی")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="نسخه‌های تصویر")
     is_active = models.BooleanField(default=True, verbose_name="فعال")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ به‌روزرسانی")
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal("4.6"), verbose_name="امتیاز")
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "id"], condition=models.Q(is_active=True), name="product_active_newest_idx"),
+            models.Index(fields=["category", "-created_at", "id"], condition=models.Q(is_active=True), name="product_cat_active_newest_idx"),
+            models.Index(fields=["price", "id"], condition=models.Q(is_active=True), name="product_active_price_idx"),
+            models.Index(fields=["-price", "id"], condition=models.Q(is_active=True), name="product_active_price_desc_idx"),
+            # Admin changelist order and date hierarchy, which include inactive products.
+            models.Index(fields=["created_at", "id"], name="product_created_idx"),
+            # Admin search by name prefix; SQLite only serves a LIKE from a NOCASE index.
+            models.Index(Collate("name", "NOCASE"), name="product_name_prefix_idx"),
+        ]
         verbose_name = "محصول"
         verbose_name_plural = "محصولات"
 
@@ -58,14 +73,124 @@ class Product(models.Model):
         return reverse("shop:product_detail", kwargs={"slug": self.slug})
 
 
+class ProductSearchEntry(models.Model):
+    """A row of the FTS5 index ``shop.search`` maintains, so search can join it through the ORM.
+
+    The table is created by migration 0002 and written with raw SQL; this model is only read.
+    """
+
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column="rowid", db_constraint=False, on_delete=models.DO_NOTHING,
+        related_name="search_entry", verbose_name="محصول",
+    )
+    # FTS5's hidden column named after the table: the left-hand side of MATCH.
+    document = models.TextField(db_column="shop_product_fts", editable=False)
+    category_slug = models.CharField(max_length=140, verbose_name="اسلاگ دسته‌بندی")
+
+    class Meta:
+        managed = False
+        db_table = "shop_product_fts"
+        verbose_name = "نمایه جستجوی محصول"
+        verbose_name_plural = "نمایه جستجوی محصولات"
+
+
+class FacetCount(models.Model):
+    """Active products per (category, price bucket); see ``shop.facets``."""
+
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="facet_counts", verbose_name="دسته‌بندی")
+    bucket = models.PositiveSmallIntegerField(verbose_name="بازه قیمت")
+    count = models.PositiveIntegerField(default=0, verbose_name="تعداد")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["category", "bucket"], name="facetcount_category_bucket_uniq"),
+        ]
+        verbose_name = "شمارش فیلتر"
+        verbose_name_plural = "شمارش فیلترها"
+
+    def __str__(self):
+        return f"{self.category_id}/{self.bucket}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+    """Top-K co-purchased products per product, written by ``build_recommendations``."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommendations", verbose_name="محصول")
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommended_for", verbose_name="محصول پیشنهادی")
+    rank = models.PositiveSmallIntegerField(verbose_name="رتبه")
+    score = models.FloatField(verbose_name="امتیاز")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="recommendation_product_rank_uniq"),
+        ]
+        verbose_name = "پیشنهاد محصول"
+        verbose_name_plural = "پیشنهادهای محصول"
+
+    def __str__(self):
+        return f"{self.product_id} → {self.recommended_id} ({self.rank})"
+
+
+class ProductSales(models.Model):
+    """Running sales totals per product; maintained by ``shop.sales``.
+
+    The 7/30-day windows grow with each order and are trimmed back to the
+    window by ``compact_sales``.
+    """
+
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="sales", verbose_name="محصول")
+    units = models.PositiveIntegerField(default=0, verbose_name="تعداد فروش")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="درآمد")
+    units_7d = models.PositiveIntegerField(default=0, verbose_name="فروش ۷ روز")
+    units_30d = models.PositiveIntegerField(default=0, verbose_name="فروش ۳۰ روز")
+    revenue_30d = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="درآمد ۳۰ روز")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-units_30d", "-units"], name="productsales_best_idx"),
+        ]
+        verbose_name = "آمار فروش محصول"
+        verbose_name_plural = "آمار فروش محصولات"
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units}"
+
+
+class ProductSalesDay(models.Model):
+    """Units and revenue per product and day, kept for the rolling windows."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales", verbose_name="محصول")
+    day = models.DateField(verbose_name="روز")
+    units = models.PositiveIntegerField(default=0, verbose_name="تعداد فروش")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="درآمد")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "day"], name="productsalesday_product_day_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="productsalesday_day_idx"),
+        ]
+        verbose_name = "فروش روزانه"
+        verbose_name_plural = "فروش روزانه"
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.day}: {self.units}"
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="gallery", verbose_name="محصول")
     image = models.ImageField(upload_to="products/gallery/", verbose_name="تصویر")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="نسخه‌های تصویر")
     alt_text = models.CharField(max_length=255, blank=True, verbose_name="متن جایگزین")
     sort_order = models.PositiveIntegerField(default=0, verbose_name="ترتیب")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ به‌روزرسانی")
 
     class Meta:
         ordering = ["sort_order"]
+        indexes = [
+            models.Index(fields=["product", "sort_order"], name="productimage_product_order_idx"),
+        ]
         verbose_name = "تصویر گالری"
         verbose_name_plural = "تصاویر گالری"
 
@@ -95,9 +220,16 @@ class Order(models.Model):
     tax = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="مالیات")
     total = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="مبلغ کل")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+    # Whether the lines are counted in the sales aggregates; see ``sales.apply_order``.
+    sales_recorded = models.BooleanField(default=False, editable=False, verbose_name="ثبت در آمار فروش")
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="order_user_created_idx"),
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+            models.Index(fields=["email"], name="order_email_idx"),
+        ]
         verbose_name = "سفارش"
         verbose_name_plural = "سفارش‌ها"
 
@@ -127,4 +259,58 @@ class OrderItem(models.Model):
     def line_total(self):
         return self.price * self.quantity
 
+
+class Task(models.Model):
+    """Background work for ``manage.py run_worker``; see ``shop.tasks``.
+
+    Finished tasks are deleted; a task that used up its attempts stays behind
+    as ``failed`` for inspection.
+    """
+
+    STATUS_CHOICES = [
+        ("queued", "در صف"),
+        ("running", "در حال اجرا"),
+        ("failed", "ناموفق"),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="نام")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="داده‌ها")
+    # At most one queued task per non-empty key; later enqueues are dropped.
+    key = models.CharField(max_length=100, blank=True, default="", verbose_name="کلید")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued", verbose_name="وضعیت")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="تعداد تلاش")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="زمان اجرا")
+    locked_by = models.CharField(max_length=100, blank=True, default="", verbose_name="پردازشگر")
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name="قفل تا")
+    last_error = models.TextField(blank=True, default="", verbose_name="آخرین خطا")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="task_status_run_at_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"], condition=models.Q(status="queued") & ~models.Q(key=""), name="task_queued_key_uniq"
+            ),
+        ]
+        verbose_name = "کار پس‌زمینه"
+        verbose_name_plural = "کارهای پس‌زمینه"
+
+    def __str__(self):
+        return f"{self.name} #{self.id}"
+
+
+class CatalogVersion(models.Model):
+    """A single row with the latest catalog version, for workers that do not share a cache; see ``shop.utils``."""
+
+    version = models.BigIntegerField(verbose_name="نسخه")
+
+    class Meta:
+        verbose_name = "نسخه کاتالوگ"
+        verbose_name_plural = "نسخه کاتالوگ"
+
+    def __str__(self):
+        return str(self.version)
+
 # Create your models here.
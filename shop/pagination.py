@@ -0,0 +1,201 @@
+import hashlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min, Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = "shop.pagination.cursor"
+COUNT_CACHE_TIMEOUT = 300
+
+
+class KeysetPage:
+    def __init__(self, object_list: List, next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Cursor pagination over ``ordering``, which must end in a unique field such as ``id``.
+
+    Each page is one indexed range query of ``per_page + 1`` rows, so deep pages cost the
+    same as the first one and there is no ``COUNT(*)``.
+    """
+
+    def __init__(self, queryset, ordering: Sequence[str], per_page: int = 12):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    def get_page(self, cursor: Optional[str]) -> KeysetPage:
+        queryset, position, backwards = self._page_query(cursor)
+        return self._build_page(list(queryset), position, backwards)
+
+    async def aget_page(self, cursor: Optional[str]) -> KeysetPage:
+        queryset, position, backwards = self._page_query(cursor)
+        return self._build_page([row async for row in queryset], position, backwards)
+
+    def _page_query(self, cursor: Optional[str]):
+        position = self._decode(cursor)
+        backwards = position is not None and position["d"] == "p"
+        ordering = [_flip(field) for field in self.ordering] if backwards else self.ordering
+
+        queryset = self.queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(_after(ordering, position["v"]))
+        return queryset[: self.per_page + 1], position, backwards
+
+    def _build_page(self, rows: List, position: Optional[dict], backwards: bool) -> KeysetPage:
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = self._encode(rows[-1], "n")
+            if position is not None and (has_more or not backwards):
+                previous_cursor = self._encode(rows[0], "p")
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def _encode(self, obj, direction: str) -> str:
+        values = [_dump(getattr(obj, field.lstrip("-"))) for field in self.ordering]
+        return signing.dumps({"v": values, "d": direction}, salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor: Optional[str]) -> Optional[dict]:
+        if not cursor:
+            return None
+        try:
+            position = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+        if not isinstance(position, dict) or len(position.get("v", ())) != len(self.ordering):
+            return None
+        try:
+            position["v"] = [self._parse(field, value) for field, value in zip(self.ordering, position["v"])]
+        except ValidationError:
+            return None
+        return position
+
+    def _parse(self, field: str, value):
+        try:
+            model_field = self.queryset.model._meta.get_field(field.lstrip("-"))
+        except FieldDoesNotExist:
+            return value
+        value = model_field.to_python(value)
+        if value is None:
+            raise ValidationError("empty cursor value")
+        return value
+
+
+def _flip(field: str) -> str:
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _dump(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _after(ordering: Sequence[str], values: Sequence) -> Q:
+    """Rows strictly after ``values`` in ``ordering``, e.g. ``a < x OR (a = x AND b > y)``."""
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        equal = {prev.lstrip("-"): value for prev, value in zip(ordering[:i], values[:i])}
+        condition |= Q(**equal, **{f"{name}__{lookup}": values[i]})
+    return condition
+
+
+def _count_key(key: str) -> str:
+    return f"shop:count:{hashlib.md5(key.encode()).hexdigest()}"
+
+
+def cached_count(queryset, key: str, timeout: int = COUNT_CACHE_TIMEOUT) -> int:
+    """Approximate result count: exact when computed, then reused for ``timeout`` seconds."""
+    return cache.get_or_set(_count_key(key), queryset.count, timeout)
+
+
+async def acached_count(queryset, key: str, timeout: int = COUNT_CACHE_TIMEOUT) -> int:
+    count = cache.get(_count_key(key))
+    if count is None:
+        count = await queryset.acount()
+        cache.set(_count_key(key), count, timeout)
+    return count
+
+
+def estimated_table_rows(model, using: str = "default") -> int:
+    """Row count of ``model``'s table from planner statistics, without scanning it.
+
+    Falls back to the id span on SQLite before ``ANALYZE`` has run, which
+    over-counts by the number of deleted rows.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    rows = []
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+                rows = cursor.fetchall()
+            elif connection.vendor == "sqlite":
+                # One row per index, each starting with its row count; partial
+                # indexes hold fewer rows than the table, hence the max.
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+                rows = cursor.fetchall()
+    except DatabaseError:
+        pass
+    estimates = [int(str(stat).split()[0]) for stat, in rows if stat is not None]
+    if estimates and max(estimates) >= 0:
+        return max(estimates)
+    span = model._default_manager.using(using).aggregate(low=Min("pk"), high=Max("pk"))
+    return span["high"] - span["low"] + 1 if span["low"] is not None else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists over big tables.
+
+    An unfiltered list uses ``estimated_table_rows``; a filtered or searched one
+    counts exactly once and reuses the figure for ``COUNT_CACHE_TIMEOUT`` seconds.
+    Either way a page view does not scan the table to count it.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.is_empty():
+            return 0
+        if not queryset.query.where:
+            return estimated_table_rows(queryset.model, queryset.db)
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            # A filter such as ``pk__in=[]`` that can never match.
+            return 0
+        return cached_count(queryset, f"admin:{queryset.db}:{sql}:{params}")
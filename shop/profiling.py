@@ -0,0 +1,215 @@
+import cProfile
+import io
+import json
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .metrics import observe_sql
+
+TOKEN_SALT = "shop.profiling"
+HEADER = "X-Shop-Profile"
+QUERY_PARAM = "_profile"
+
+
+def _setting(name, default):
+    return getattr(settings, f"SHOP_PROFILE_{name}", default)
+
+
+def profile_dir() -> Path:
+    return Path(_setting("DIR", settings.BASE_DIR / "profiles"))
+
+
+def make_token() -> str:
+    """A token that triggers profiling for ``SHOP_PROFILE_TOKEN_MAX_AGE`` seconds."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def _token_is_valid(token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=_setting("TOKEN_MAX_AGE", 60 * 60))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def should_profile(request) -> bool:
+    token = request.headers.get(HEADER) or request.GET.get(QUERY_PARAM)
+    if token:
+        return _token_is_valid(token)
+    rate = _setting("SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer, for flamegraph-ready collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shop-profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class _SQLRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, sql, seconds):
+        self.queries.append({"sql": sql, "ms": round(seconds * 1000, 3)})
+
+
+def save(meta: dict, profiler: cProfile.Profile, stacks: Counter) -> str:
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(directory / f"{profile_id}.prof")
+    (directory / f"{profile_id}.stacks").write_text(
+        "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()), encoding="utf-8"
+    )
+    (directory / f"{profile_id}.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    rotate(directory, _setting("MAX_FILES", 200))
+    return profile_id
+
+
+def rotate(directory: Path, keep: int):
+    ids = sorted(path.stem for path in directory.glob("*.json"))
+    for profile_id in ids[:-keep] if keep else ids:
+        for suffix in (".json", ".prof", ".stacks"):
+            (directory / f"{profile_id}{suffix}").unlink(missing_ok=True)
+
+
+def list_profiles() -> list:
+    directory = profile_dir()
+    profiles = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        meta = json.loads(path.read_text(encoding="utf-8"))
+        meta["id"] = path.stem
+        profiles.append(meta)
+    return profiles
+
+
+def _path(profile_id: str, suffix: str) -> Path:
+    # Ids come from the URL; refuse anything that is not a bare file stem.
+    if Path(profile_id).name != profile_id or profile_id.startswith("."):
+        raise FileNotFoundError(profile_id)
+    return profile_dir() / f"{profile_id}{suffix}"
+
+
+def load(profile_id: str) -> dict:
+    meta = json.loads(_path(profile_id, ".json").read_text(encoding="utf-8"))
+    meta["id"] = profile_id
+    return meta
+
+
+def top_functions(profile_id: str, limit: int = 40, sort: str = "cumulative") -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(str(_path(profile_id, ".prof")), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def collapsed_stacks(profile_id: str) -> str:
+    return _path(profile_id, ".stacks").read_text(encoding="utf-8")
+
+
+class ProfilingMiddleware:
+    """Profiles the requests selected by ``should_profile``; others pass straight through.
+
+    Under ASGI the profile covers the event loop thread, so time spent in
+    ``sync_to_async`` threads shows up as waiting; the SQL list is complete.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_profile(request):
+            return self.get_response(request)
+
+        recorder = _SQLRecorder()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with StackSampler(threading.get_ident(), _setting("SAMPLE_INTERVAL", 0.002)) as sampler:
+            with observe_sql(recorder):
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler (a debugger, coverage) already owns the hook.
+                    return self.get_response(request)
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        return self._save(request, response, started, profiler, sampler, recorder)
+
+    async def __acall__(self, request):
+        if not should_profile(request):
+            return await self.get_response(request)
+
+        recorder = _SQLRecorder()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with StackSampler(threading.get_ident(), _setting("SAMPLE_INTERVAL", 0.002)) as sampler:
+            with observe_sql(recorder):
+                try:
+                    profiler.enable()
+                except ValueError:
+                    return await self.get_response(request)
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+        return self._save(request, response, started, profiler, sampler, recorder)
+
+    def _save(self, request, response, started, profiler, sampler, recorder):
+        match = getattr(request, "resolver_match", None)
+        meta = {
+            "created_at": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": match.view_name if match else "",
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "sql_ms": round(sum(query["ms"] for query in recorder.queries), 3),
+            "queries": recorder.queries,
+        }
+        response[HEADER] = save(meta, profiler, sampler.stacks)
+        return response
@@ -0,0 +1,194 @@
+"""Co-purchase recommendations ("customers who bought this also bought").
+
+``build()`` reads non-cancelled order lines in keyset chunks, counts how often
+two products share an order and keeps the ``top_k`` best neighbours of each
+product in ``ProductRecommendation``. Scores are co-occurrence counts normalised
+by both products' order counts (cosine similarity), so best sellers do not end
+up recommended next to everything.
+
+Memory is bounded by processing the catalog in id partitions: each pass
+re-reads the order lines but only keeps counts for the products of that
+partition, so the largest structure held is ``partition_size`` sparse rows
+(plus one order count per product) regardless of how many lines there are.
+
+Pages read the table with one indexed join and fall back to the newest
+products of the same category for products nobody has bought yet.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+
+from .models import OrderItem, Product, ProductRecommendation
+from .utils import alist
+
+TOP_K = getattr(settings, "SHOP_RECOMMENDATIONS_PER_PRODUCT", 8)
+# Orders larger than this (wholesale, test orders) would add quadratic noise.
+MAX_BASKET_SIZE = 50
+
+
+def _order_lines(chunk_size: int) -> Iterator[List[tuple]]:
+    """``(order_id, product_id)`` rows ordered by order, in keyset chunks of ``chunk_size``."""
+    lines = (
+        OrderItem.objects.filter(product__isnull=False)
+        .exclude(order__status="cancelled")
+        .order_by("order_id", "id")
+    )
+    last = None
+    while True:
+        page = lines
+        if last is not None:
+            page = page.filter(Q(order_id__gt=last[0]) | Q(order_id=last[0], id__gt=last[1]))
+        rows = list(page.values_list("order_id", "id", "product_id")[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1][:2]
+        yield [(order_id, product_id) for order_id, _, product_id in rows]
+
+
+def baskets(chunk_size: int = 5000) -> Iterator[Set[int]]:
+    """The distinct products of each order; an order split across chunks is joined back up."""
+    current, basket = None, set()
+    for rows in _order_lines(chunk_size):
+        for order_id, product_id in rows:
+            if order_id != current:
+                if basket:
+                    yield basket
+                current, basket = order_id, set()
+            basket.add(product_id)
+    if basket:
+        yield basket
+
+
+def _top_neighbours(anchor: int, counts: Counter, frequency: Dict[int, int], top_k: int, min_support: int):
+    scored = (
+        (count / math.sqrt(frequency[anchor] * frequency[other]), other)
+        for other, count in counts.items()
+        if count >= min_support
+    )
+    return heapq.nlargest(top_k, scored, key=lambda item: (item[0], -item[1]))
+
+
+def _partition(
+    lower: int, upper: int, chunk_size: int, top_k: int, min_support: int
+) -> List[ProductRecommendation]:
+    frequency = Counter()
+    pairs: Dict[int, Counter] = defaultdict(Counter)
+    for basket in baskets(chunk_size):
+        if len(basket) > MAX_BASKET_SIZE:
+            continue
+        frequency.update(basket)
+        for anchor in basket:
+            if lower <= anchor < upper:
+                pairs[anchor].update(basket)
+    rows = []
+    for anchor, counts in pairs.items():
+        del counts[anchor]  # a product always "co-occurs" with itself
+        for rank, (score, other) in enumerate(_top_neighbours(anchor, counts, frequency, top_k, min_support)):
+            rows.append(ProductRecommendation(product_id=anchor, recommended_id=other, rank=rank, score=score))
+    return rows
+
+
+def build(
+    top_k: int = TOP_K,
+    chunk_size: int = 5000,
+    partition_size: int = 50_000,
+    min_support: int = 1,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> int:
+    """Recompute the whole table; returns the number of rows written.
+
+    Each partition is replaced in its own transaction, so readers see either the
+    old or the new neighbours of a product, never a mix.
+    """
+    bounds = Product.objects.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        ProductRecommendation.objects.all().delete()
+        return 0
+    written = 0
+    for lower in range(bounds["low"], bounds["high"] + 1, partition_size):
+        upper = lower + partition_size
+        rows = _partition(lower, upper, chunk_size, top_k, min_support)
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__gte=lower, product_id__lt=upper).delete()
+            ProductRecommendation.objects.bulk_create(rows, batch_size=chunk_size)
+        written += len(rows)
+        if progress:
+            progress(lower, upper, len(rows))
+    return written
+
+
+def _recommended(product):
+    return (
+        Product.objects.filter(is_active=True, recommended_for__product=product)
+        .order_by("recommended_for__rank")
+    )
+
+
+def _newest_in_categories(category_ids: Iterable[int], exclude: Iterable[int]):
+    return (
+        Product.objects.filter(category_id__in=list(category_ids), is_active=True)
+        .exclude(id__in=list(exclude))
+        .order_by("-created_at")
+    )
+
+
+def _cart_neighbours(product_ids: List[int]):
+    # At most len(product_ids) * top_k rows, read through the (product, rank) index;
+    # summing in Python avoids a GROUP BY and a sort over the product table.
+    return (
+        ProductRecommendation.objects.filter(product_id__in=product_ids, recommended__is_active=True)
+        .exclude(recommended_id__in=product_ids)
+        .select_related("recommended")
+    )
+
+
+def _rank_neighbours(rows: Iterable[ProductRecommendation], limit: int) -> List[Product]:
+    affinity = Counter()
+    products = {}
+    for row in rows:
+        affinity[row.recommended_id] += row.score
+        products[row.recommended_id] = row.recommended
+    best = sorted(affinity, key=lambda pk: (-affinity[pk], pk))[:limit]
+    return [products[pk] for pk in best]
+
+
+def for_product(product, limit: int = 4) -> List[Product]:
+    recommended = list(_recommended(product)[:limit])
+    if recommended:
+        return recommended
+    return list(_newest_in_categories([product.category_id], [product.id])[:limit])
+
+
+async def afor_product(product, limit: int = 4) -> List[Product]:
+    recommended = await alist(_recommended(product)[:limit])
+    if recommended:
+        return recommended
+    return await alist(_newest_in_categories([product.category_id], [product.id])[:limit])
+
+
+def for_cart(products: Iterable[Product], limit: int = 4) -> List[Product]:
+    """Products bought together with the cart's contents, best combined score first."""
+    products = list(products)
+    if not products:
+        return []
+    ids = [product.id for product in products]
+    recommended = _rank_neighbours(_cart_neighbours(ids), limit)
+    if recommended:
+        return recommended
+    return list(_newest_in_categories({product.category_id for product in products}, ids)[:limit])
+
+
+async def afor_cart(products: Iterable[Product], limit: int = 4) -> List[Product]:
+    products = list(products)
+    if not products:
+        return []
+    ids = [product.id for product in products]
+    recommended = _rank_neighbours(await alist(_cart_neighbours(ids)), limit)
+    if recommended:
+        return recommended
+    return await alist(_newest_in_categories({product.category_id for product in products}, ids)[:limit])
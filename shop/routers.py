@@ -0,0 +1,221 @@
+"""Read-replica routing with read-your-writes stickiness.
+
+The database aliases in ``SHOP_READ_REPLICAS`` serve the catalog reads
+(``CATALOG_MODELS``) of GET and HEAD requests; everything else goes to the
+primary (``default``): writes, orders, users, sessions, any read inside a POST,
+and all code outside a request such as management commands.
+
+Replicas lag behind the primary, by up to ``SHOP_REPLICA_PIN_SECONDS``. To
+hide that lag, every client reads from the primary in these cases:
+
+- after one of its requests wrote to the database, for that many seconds.
+  ``ReplicaMiddleware`` sets a cookie to track this, so a just-placed order or
+  an admin edit is never followed by a page built from an older snapshot.
+- for the same window after any catalog change (``bump_catalog_version``),
+  made by any worker. This stops fragment caches from filling with stale
+  products under a fresh version. Without a shared ``default`` cache the
+  change time is read from the primary on each such request
+  (``catalog_changed_at``).
+
+A replica that fails its health check, or raises a database error during a
+request, is skipped for ``SHOP_REPLICA_RETRY_SECONDS``. A GET that failed on
+a replica is run again against the primary.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .models import Product
+from .utils import catalog_changed_at
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MODELS = {
+    "shop.category",
+    "shop.product",
+    "shop.productimage",
+    "shop.facetcount",
+    "shop.productrecommendation",
+    "shop.productsales",
+}
+PIN_COOKIE = "primary_until"
+SAFE_METHODS = ("GET", "HEAD")
+# Seconds between health checks of a replica that is in rotation.
+CHECK_INTERVAL = 5
+
+_down_until = {}
+_checked_at = {}
+
+
+class ReadState:
+    """What the current request may read from; mutated in place so async views' threads share it."""
+
+    __slots__ = ("use_replicas", "replica", "wrote")
+
+    def __init__(self, use_replicas: bool):
+        self.use_replicas = use_replicas
+        self.replica: Optional[str] = None
+        self.wrote = False
+
+    def to_primary(self):
+        self.use_replicas = False
+        self.replica = None
+
+
+_state: ContextVar[Optional[ReadState]] = ContextVar("shop_read_state", default=None)
+
+
+def read_replicas() -> List[str]:
+    return list(getattr(settings, "SHOP_READ_REPLICAS", []))
+
+
+def pin_seconds() -> int:
+    return getattr(settings, "SHOP_REPLICA_PIN_SECONDS", 30)
+
+
+def mark_down(alias: str):
+    _down_until[alias] = time.monotonic() + getattr(settings, "SHOP_REPLICA_RETRY_SECONDS", 30)
+    connections[alias].close()
+
+
+def reset_health():
+    _down_until.clear()
+    _checked_at.clear()
+
+
+def is_available(alias: str) -> bool:
+    """Whether ``alias`` is in rotation, checking it at most every ``CHECK_INTERVAL`` seconds."""
+    now = time.monotonic()
+    if _down_until.get(alias, 0) > now:
+        return False
+    if now - _checked_at.get(alias, float("-inf")) < CHECK_INTERVAL:
+        return True
+    _checked_at[alias] = now
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            # A snapshot that is missing or half-written has no catalog table.
+            cursor.execute(f"SELECT 1 FROM {connection.ops.quote_name(Product._meta.db_table)} LIMIT 1")
+    except DatabaseError:
+        logger.warning("Read replica %s failed its health check; using the primary.", alias, exc_info=True)
+        mark_down(alias)
+        return False
+    return True
+
+
+def pick_replica() -> Optional[str]:
+    available = [alias for alias in read_replicas() if is_available(alias)]
+    return random.choice(available) if available else None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replicas or model._meta.label_lower not in CATALOG_MODELS:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            # One replica per request, so a page reads from a single snapshot.
+            state.replica = pick_replica()
+            if state.replica is None:
+                state.to_primary()
+                return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Later reads of this request must see the write too.
+            state.wrote = True
+            state.to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *read_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and are never migrated themselves.
+        return False if db in read_replicas() else None
+
+
+def _pinned(request) -> bool:
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _catalog_changed_recently() -> bool:
+    return time.time_ns() - catalog_changed_at() < pin_seconds() * 1_000_000_000
+
+
+class ReplicaMiddleware:
+    """Let safe requests read the catalog from replicas, and pin clients that write to the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._begin(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        state = self._begin(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    def _begin(self, request) -> ReadState:
+        use_replicas = (
+            bool(read_replicas())
+            and request.method in SAFE_METHODS
+            and not _pinned(request)
+            and not _catalog_changed_recently()
+        )
+        return ReadState(use_replicas)
+
+    def _finish(self, response, state: ReadState):
+        if state.wrote:
+            seconds = pin_seconds()
+            response.set_cookie(PIN_COOKIE, str(int(time.time()) + seconds), max_age=seconds, httponly=True,
+                                samesite="Lax")
+        return response
+
+    def process_exception(self, request, exception):
+        state = _state.get()
+        if state is None or state.replica is None or not isinstance(exception, DatabaseError):
+            return None
+        logger.warning("Read replica %s failed; retrying %s on the primary.", state.replica, request.path,
+                       exc_info=exception)
+        mark_down(state.replica)
+        state.to_primary()
+        match = request.resolver_match
+        if request.method not in SAFE_METHODS or match is None:
+            return None
+        view = match.func
+        if iscoroutinefunction(view):
+            return async_to_sync(view)(request, *match.args, **match.kwargs)
+        return view(request, *match.args, **match.kwargs)
@@ -0,0 +1,271 @@
+"""Sales aggregates behind "best sellers" and the admin sales report.
+
+A new order is counted by the ``order_placed`` background task, shortly after
+checkout commits; an order moved into or out of ``cancelled`` is reversed or
+re-applied by the ``Order`` save signals. Both go through ``apply_order`` and
+``unapply_order``, which flip ``Order.sales_recorded`` first, so an order is
+never counted twice whichever runs first or how often the task is retried.
+Both touch a handful of rows, never ``OrderItem`` history. Orders written in
+bulk (``generate_dataset``) or statuses changed with ``QuerySet.update()``
+bypass them, so follow those with ``rebuild()``.
+
+The rolling windows only grow between compactions; ``compact_sales`` (run it
+daily) recomputes them from the per-day rows and drops days older than the
+longest window.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product, ProductSales, ProductSalesDay
+from .utils import alist
+
+SHORT_WINDOW = 7
+LONG_WINDOW = 30
+
+Line = Tuple[int, int, Decimal]
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _ranked():
+    # Inactive products are skipped in Python: filtering on ``Product`` makes
+    # SQLite drive the join from the product table and sort the result, instead
+    # of walking ``productsales_best_idx`` and stopping after a page.
+    return ProductSales.objects.filter(units__gt=0).select_related("product").order_by("-units_30d", "-units")
+
+
+def best_sellers(limit: int = 8) -> List[Product]:
+    """Best sellers of the last 30 days, ties broken by all-time units."""
+    ranked, products, offset = _ranked(), [], 0
+    while len(products) < limit:
+        rows = list(ranked[offset:offset + limit * 2])
+        products += [row.product for row in rows if row.product.is_active]
+        if len(rows) < limit * 2:
+            break
+        offset += len(rows)
+    return products[:limit]
+
+
+async def abest_sellers(limit: int = 8) -> List[Product]:
+    ranked, products, offset = _ranked(), [], 0
+    while len(products) < limit:
+        rows = await alist(ranked[offset:offset + limit * 2])
+        products += [row.product for row in rows if row.product.is_active]
+        if len(rows) < limit * 2:
+            break
+        offset += len(rows)
+    return products[:limit]
+
+
+def order_lines(order) -> List[Line]:
+    return list(order.items.filter(product__isnull=False).values_list("product_id", "quantity", "price"))
+
+
+def _by_product(lines: Iterable[Line]) -> Dict[int, Tuple[int, Decimal]]:
+    totals = {}
+    for product_id, quantity, price in lines:
+        if product_id is None:
+            continue
+        units, revenue = totals.get(product_id, (0, Decimal("0")))
+        totals[product_id] = (units + quantity, revenue + price * quantity)
+    return totals
+
+
+def _age(order, today=None) -> int:
+    return ((today or timezone.localdate()) - timezone.localdate(order.created_at)).days
+
+
+def _upsert_add(model, conflict_fields: List[str], rows: List[dict], add_fields: List[str]):
+    """``INSERT ... ON CONFLICT DO UPDATE`` adding ``add_fields`` onto existing rows, in one statement.
+
+    ``bulk_create(update_conflicts=True)`` can only overwrite columns, not increment them.
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    columns = ", ".join(qn(field.column) for field in fields)
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(fields)) + ")"] * len(rows))
+    conflict = ", ".join(qn(model._meta.get_field(name).column) for name in conflict_fields)
+    updates = ", ".join(
+        f"{column} = {table}.{column} + excluded.{column}"
+        for column in (qn(model._meta.get_field(name).column) for name in add_fields)
+    )
+    params = [field.get_db_prep_save(row[field.name], connection) for row in rows for field in fields]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) VALUES {placeholders} ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+            params,
+        )
+
+
+def record_order(order, lines: Iterable[Line]):
+    """Add ``(product_id, quantity, price)`` lines to the aggregates; two statements whatever the order size."""
+    totals = _by_product(lines)
+    if not totals:
+        return
+    age = _age(order)
+    short, long = age < SHORT_WINDOW, age < LONG_WINDOW
+    zero = Decimal("0")
+    # Checkout already runs in a transaction; savepoint=False spares it two statements.
+    with transaction.atomic(savepoint=False):
+        _upsert_add(
+            ProductSales,
+            ["product"],
+            [
+                {
+                    "product": product_id,
+                    "units": units,
+                    "revenue": revenue,
+                    "units_7d": units if short else 0,
+                    "units_30d": units if long else 0,
+                    "revenue_30d": revenue if long else zero,
+                }
+                for product_id, (units, revenue) in totals.items()
+            ],
+            ["units", "revenue", "units_7d", "units_30d", "revenue_30d"],
+        )
+        if long:
+            day = timezone.localdate(order.created_at)
+            _upsert_add(
+                ProductSalesDay,
+                ["product", "day"],
+                [
+                    {"product": product_id, "day": day, "units": units, "revenue": revenue}
+                    for product_id, (units, revenue) in totals.items()
+                ],
+                ["units", "revenue"],
+            )
+
+
+def _minus(model, name: str, amount):
+    field = model._meta.get_field(name)
+    return Greatest(F(name) - Value(amount, output_field=field), Value(0, output_field=field), output_field=field)
+
+
+def revoke_order(order, lines: Optional[Iterable[Line]] = None):
+    """Take an order back out of the aggregates, e.g. when it is cancelled."""
+    totals = _by_product(order_lines(order) if lines is None else lines)
+    age = _age(order)
+    day = timezone.localdate(order.created_at)
+    with transaction.atomic():
+        for product_id, (units, revenue) in totals.items():
+            changes = {"units": _minus(ProductSales, "units", units), "revenue": _minus(ProductSales, "revenue", revenue)}
+            if age < SHORT_WINDOW:
+                changes["units_7d"] = _minus(ProductSales, "units_7d", units)
+            if age < LONG_WINDOW:
+                changes["units_30d"] = _minus(ProductSales, "units_30d", units)
+                changes["revenue_30d"] = _minus(ProductSales, "revenue_30d", revenue)
+                ProductSalesDay.objects.filter(product_id=product_id, day=day).update(
+                    units=_minus(ProductSalesDay, "units", units),
+                    revenue=_minus(ProductSalesDay, "revenue", revenue),
+                )
+            ProductSales.objects.filter(product_id=product_id).update(**changes)
+
+
+def apply_order(order) -> bool:
+    """Count ``order`` unless it already is or is cancelled; returns whether it was counted now."""
+    with transaction.atomic():
+        claimed = Order.objects.filter(pk=order.pk, sales_recorded=False).exclude(status="cancelled").update(
+            sales_recorded=True
+        )
+        if claimed:
+            record_order(order, order_lines(order))
+    return bool(claimed)
+
+
+def unapply_order(order) -> bool:
+    """Take ``order`` out of the aggregates if it is counted; returns whether it was."""
+    with transaction.atomic():
+        claimed = Order.objects.filter(pk=order.pk, sales_recorded=True).update(sales_recorded=False)
+        if claimed:
+            revoke_order(order)
+    return bool(claimed)
+
+
+def _window_start(today, days: int) -> datetime:
+    start = today - timedelta(days=days - 1)
+    return timezone.make_aware(datetime.combine(start, time.min))
+
+
+def _total(expression, output_field=IntegerField(), **filters):
+    condition = Q(**filters) if filters else None
+    zero = Decimal("0") if isinstance(output_field, DecimalField) else 0
+    return Coalesce(Sum(expression, filter=condition, output_field=output_field), Value(zero), output_field=output_field)
+
+
+def aggregate(lines, today=None) -> Tuple[list, list]:
+    """``ProductSales`` and ``ProductSalesDay`` field dicts computed from an ``OrderItem`` queryset."""
+    today = today or timezone.localdate()
+    short_start, long_start = _window_start(today, SHORT_WINDOW), _window_start(today, LONG_WINDOW)
+    line_total = F("price") * F("quantity")
+    totals = list(
+        lines.order_by()
+        .values("product_id")
+        .annotate(
+            units=_total("quantity"),
+            revenue=_total(line_total, MONEY),
+            units_7d=_total("quantity", order__created_at__gte=short_start),
+            units_30d=_total("quantity", order__created_at__gte=long_start),
+            revenue_30d=_total(line_total, MONEY, order__created_at__gte=long_start),
+        )
+    )
+    days = list(
+        lines.filter(order__created_at__gte=long_start)
+        .order_by()
+        .annotate(day=TruncDate("order__created_at"))
+        .values("product_id", "day")
+        .annotate(units=_total("quantity"), revenue=_total(line_total, MONEY))
+    )
+    return totals, days
+
+
+def sold_lines(order_items):
+    return order_items.filter(product__isnull=False).exclude(order__status="cancelled")
+
+
+def rebuild(today=None) -> int:
+    """Recompute everything from ``OrderItem``; returns the number of products with sales."""
+    totals, days = aggregate(sold_lines(OrderItem.objects.all()), today)
+    with transaction.atomic():
+        # Orders still waiting for ``order_placed`` are counted here, so the task must skip them.
+        Order.objects.filter(sales_recorded=False).exclude(status="cancelled").update(sales_recorded=True)
+        Order.objects.filter(sales_recorded=True, status="cancelled").update(sales_recorded=False)
+        ProductSales.objects.all().delete()
+        ProductSalesDay.objects.all().delete()
+        ProductSales.objects.bulk_create([ProductSales(**row) for row in totals], batch_size=1000)
+        ProductSalesDay.objects.bulk_create([ProductSalesDay(**row) for row in days], batch_size=1000)
+    return len(totals)
+
+
+def compact(today=None) -> int:
+    """Recompute the rolling windows from the per-day rows and drop days past the long window.
+
+    Returns the number of products that still have sales inside a window.
+    """
+    today = today or timezone.localdate()
+    short_start = today - timedelta(days=SHORT_WINDOW - 1)
+    long_start = today - timedelta(days=LONG_WINDOW - 1)
+    with transaction.atomic():
+        # Writing first takes the write lock, so no checkout lands between the
+        # read and the update below.
+        ProductSales.objects.exclude(units_7d=0, units_30d=0, revenue_30d=0).update(
+            units_7d=0, units_30d=0, revenue_30d=Decimal("0")
+        )
+        windows = (
+            ProductSalesDay.objects.filter(day__gte=long_start)
+            .values("product_id")
+            .annotate(
+                units_7d=_total("units", day__gte=short_start),
+                units_30d=_total("units"),
+                revenue_30d=_total("revenue", MONEY),
+            )
+        )
+        rows = [ProductSales(**row) for row in windows]
+        ProductSales.objects.bulk_update(rows, ["units_7d", "units_30d", "revenue_30d"], batch_size=1000)
+        ProductSalesDay.objects.filter(day__lt=long_start).delete()
+    return len(rows)
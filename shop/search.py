@@ -0,0 +1,177 @@
+import re
+from typing import Iterable, List, Optional
+
+from django.db import connection
+from django.db.models import FloatField, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product, ProductSearchEntry
+
+FTS_TABLE = ProductSearchEntry._meta.db_table
+# BM25 with weights for name, description and category; lower is a better match.
+RANK = f"bm25({FTS_TABLE}, 10.0, 1.0, 3.0)"
+INDEX_BATCH_SIZE = 500
+
+_TRANSLATION = str.maketrans(
+    {
+        "\u064a": "\u06cc",  # Arabic yeh -> Persian yeh
+        "\u0649": "\u06cc",  # alef maksura -> Persian yeh
+        "\u0643": "\u06a9",  # Arabic kaf -> Persian keheh
+        "\u0629": "\u0647",  # teh marbuta -> heh
+        "\u0640": None,  # tatweel
+        "\u200c": None,  # ZWNJ, so «می‌خواهم» and «میخواهم» index the same
+        **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+        **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic digits
+    }
+)
+_DIACRITICS = re.compile("[\u064b-\u0652\u0670]")
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    text = _DIACRITICS.sub("", (text or "").translate(_TRANSLATION))
+    return " ".join(text.lower().split())
+
+
+def is_enabled() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def build_match_query(query: str) -> str:
+    """Turn user input into an FTS5 expression: every word must match as a prefix."""
+    tokens = _TOKEN.findall(normalize(query))
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def create_index(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, description, category, category_slug UNINDEXED, "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def _rows(products: Iterable[Product]):
+    for product in products:
+        yield (
+            product.id,
+            normalize(product.name),
+            normalize(product.description),
+            normalize(product.category.name),
+            product.category.slug,
+        )
+
+
+def index_products(products: Iterable[Product]):
+    rows = list(_rows(products))
+    if not rows or not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, category_slug) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def index_product(product: Product):
+    if product.is_active:
+        index_products([product])
+    else:
+        remove_product(product.id)
+
+
+def remove_product(product_id: int):
+    remove_products([product_id])
+
+
+def remove_products(product_ids: Iterable[int]):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
+
+
+def rebuild_index(batch_size: int = INDEX_BATCH_SIZE) -> int:
+    with connection.cursor() as cursor:
+        create_index(cursor)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    products = Product.objects.filter(is_active=True).select_related("category").order_by("id")
+    count = 0
+    batch = []
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            index_products(batch)
+            count += len(batch)
+            batch = []
+    index_products(batch)
+    count += len(batch)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+@ProductSearchEntry._meta.get_field("document").register_lookup
+class Match(Lookup):
+    """``search_entry__document__match=<FTS5 expression>``."""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+def _match_where(category_slug: Optional[str]) -> List[str]:
+    where = [f"{FTS_TABLE} MATCH %s"]
+    if category_slug:
+        where.append(f"{FTS_TABLE}.category_slug = %s")
+    return where
+
+
+def matching(query: str, category_slug: Optional[str] = None) -> Q:
+    """Filter for the products whose indexed text matches ``query``: active ones only."""
+    match = build_match_query(query)
+    if not match:
+        return Q(pk__in=[])
+    params = [match, category_slug] if category_slug else [match]
+    sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {' AND '.join(_match_where(category_slug))}"
+    return Q(pk__in=RawSQL(sql, params))
+
+
+def search_product_ids(query: str, category_slug: Optional[str] = None, limit: Optional[int] = None) -> List[int]:
+    """Product ids matching ``query``, best BM25 match first.
+
+    Name hits weigh more than category hits, which weigh more than description hits.
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    params = [match, category_slug] if category_slug else [match]
+    sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {' AND '.join(_match_where(category_slug))} ORDER BY {RANK}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_products(queryset, query: str, category_slug: Optional[str] = None):
+    """Restrict ``queryset`` to products matching ``query``, annotated with ``search_rank``.
+
+    The index table is joined through ``ProductSearchEntry``, so the database
+    ranks and pages every match. The rank is read from that join: as a
+    correlated subquery BM25 would re-run the full-text query once per match.
+    """
+    if not is_enabled():
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    match = build_match_query(query)
+    if not match:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+    queryset = queryset.filter(search_entry__document__match=match)
+    if category_slug:
+        queryset = queryset.filter(search_entry__category_slug=category_slug)
+    return queryset.annotate(search_rank=RawSQL(RANK, (), output_field=FloatField()))
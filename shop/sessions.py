@@ -0,0 +1,152 @@
+"""Cache-first session engine with write-behind persistence.
+
+``save()`` only writes the cache. The keys it touched are remembered per process
+and written to ``django_session`` in one batch by ``flush_pending()``, which runs
+after responses are sent (see ``signals.flush_sessions``) at most once every
+``SHOP_SESSION_FLUSH_INTERVAL`` seconds, and once more when the process exits.
+A cart change therefore never takes the database write lock inside a request.
+Reads go to the cache and fall back to the database on a miss.
+
+The cache is the source of truth between flushes, so write-behind needs a
+cache shared by all workers (Redis, Memcached). ``SHOP_SESSION_WRITE_BEHIND``
+defaults to None, which turns it on only when the ``SESSION_CACHE_ALIAS``
+backend is not process-local. With a local-memory cache, sessions are read
+from and written to the database on every request, like Django's ``db``
+engine, so every worker sees every login and cart change.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = 0.0
+
+# Backends whose contents other worker processes cannot see.
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def write_behind() -> bool:
+    """Whether sessions live in the cache first; only safe when every worker shares that cache."""
+    setting = getattr(settings, "SHOP_SESSION_WRITE_BEHIND", None)
+    if setting is not None:
+        return setting
+    return not isinstance(caches[settings.SESSION_CACHE_ALIAS], PROCESS_LOCAL_CACHES)
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = "shop.sessions"
+
+    def load(self):
+        if not write_behind():
+            return DBStore.load(self)
+        return super().load()
+
+    def exists(self, session_key):
+        # Only consulted when picking a new random key; ``save(must_create=True)``
+        # still refuses a key already in the cache.
+        if not write_behind():
+            return DBStore.exists(self, session_key)
+        return bool(session_key) and (self.cache_key_prefix + session_key) in self._cache
+
+    async def aload(self):
+        if not write_behind():
+            return await DBStore.aload(self)
+        # Django's async cache API is a thread handoff; a direct cache read is cheaper.
+        data = self._cache.get(self.cache_key)
+        if data is not None:
+            return data
+        return await super().aload()
+
+    def save(self, must_create=False):
+        if not write_behind():
+            return DBStore.save(self, must_create)
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        if must_create:
+            if not self._cache.add(self.cache_key, data, self.get_expiry_age()):
+                raise CreateError
+        else:
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+        with _pending_lock:
+            _pending[self.session_key] = timezone.now()
+
+    def delete(self, session_key=None):
+        with _pending_lock:
+            _pending.pop(session_key or self.session_key, None)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        """Delete expired rows in small batches so ``clearsessions`` never holds the write lock for long."""
+        model = cls.get_model_class()
+        batch_size = getattr(settings, "SHOP_SESSION_PURGE_BATCH_SIZE", 1000)
+        now = timezone.now()
+        while True:
+            keys = list(
+                model.objects.filter(expire_date__lt=now).values_list("session_key", flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            with transaction.atomic():
+                model.objects.filter(session_key__in=keys).delete()
+
+
+def flush_pending(force: bool = False) -> int:
+    """Write sessions saved since the last flush to the database; returns how many were written."""
+    global _last_flush
+    now = time.monotonic()
+    if not _pending or (not force and now - _last_flush < getattr(settings, "SHOP_SESSION_FLUSH_INTERVAL", 5)):
+        return 0
+    _last_flush = now
+    with _pending_lock:
+        batch = dict(_pending)
+        _pending.clear()
+
+    store = SessionStore()
+    model = store.get_model_class()
+    keys = {store.cache_key_prefix + key: key for key in batch}
+    rows = []
+    for cache_key, data in store._cache.get_many(keys).items():
+        session_key = keys[cache_key]
+        rows.append(
+            model(
+                session_key=session_key,
+                session_data=store.encode(data),
+                expire_date=store.get_expiry_date(
+                    modification=batch[session_key], expiry=data.get("_session_expiry")
+                ),
+            )
+        )
+    try:
+        model.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["session_key"],
+            update_fields=["session_data", "expire_date"],
+        )
+    except Exception:
+        logger.exception("Could not persist %d sessions", len(rows))
+        with _pending_lock:
+            for key, saved_at in batch.items():
+                _pending.setdefault(key, saved_at)
+        return 0
+    return len(rows)
+
+
+# Gunicorn workers exit through ``sys.exit`` when recycled or stopped, which runs this.
+atexit.register(flush_pending, force=True)
@@ -0,0 +1,102 @@
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import facets, fragments, images, metrics, sales, search, sessions
+from .models import Category, Order, Product, ProductImage
+from .utils import bump_catalog_version
+
+
+# Facet receivers come first so the facet table is updated before
+# product_changed bumps the catalog version that keys the cached counts.
+@receiver(pre_save, sender=Product)
+@receiver(pre_delete, sender=Product)
+def remember_facet_cell(sender, instance, **kwargs):
+    instance._facet_cell = facets.stored_snapshot(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Product)
+def update_facets(sender, instance, **kwargs):
+    facets.move(getattr(instance, "_facet_cell", None), facets.snapshot(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_facets(sender, instance, **kwargs):
+    facets.adjust(getattr(instance, "_facet_cell", None), -1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    bump_catalog_version()
+    fragments.bump_product_version(instance.id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    fragments.bump_product_version(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not images.ensure_variants(instance):
+        return
+    product_id = instance.pk if sender is Product else instance.product_id
+    fragments.bump_product_version(product_id)
+    bump_catalog_version()
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk:
+        stored = Order.objects.filter(pk=instance.pk).values_list("status", "sales_recorded").first()
+        if stored is not None:
+            # ``sales_recorded`` belongs to shop.sales; never write back a stale copy.
+            instance._previous_status, instance.sales_recorded = stored
+
+
+@receiver(post_save, sender=Order)
+def update_sales(sender, instance, created, raw=False, **kwargs):
+    # New orders are counted by the ``order_placed`` task once their lines exist.
+    previous = getattr(instance, "_previous_status", None)
+    if created or raw or previous is None or (previous == "cancelled") == (instance.status == "cancelled"):
+        return
+    if instance.status == "cancelled":
+        sales.unapply_order(instance)
+    else:
+        sales.apply_order(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_product(instance.id)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(instance.products.filter(is_active=True).select_related("category"))
+
+
+@receiver(request_finished)
+def flush_sessions(sender, **kwargs):
+    sessions.flush_pending()
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    metrics.install_sql_wrapper(connection)
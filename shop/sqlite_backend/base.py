@@ -0,0 +1,105 @@
+"""SQLite backend that queues write transactions.
+
+With ``OPTIONS["transaction_mode"] = "IMMEDIATE"`` every ``atomic()`` block
+takes SQLite's write lock at ``BEGIN``, so two writers can no longer deadlock
+on a read lock upgraded mid-transaction, and the ``timeout`` option lets a
+second writer wait instead of failing. SQLite waits by sleeping and polling,
+though: under contention writers wake late, in no particular order, and the
+unlucky ones run out of time and get "database is locked".
+
+This backend makes the threads of a process take their turn in a FIFO queue
+per database file before ``BEGIN``, bounded by the same ``timeout``. Only one
+of them at a time competes for SQLite's lock; the busy timeout is left to
+arbitrate between processes. Deferred transactions (no ``transaction_mode``)
+and autocommit statements are not queued.
+"""
+import threading
+from collections import deque
+
+from django.db.backends.sqlite3 import base
+from django.db.utils import OperationalError
+
+WRITE_MODES = {"IMMEDIATE", "EXCLUSIVE"}
+DEFAULT_TIMEOUT = 5.0
+
+
+class WriteQueue:
+    """A lock granted in arrival order, with a timeout."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._held = False
+
+    def acquire(self, timeout: float) -> bool:
+        with self._lock:
+            if not self._held:
+                self._held = True
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter.is_set():  # handed over just as the wait timed out
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the lock straight to the next writer; it stays held.
+                self._waiters.popleft().set()
+            else:
+                self._held = False
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def write_queue(name) -> WriteQueue:
+    with _queues_lock:
+        return _queues.setdefault(str(name), WriteQueue())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _in_write_queue = False
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode not in WRITE_MODES:
+            return super()._start_transaction_under_autocommit()
+        timeout = self.settings_dict["OPTIONS"].get("timeout", DEFAULT_TIMEOUT)
+        queue = write_queue(self.settings_dict["NAME"])
+        if not queue.acquire(timeout):
+            raise OperationalError(f"database is locked: waited {timeout}s in the write queue")
+        self._in_write_queue = True
+        try:
+            super()._start_transaction_under_autocommit()
+        except BaseException:
+            self._leave_write_queue()
+            raise
+
+    def _leave_write_queue(self):
+        if self._in_write_queue:
+            self._in_write_queue = False
+            write_queue(self.settings_dict["NAME"]).release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._leave_write_queue()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._leave_write_queue()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._leave_write_queue()
@@ -0,0 +1,57 @@
+"""Static files storage: content-hashed names plus precompressed copies.
+
+``collectstatic`` writes every asset under a name containing its content hash
+(``app.3f2a9c1b.css``), so the web server can serve ``STATIC_URL`` with a
+one-year, ``immutable`` ``Cache-Control`` and a deploy never leaves browsers on
+a stale file. Next to each hashed text asset it writes ``.gz`` and, when the
+optional ``brotli`` package is installed, ``.br`` copies for the server to send
+as-is (nginx ``gzip_static``/``brotli_static``) instead of compressing per
+request.
+"""
+import gzip
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip copies are written without it
+    brotli = None
+
+COMPRESSIBLE = {".css", ".js", ".map", ".svg", ".json", ".txt", ".html", ".xml", ".ico", ".ttf", ".otf", ".eot"}
+# Below this the compressed copy saves less than a packet.
+MIN_SIZE = 1024
+
+
+def compress_file(path: Path) -> list:
+    """Write ``path.gz`` (and ``path.br``) when smaller than ``path``; returns the paths written."""
+    data = path.read_bytes()
+    if len(data) < MIN_SIZE:
+        return []
+    written = []
+    encoders = [(".gz", lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append((".br", lambda raw: brotli.compress(raw, quality=11)))
+    for suffix, encode in encoders:
+        compressed = encode(data)
+        if len(compressed) < len(data):
+            target = path.with_name(path.name + suffix)
+            target.write_bytes(compressed)
+            written.append(target)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic has not run (development, tests): use the source name.
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            if Path(hashed_name).suffix.lower() in COMPRESSIBLE:
+                compress_file(Path(self.path(hashed_name)))
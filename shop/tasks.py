@@ -0,0 +1,244 @@
+"""A small database-backed task queue for work that should not delay a response.
+
+Tasks are rows in ``Task``. ``enqueue`` inserts one in the caller's
+transaction, so it commits or rolls back together with the writes it follows
+up on, and workers only see it once that transaction has committed. Nothing
+else is needed: no broker, no second store to keep consistent with orders.
+
+``manage.py run_worker`` runs ``Worker`` loops in threads and/or processes.
+Each loop claims up to ``batch_size`` due tasks at a time by marking them
+``running`` with a lease (``SHOP_TASK_LEASE_SECONDS``); tasks whose worker died
+are claimed again once the lease runs out. A finished task is deleted. A
+failing one is retried with exponential backoff, starting at
+``SHOP_TASK_RETRY_DELAY`` seconds, until it has had ``SHOP_TASK_MAX_ATTEMPTS``
+attempts; then it is left as ``failed`` for the admin to retry or delete.
+
+Delivery is at least once: a handler may run again after a crash or a lost
+lease, so handlers must be idempotent.
+
+Throughput and failures are counted in ``shop.metrics`` per task; queue depth
+and lag are read from the table when ``/metrics`` is scraped.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import metrics, recommendations, sales
+from .models import Order, Task
+
+logger = logging.getLogger(__name__)
+
+# Retries never wait longer than this.
+MAX_RETRY_DELAY = 60 * 60
+
+
+class Handler(NamedTuple):
+    func: Callable
+    max_attempts: Optional[int]
+
+
+_handlers: Dict[str, Handler] = {}
+
+
+def register(name: str, max_attempts: Optional[int] = None):
+    """Register the decorated function as the handler of tasks called ``name``.
+
+    It is called with the task's payload as keyword arguments.
+    """
+
+    def decorator(func):
+        _handlers[name] = Handler(func, max_attempts)
+        return func
+
+    return decorator
+
+
+def max_attempts(name: str) -> int:
+    handler = _handlers.get(name)
+    if handler is not None and handler.max_attempts is not None:
+        return handler.max_attempts
+    return getattr(settings, "SHOP_TASK_MAX_ATTEMPTS", 5)
+
+
+def lease_seconds() -> int:
+    return getattr(settings, "SHOP_TASK_LEASE_SECONDS", 300)
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait after the ``attempts``-th failed attempt: doubling, with jitter."""
+    base = getattr(settings, "SHOP_TASK_RETRY_DELAY", 10)
+    delay = min(base * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def enqueue(name: str, payload: Optional[dict] = None, *, delay: float = 0, key: str = ""):
+    """Queue ``name(**payload)`` to run ``delay`` seconds from now; one INSERT.
+
+    With a ``key``, nothing is queued while a task with the same key is still
+    waiting, which debounces work that only needs to happen once in a while.
+    """
+    if name not in _handlers:
+        raise LookupError(f"No task named {name!r} is registered.")
+    task = Task(name=name, payload=payload or {}, key=key, run_at=timezone.now() + timedelta(seconds=delay))
+    Task.objects.bulk_create([task], ignore_conflicts=bool(key))
+
+
+def _due(now):
+    expired = Q(status="running", locked_until__lt=now)
+    return Task.objects.filter(Q(status="queued", run_at__lte=now) | expired)
+
+
+def claim(worker: str, batch_size: int) -> List[Task]:
+    """Lease up to ``batch_size`` due tasks to ``worker``, oldest first."""
+    now = timezone.now()
+    token = f"{worker}:{uuid.uuid4().hex[:8]}"
+    with transaction.atomic():
+        # ``skip_locked`` lets concurrent workers on PostgreSQL pass each other;
+        # SQLite serialises the whole transaction instead (``transaction_mode``).
+        ids = list(
+            _due(now).select_for_update(skip_locked=True).order_by("run_at", "id").values_list("id", flat=True)[
+                :batch_size
+            ]
+        )
+        if not ids:
+            return []
+        # Re-checking ``_due`` makes the claim safe even where the SELECT took no lock.
+        _due(now).filter(id__in=ids).update(
+            status="running",
+            locked_by=token,
+            locked_until=now + timedelta(seconds=lease_seconds()),
+            attempts=F("attempts") + 1,
+        )
+        return list(Task.objects.filter(locked_by=token, status="running").order_by("run_at", "id"))
+
+
+def _finish(task: Task):
+    Task.objects.filter(pk=task.pk, locked_by=task.locked_by).delete()
+
+
+def _fail(task: Task, error: str) -> str:
+    """Schedule a retry or give up; returns the outcome recorded in the metrics."""
+    pending = Task.objects.filter(pk=task.pk, locked_by=task.locked_by)
+    if task.attempts >= max_attempts(task.name):
+        pending.update(status="failed", locked_by="", locked_until=None, last_error=error)
+        return "failed"
+    retry_at = timezone.now() + timedelta(seconds=retry_delay(task.attempts))
+    try:
+        with transaction.atomic():
+            pending.update(status="queued", run_at=retry_at, locked_by="", locked_until=None, last_error=error)
+    except IntegrityError:
+        # A task with the same key was queued meanwhile and will do the work.
+        pending.delete()
+    return "retried"
+
+
+def run_task(task: Task) -> str:
+    """Run one claimed task; returns ``done``, ``retried`` or ``failed``."""
+    started = time.perf_counter()
+    try:
+        handler = _handlers.get(task.name)
+        if handler is None:
+            raise LookupError(f"No task named {task.name!r} is registered.")
+        handler.func(**task.payload)
+    except Exception as exc:
+        outcome = _fail(task, f"{type(exc).__name__}: {exc}")
+        log = logger.error if outcome == "failed" else logger.warning
+        log("Task %s (attempt %d) raised; %s.", task, task.attempts, outcome, exc_info=True)
+    else:
+        _finish(task)
+        outcome = "done"
+    metrics.record_task(task.name, outcome, time.perf_counter() - started)
+    return outcome
+
+
+def worker_name(index: int = 0) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+class Worker:
+    """Claims and runs tasks in a loop until ``stop`` is set."""
+
+    def __init__(self, name: str, batch_size: int = 20, poll_interval: float = 1.0, stop: threading.Event = None):
+        self.name = name
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stop = stop or threading.Event()
+        self.processed = 0
+
+    def run_batch(self) -> int:
+        """Claim and run one batch; returns how many tasks it held."""
+        batch = claim(self.name, self.batch_size)
+        for task in batch:
+            run_task(task)
+        self.processed += len(batch)
+        metrics.maybe_flush()
+        return len(batch)
+
+    def run(self, once: bool = False):
+        """Work until stopped; with ``once``, return as soon as nothing is due."""
+        while not self.stop.is_set():
+            # What Django does around each request: drop broken or expired connections.
+            close_old_connections()
+            try:
+                ran = self.run_batch()
+            except DatabaseError:
+                logger.exception("Worker %s could not claim tasks; retrying.", self.name)
+                self.stop.wait(self.poll_interval)
+                continue
+            if not ran:
+                if once:
+                    break
+                self.stop.wait(self.poll_interval)
+        metrics.maybe_flush(force=True)
+
+
+def run_pending(batch_size: int = 100) -> int:
+    """Run every due task in this thread, e.g. from tests or a cron job; returns how many ran."""
+    worker = Worker(worker_name(), batch_size=batch_size)
+    while worker.run_batch():
+        pass
+    return worker.processed
+
+
+# Tasks of the shop itself.
+
+
+@register("order_placed")
+def order_placed(order_id: int):
+    """Follow-up work of a new order; ``checkout`` only writes the order."""
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        return
+    sales.apply_order(order)
+    delay = getattr(settings, "SHOP_RECOMMENDATIONS_REBUILD_DELAY", None)
+    if delay is not None:
+        enqueue("rebuild_recommendations", delay=delay, key="rebuild_recommendations")
+    send_order_confirmation(order)
+
+
+def send_order_confirmation(order: Order):
+    context = {"order": order, "items": list(order.items.all())}
+    send_mail(
+        subject=f"تأیید سفارش {order.order_number}",
+        message=render_to_string("shop/emails/order_confirmation.txt", context),
+        from_email=None,
+        recipient_list=[order.email],
+    )
+
+
+@register("rebuild_recommendations", max_attempts=2)
+def rebuild_recommendations():
+    recommendations.build()
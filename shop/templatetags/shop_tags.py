@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from shop import images
+from shop.fragments import render_product_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, compact=False):
+    return mark_safe("".join(render_product_cards(products, context.get("request"), compact=compact)))
+
+
+@register.simple_tag
+def responsive_image(image, variants, variant="card", sizes="100vw", alt="", css_class="", eager=False, element_id=""):
+    """``<picture>`` with WebP and JPEG ``srcset``s built from ``image_variants``.
+
+    Falls back to a plain ``<img>`` of the original upload until variants exist.
+    """
+    if not image:
+        return ""
+    entry = (variants or {}).get(variant)
+    loading = "eager" if eager else "lazy"
+    if not entry:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" id="{}" loading="{}" decoding="async">',
+            image.url, alt, css_class, element_id, loading,
+        )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" id="{}" loading="{}" decoding="async">'
+        "</picture>",
+        images.srcset(variants, "webp"), sizes,
+        images.variant_url(image, variants, variant), images.srcset(variants, "jpeg"), sizes,
+        entry["width"], entry["height"], alt, css_class, element_id, loading,
+    )
+
+
+@register.simple_tag
+def image_srcset(variants, fmt="webp"):
+    return images.srcset(variants, fmt)
+
+
+@register.simple_tag
+def image_variant_url(image, variants, variant="thumb", fmt="jpeg"):
+    return images.variant_url(image, variants, variant, fmt)
@@ -1,3 +1,1397 @@
-from django.test import TestCase
+import json
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.db.utils import load_backend
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    assets,
+    benchmarks,
+    bulk,
+    exports,
+    facets,
+    fragments,
+    metrics,
+    profiling,
+    recommendations,
+    routers,
+    sales,
+    search,
+    sessions,
+    tasks,
+)
+from .fragments import CSRF_PLACEHOLDER, get_product_versions, get_stats
+from .models import (
+    CatalogVersion,
+    Category,
+    FacetCount,
+    Order,
+    OrderItem,
+    Product,
+    ProductImage,
+    ProductRecommendation,
+    ProductSales,
+    ProductSalesDay,
+    Task,
+)
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .sqlite_backend.base import WriteQueue
+from .storage import CompressedManifestStaticFilesStorage
+from .utils import CATALOG_VERSION_CACHE_KEY, bump_catalog_version, get_cart, get_cart_summary
+
+
+def make_product(category, name, price, **kwargs):
+    return Product.objects.create(
+        category=category,
+        name=name,
+        slug=kwargs.pop("slug", name),
+        description=kwargs.pop("description", f"توضیحات {name}"),
+        price=Decimal(price),
+        image=kwargs.pop("image", f"products/{name}.jpg"),
+        **kwargs,
+    )
+
+
+class CartSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.product = make_product(cls.category, "headphone", "100.00")
+
+    def add(self, product, quantity=1):
+        self.client.post(reverse("shop:add_to_cart"), {"product_id": product.id, "quantity": quantity})
+
+    def test_summary_is_reused_across_renders(self):
+        self.add(self.product, 2)
+        response = self.client.get(reverse("shop:home"))
+        self.assertEqual(response.context["cart_count"], 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_summary(response.wsgi_request)["count"], 2)
+
+    def test_price_change_invalidates_summary(self):
+        self.add(self.product, 1)
+        self.client.get(reverse("shop:home"))
+        self.product.price = Decimal("150.00")
+        self.product.save()
+        response = self.client.get(reverse("shop:cart"))
+        self.assertEqual(response.context["cart_subtotal"], Decimal("150.00"))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.digital = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.fashion = Category.objects.create(name="مد و پوشاک", slug="fashion")
+        cls.watch = make_product(cls.digital, "ساعت هوشمند لایت", "100.00", slug="watch", description="باتری ۷ روزه")
+        cls.speaker = make_product(cls.digital, "بلندگو بلوتوثی", "50.00", slug="speaker", description="همراه ساعت")
+        cls.coat = make_product(cls.fashion, "کت بارانی", "80.00", slug="coat", description="ضدآب")
+
+    def search(self, **params):
+        response = self.client.get(reverse("shop:product_list"), params)
+        return [p.slug for p in response.context["page_obj"].object_list]
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search(q="ساعت"), ["watch", "speaker"])
+
+    def test_normalizes_arabic_letters_and_digits(self):
+        self.assertEqual(self.search(q="باتري 7"), ["watch"])
+        self.assertEqual(self.search(q="كت"), ["coat"])
+
+    def test_combines_with_category_filter_and_sort(self):
+        self.assertEqual(self.search(q="ساعت", sort="price_asc"), ["speaker", "watch"])
+        self.assertEqual(self.search(q="ساعت", category="fashion"), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.coat.is_active = False
+        self.coat.save()
+        self.assertEqual(self.search(q="کت"), [])
+        self.speaker.delete()
+        self.assertEqual(self.search(q="ساعت"), ["watch"])
+
+    def test_pages_through_every_match_in_rank_order(self):
+        for i in range(25):
+            make_product(self.digital, f"ساعت {i:02d}", "10.00", slug=f"watch-{i:02d}", description="ساعت " * (i % 4))
+        url = reverse("shop:product_list")
+        response = self.client.get(url, {"q": "ساعت"})
+        pages = [list(response.context["page_obj"])]
+        while response.context["page_obj"].has_next:
+            response = self.client.get(url, {"q": "ساعت", "cursor": response.context["page_obj"].next_cursor})
+            pages.append(list(response.context["page_obj"]))
+        self.assertEqual([len(page) for page in pages], [12, 12, 3])
+        self.assertEqual([p.id for p in sum(pages, [])], search.search_product_ids("ساعت"))
+
+        response = self.client.get(url, {"q": "ساعت", "cursor": response.context["page_obj"].previous_cursor})
+        self.assertEqual(list(response.context["page_obj"]), pages[1])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="ورزش و سفر", slug="sport")
+        for i in range(30):
+            make_product(category, f"item-{i:02d}", f"{10 + i % 7}.00")
+
+    def walk(self, sort):
+        url = reverse("shop:product_list")
+        response = self.client.get(url, {"sort": sort})
+        pages = [[p.slug for p in response.context["page_obj"]]]
+        while response.context["page_obj"].has_next:
+            response = self.client.get(url, {"sort": sort, "cursor": response.context["page_obj"].next_cursor})
+            pages.append([p.slug for p in response.context["page_obj"]])
+        return pages, response
+
+    def test_pages_cover_every_product_once_in_sort_order(self):
+        for sort, ordering in [("", ("-created_at", "id")), ("price_asc", ("price", "id")), ("price_desc", ("-price", "id"))]:
+            pages, _ = self.walk(sort)
+            self.assertEqual([len(page) for page in pages], [12, 12, 6])
+            expected = list(Product.objects.order_by(*ordering).values_list("slug", flat=True))
+            self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        pages, last = self.walk("price_asc")
+        response = self.client.get(
+            reverse("shop:product_list"), {"sort": "price_asc", "cursor": last.context["page_obj"].previous_cursor}
+        )
+        self.assertEqual([p.slug for p in response.context["page_obj"]], pages[1])
+
+    def test_deep_page_does_not_count(self):
+        _, last = self.walk("price_desc")
+        self.assertIsNone(last.context["total_count"])
+        # The shared catalog version, the page and the categories; no COUNT.
+        with self.assertNumQueries(3):
+            self.client.get(reverse("shop:product_list"), {"cursor": last.context["page_obj"].previous_cursor})
+
+
+class QueryPlanTests(TestCase):
+    def test_catalog_queries_use_indexes(self):
+        category = Category.objects.create(name="خانه و آشپزخانه", slug="home")
+        for i in range(5):
+            make_product(category, f"چراغ مطالعه {i}", "10.00", slug=f"lamp-{i}")
+        out = StringIO()
+        call_command("audit_query_plans", verbose_plans=True, stdout=out)
+        self.assertIn("home: SCAN shop_product USING INDEX product_active_newest_idx", out.getvalue())
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="زیبایی و سلامت", slug="beauty")
+        cls.mask = make_product(cls.category, "ماسک صورت", "189000.00", slug="mask")
+        ProductSales.objects.create(product=cls.mask, units=1, units_30d=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_shared_between_visitors_with_their_own_csrf_token(self):
+        first = self.client.get(reverse("shop:home"))
+        other = Client()
+        # Only the shared catalog version the validators compare; sections and cards are cached.
+        with self.assertNumQueries(1):
+            second = other.get(reverse("shop:home"))
+        self.assertContains(second, "189000")
+        self.assertNotIn(CSRF_PLACEHOLDER, second.content.decode())
+        self.assertEqual(get_stats()["card"]["hits"], 2)
+
+    def test_stats_need_a_cache_every_worker_counts_into(self):
+        with self.assertRaisesMessage(CommandError, "local to each process"):
+            call_command("fragment_cache_stats", stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": directory}}
+            with override_settings(CACHES=shared):
+                fragments.record_stats("card", 3, 1)
+                out = StringIO()
+                call_command("fragment_cache_stats", "--reset", stdout=out)
+                self.assertIn("hits=3", out.getvalue())
+                self.assertEqual(get_stats()["card"]["hits"], 0)
+
+    def test_price_change_invalidates_card_and_home_sections(self):
+        self.client.get(reverse("shop:home"))
+        self.mask.price = Decimal("239000.00")
+        self.mask.save()
+        self.assertContains(self.client.get(reverse("shop:home")), "239000")
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.category = Category.objects.create(name="مد و پوشاک", slug="fashion")
+
+    def upload(self, name, size=(900, 1100)):
+        buffer = BytesIO()
+        Image.new("RGB", size, (40, 180, 120)).save(buffer, format="JPEG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    def test_upload_generates_hashed_variants(self):
+        product = make_product(self.category, "کت", "10.00", slug="coat", image=self.upload("coat.jpg"))
+        product.refresh_from_db()
+        card = product.image_variants["card"]
+        self.assertEqual((card["width"], card["height"]), (480, 587))
+        self.assertRegex(card["webp"], r"^derivatives/coat-[0-9a-f]{16}-480\.webp$")
+        # Never upscaled past the 900px source.
+        self.assertEqual(product.image_variants["zoom"]["width"], 900)
+
+        response = self.client.get(reverse("shop:product_list"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, " 480w")
+
+    def test_backfill_fills_rows_missing_variants(self):
+        product = make_product(self.category, "هودی", "10.00", slug="hoodie", image=self.upload("hoodie.jpg"))
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        call_command("backfill_image_variants", workers=1, stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants["thumb"]["width"], 160)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("buyer", "buyer@example.com", "pass-1234")
+        category = Category.objects.create(name="ورزش و سفر", slug="sport")
+        cls.products = [make_product(category, f"kit-{i}", "25.00") for i in range(6)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def checkout(self, products):
+        for product in products:
+            self.client.post(reverse("shop:add_to_cart"), {"product_id": product.id, "quantity": 2})
+        data = {
+            "full_name": "Sara M",
+            "email": "buyer@example.com",
+            "address": "Valiasr St",
+            "city": "Tehran",
+            "postal_code": "1234567890",
+            "country": "ایران",
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("shop:checkout"), data)
+        self.assertEqual(response.status_code, 302)
+        return len(ctx.captured_queries)
+
+    def test_writes_all_lines_and_clears_cart(self):
+        self.checkout(self.products[:3])
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.subtotal, Decimal("150.00"))
+        self.assertEqual(self.client.session["cart"], {})
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        one_line = self.checkout(self.products[:1])
+        six_lines = self.checkout(self.products)
+        self.assertEqual(one_line, six_lines)
+
+
+class ImportCatalogTests(TestCase):
+    def write_feed(self, name, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / name
+        path.write_text(content, encoding="utf-8")
+        return str(path)
+
+    def test_csv_upserts_on_slug_and_creates_categories(self):
+        category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        make_product(category, "old name", "1.00", slug="alpha", description="keep me")
+        feed = self.write_feed(
+            "feed.csv",
+            "name,slug,category,category_slug,price,compare_at_price,image\n"
+            "هدفون آلفا,alpha,کالای دیجیتال,digital,\"4,890,000\",5490000,products/a.jpg\n"
+            "کت بارانی,coat,مد و پوشاک,,1890000,,products/b.jpg\n"
+            "بدون قیمت,nope,مد و پوشاک,,,,\n",
+        )
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", feed, batch_size=1, stdout=out, stderr=err)
+
+        alpha = Product.objects.get(slug="alpha")
+        self.assertEqual((alpha.name, alpha.price, alpha.description), ("هدفون آلفا", Decimal("4890000"), "keep me"))
+        self.assertEqual(Product.objects.get(slug="coat").category.name, "مد و پوشاک")
+        self.assertIn("line 4: missing price", err.getvalue())
+        self.assertIn("Imported 2 products in 2 batches, skipped 1", out.getvalue())
+        self.assertEqual(search.search_product_ids("بارانی"), [Product.objects.get(slug="coat").pk])
+
+    def test_categories_match_by_name_and_rows_own_their_columns(self):
+        digital = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        make_product(digital, "beta", "1.00", description="keep me")
+        feed = self.write_feed(
+            "feed.jsonl",
+            '{"name": "alpha", "category": "کالای دیجیتال", "price": 10, "description": "new"}\n'
+            '{"name": "beta", "category": "کالای دیجیتال", "price": 20}\n'
+            '{"name": "gamma", "category": "کالای دیجیتال", "category_slug": "digi", "price": 30}\n',
+        )
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", feed, stdout=out, stderr=err)
+
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Product.objects.get(slug="alpha").category, digital)
+        beta = Product.objects.get(slug="beta")
+        self.assertEqual((beta.price, beta.description), (Decimal("20"), "keep me"))
+        self.assertIn("line 3: category 'کالای دیجیتال' already exists with slug 'digital'", err.getvalue())
+        self.assertIn("Imported 2 products in 1 batches, skipped 1", out.getvalue())
+
+    def test_partial_reimport_keeps_the_search_index_in_step(self):
+        category = Category.objects.create(name="مد و پوشاک", slug="fashion")
+        coat = make_product(category, "coat", "1.00", slug="coat", description="بارانی")
+        hidden = make_product(category, "hat", "1.00", slug="hat", description="پشمی")
+        hidden.is_active = False
+        hidden.save()
+        feed = self.write_feed(
+            "feed.jsonl",
+            '{"name": "coat", "category": "مد و پوشاک", "price": 20}\n'
+            '{"name": "hat", "category": "مد و پوشاک", "price": 30}\n',
+        )
+        call_command("import_catalog", feed, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(search.search_product_ids("بارانی"), [coat.pk])
+        self.assertEqual(search.search_product_ids("پشمی"), [])
+        self.assertFalse(Product.objects.get(pk=hidden.pk).is_active)
+
+    def test_dry_run_writes_nothing(self):
+        feed = self.write_feed("feed.jsonl", '{"name": "کت", "category": "مد و پوشاک", "price": 10}\n')
+        call_command("import_catalog", feed, dry_run=True, stdout=StringIO())
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.media = tempfile.TemporaryDirectory()
+        with override_settings(MEDIA_ROOT=cls.media.name):
+            call_command(
+                "generate_dataset", products=80, orders=40, users=5, image_pool=2, workers=1, stdout=StringIO()
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media.cleanup()
+
+    def tearDown(self):
+        # Nothing of the rolled-back benchmark may be flushed later, e.g. at exit.
+        sessions._pending.clear()
+
+    def test_views_stay_within_query_budgets(self):
+        # The shipped settings: a local-memory sessions cache, so sessions go to the database.
+        output = Path(self.media.name) / "bench.json"
+        call_command(
+            "benchmark_views", iterations=3, warmup=1, no_latency_budgets=True, output=str(output), stdout=StringIO()
+        )
+        report = json.loads(output.read_text(encoding="utf-8"))
+        self.assertEqual(report["sessions"], "database")
+        self.assertEqual(report["dataset"]["products"], 80)
+        self.assertIn("p99_ms", report["scenarios"]["product_list_deep_page"])
+        self.assertEqual(Order.objects.count(), 40)
+
+    @override_settings(SHOP_SESSION_WRITE_BEHIND=True)
+    def test_write_behind_sessions_keep_the_tighter_budgets(self):
+        output = Path(self.media.name) / "bench-write-behind.json"
+        call_command(
+            "benchmark_views", iterations=3, warmup=1, no_latency_budgets=True, output=str(output), stdout=StringIO()
+        )
+        report = json.loads(output.read_text(encoding="utf-8"))
+        self.assertEqual(report["sessions"], "write-behind")
+        self.assertEqual(report["scenarios"]["add_to_cart"]["budget"]["max_queries"], 2)
+
+    def test_exceeded_budget_fails(self):
+        budgets = Path(self.media.name) / "budgets.json"
+        budgets.write_text(json.dumps({"product_detail": {"max_queries": 0}}))
+        with self.assertRaisesMessage(CommandError, "1 budget(s) exceeded"):
+            call_command(
+                "benchmark_views", iterations=1, warmup=0, only=["product_detail"], budgets=str(budgets),
+                no_latency_budgets=True, stdout=StringIO(), stderr=StringIO(),
+            )
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        make_product(cls.category, "headphone", "100.00")
+
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse("shop:product_list"))
+        totals = metrics.collect()
+        view = (("view", "shop:product_list"),)
+        self.assertEqual(totals[("shop_http_requests_total", view + (("status", "200"),))], 1)
+        self.assertEqual(totals[("shop_http_request_duration_seconds_count", view)], 1)
+        self.assertGreater(totals[("shop_db_queries_total", view)], 0)
+        self.assertGreater(totals[("shop_template_render_seconds_total", view)], 0)
+        self.assertGreater(totals[("shop_http_response_size_bytes_sum", view)], 0)
+
+    def test_endpoint_sums_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            SHOP_METRICS_DIR=directory, SHOP_METRICS_ALLOWED_IPS=["127.0.0.1"]
+        ):
+            self.client.get(reverse("shop:home"))
+            other_worker = [
+                ["shop_http_requests_total", [["view", "shop:home"], ["status", "200"]], 4],
+                ["shop_http_request_duration_seconds_bucket", [["view", "shop:home"], ["le", "0.05"]], 4],
+                ["shop_http_request_duration_seconds_count", [["view", "shop:home"]], 4],
+            ]
+            Path(directory, "metrics-1.json").write_text(json.dumps(other_worker))
+            body = self.client.get("/metrics").content.decode()
+        self.assertIn('shop_http_requests_total{view="shop:home",status="200"} 5', body)
+        self.assertIn('shop_http_request_duration_seconds_count{view="shop:home"} 5', body)
+        self.assertIn('shop_http_request_duration_seconds_bucket{view="shop:home",le="+Inf"} 5', body)
+        self.assertIn("# TYPE shop_http_request_duration_seconds histogram", body)
+
+    @override_settings(SHOP_METRICS_TOKEN="secret")
+    def test_endpoint_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+    def test_endpoint_is_closed_until_configured(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(SHOP_METRICS_ALLOWED_IPS=["10.0.0.0/8"]):
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 200)
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="192.0.2.7").status_code, 403)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.product = make_product(cls.category, "headphone", "100.00")
+        cls.staff = get_user_model().objects.create_user("staff", password="pass", is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(SHOP_PROFILE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_untriggered_requests_are_not_profiled(self):
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertNotIn(profiling.HEADER, response)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_signed_token_profiles_request(self):
+        response = self.client.get(
+            self.product.get_absolute_url(), HTTP_X_SHOP_PROFILE=profiling.make_token()
+        )
+        profile = profiling.load(response[profiling.HEADER])
+        self.assertEqual(profile["view"], "shop:product_detail")
+        self.assertTrue(profile["queries"])
+        self.assertIn("cumulative", profiling.top_functions(profile["id"]))
+
+    def test_bad_token_is_ignored(self):
+        response = self.client.get(reverse("shop:home"), {profiling.QUERY_PARAM: "forged"})
+        self.assertNotIn(profiling.HEADER, response)
+
+    @override_settings(SHOP_PROFILE_SAMPLE_RATE=1.0, SHOP_PROFILE_MAX_FILES=2)
+    def test_sampling_and_rotation(self):
+        for _ in range(3):
+            self.client.get(reverse("shop:home"))
+        self.assertEqual(len(profiling.list_profiles()), 2)
+
+    def test_admin_pages_are_staff_only(self):
+        response = self.client.get(reverse("shop:home"), HTTP_X_SHOP_PROFILE=profiling.make_token())
+        profile_id = response[profiling.HEADER]
+        detail = reverse("admin_profile", args=[profile_id])
+        self.assertEqual(self.client.get(detail).status_code, 302)
+
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse("admin_profiles")), profile_id)
+        self.assertContains(self.client.get(detail, {"sort": "tottime"}), "tottime")
+        collapsed = self.client.get(detail, {"format": "collapsed"})
+        self.assertEqual(collapsed["Content-Type"], "text/plain; charset=utf-8")
+        self.assertEqual(self.client.get(reverse("admin_profile", args=["..missing"])).status_code, 404)
+
+
+@override_settings(SHOP_SESSION_WRITE_BEHIND=True)
+class SessionEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.product = make_product(cls.category, "headphone", "100.00")
+
+    def setUp(self):
+        caches["sessions"].clear()
+        sessions._pending.clear()
+        self.addCleanup(sessions._pending.clear)
+
+    def test_cart_writes_skip_the_session_table(self):
+        with CaptureQueriesContext(connection) as ctx, override_settings(SHOP_SESSION_FLUSH_INTERVAL=3600):
+            sessions._last_flush = time.monotonic()
+            self.client.post(reverse("shop:add_to_cart"), {"product_id": self.product.id, "quantity": 2})
+            self.client.post(reverse("shop:add_to_cart"), {"product_id": self.product.id, "quantity": 1})
+        self.assertFalse([q for q in ctx.captured_queries if "django_session" in q["sql"]])
+        self.assertEqual(self.client.session["cart"], {str(self.product.id): 3})
+
+    def test_flush_persists_sessions_in_one_batch(self):
+        with override_settings(SHOP_SESSION_FLUSH_INTERVAL=3600):
+            sessions._last_flush = time.monotonic()
+            self.client.post(reverse("shop:add_to_cart"), {"product_id": self.product.id})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(sessions.flush_pending(force=True), 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        caches["sessions"].clear()
+        response = self.client.get(reverse("shop:cart"))
+        self.assertEqual(response.context["cart_count"], 1)
+
+    def test_legacy_cart_format_is_read(self):
+        session = self.client.session
+        session["cart"] = {str(self.product.id): {"quantity": 4}}
+        session.save()
+        self.assertEqual(get_cart(self.client.session), {str(self.product.id): 4})
+        self.assertContains(self.client.get(reverse("shop:cart")), "headphone")
+
+    @override_settings(SHOP_SESSION_WRITE_BEHIND=None)
+    def test_process_local_cache_writes_through(self):
+        self.assertFalse(sessions.write_behind())
+        self.client.post(reverse("shop:add_to_cart"), {"product_id": self.product.id, "quantity": 2})
+        self.assertFalse(sessions._pending)
+        # Another worker has its own empty local-memory cache.
+        caches["sessions"].clear()
+        self.assertEqual(get_cart(self.client.session), {str(self.product.id): 2})
+
+    @override_settings(SHOP_SESSION_PURGE_BATCH_SIZE=2)
+    def test_clear_expired_in_batches(self):
+        past = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create(
+            Session(session_key=f"expired{i}", session_data="", expire_date=past) for i in range(5)
+        )
+        Session.objects.create(session_key="live", session_data="", expire_date=timezone.now() + timedelta(days=1))
+        sessions.SessionStore.clear_expired()
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
+
+
+# Session flushes from request_finished would run on another thread's connection here.
+@override_settings(ROOT_URLCONF=benchmarks.root_urlconf(use_async=True), SHOP_SESSION_FLUSH_INTERVAL=3600)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.product = make_product(cls.category, "headphone", "189000")
+        make_product(cls.category, "speaker", "99000")
+        cls.user = get_user_model().objects.create_user("buyer", password="pass")
+
+    def setUp(self):
+        cache.clear()
+        sessions._last_flush = time.monotonic()
+
+    async def test_catalog_pages(self):
+        response = await self.async_client.get(reverse("shop:home"))
+        self.assertContains(response, "headphone")
+        self.assertEqual(len(response.context["featured_products"]), 2)
+
+        response = await self.async_client.get(reverse("shop:product_list"), {"q": "headphone"})
+        self.assertEqual([p.name for p in response.context["page_obj"]], ["headphone"])
+        self.assertEqual(response.context["total_count"], 1)
+
+        response = await self.async_client.get(self.product.get_absolute_url())
+        self.assertEqual([p.name for p in response.context["related"]], ["speaker"])
+        self.assertEqual((await self.async_client.get("/shop/missing/")).status_code, 404)
+
+    async def test_home_loads_its_sections_concurrently_once(self):
+        with mock.patch.object(fragments, "get_home_sections", side_effect=AssertionError("sync load")):
+            response = await self.async_client.get(reverse("shop:home"))
+        self.assertContains(response, "headphone")
+        self.assertIn("ETag", response)
+
+    async def test_cart_view_and_navbar_summary(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.post(reverse("shop:add_to_cart"), {"product_id": self.product.id, "quantity": 2})
+        response = await self.async_client.get(reverse("shop:cart"))
+        self.assertEqual(response.context["subtotal"], Decimal("378000.00"))
+        self.assertEqual(response.context["cart_count"], 2)
+        self.assertContains(response, self.user.username)
+
+    async def test_conditional_get(self):
+        url = self.product.get_absolute_url()
+        await self.async_client.get(url)  # sets the CSRF cookie the validators include
+        etag = (await self.async_client.get(url))["ETag"]
+        response = await self.async_client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_keyset_pages_match_sync(self):
+        paginator = KeysetPaginator(Product.objects.all(), ("price", "id"), per_page=1)
+        page = paginator.get_page(None)
+        async_page = async_to_sync(paginator.aget_page)(page.next_cursor)
+        self.assertEqual(list(async_page), list(paginator.get_page(page.next_cursor)))
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.digital = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.books = Category.objects.create(name="کتاب", slug="books")
+        cls.phone = make_product(cls.digital, "phone", "1200000", description="گوشی هوشمند")
+        make_product(cls.digital, "charger", "90000", description="شارژر گوشی")
+        make_product(cls.books, "novel", "150000")
+        make_product(cls.books, "hidden", "150000", is_active=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def cells(self):
+        return {(row.category_id, row.bucket): row.count for row in FacetCount.objects.all() if row.count}
+
+    def test_signals_keep_counts_in_step_with_rebuild(self):
+        self.phone.price = Decimal("95000")
+        self.phone.save()
+        make_product(self.books, "atlas", "3000000").delete()
+        Product.objects.filter(slug="hidden").first().delete()
+        incremental = self.cells()
+        self.assertEqual(incremental[(self.digital.id, facets.bucket_for(Decimal("95000")))], 2)
+        facets.rebuild()
+        self.assertEqual(self.cells(), incremental)
+
+    def test_deactivating_removes_from_counts(self):
+        self.phone.is_active = False
+        self.phone.save()
+        self.assertNotIn((self.digital.id, facets.bucket_for(Decimal("1200000"))), self.cells())
+
+    def test_listing_shows_counts_and_filters_by_price(self):
+        bucket = facets.bucket_for(Decimal("150000"))
+        response = self.client.get(reverse("shop:product_list"), {"price": bucket})
+        self.assertEqual([p.name for p in response.context["page_obj"]], ["novel"])
+        counts = {category.slug: count for category, count in response.context["category_facets"]}
+        self.assertEqual(counts, {"books": 1, "digital": 0})
+        prices = {facet["bucket"]: facet["count"] for facet in response.context["price_facets"]}
+        self.assertEqual(sum(prices.values()), 3)
+
+        # Warm: the shared catalog version, the page query and categories; counts come from the cache.
+        with self.assertNumQueries(3):
+            self.client.get(reverse("shop:product_list"), {"price": bucket})
+
+    def test_search_counts_follow_results(self):
+        response = self.client.get(reverse("shop:product_list"), {"q": "گوشی", "category": "digital"})
+        counts = {category.slug: count for category, count in response.context["category_facets"]}
+        self.assertEqual(counts, {"books": 0, "digital": 2})
+        prices = [facet["count"] for facet in response.context["price_facets"] if facet["count"]]
+        self.assertEqual(sorted(prices), [1, 1])
+
+    def test_rebuild_command(self):
+        FacetCount.objects.all().delete()
+        call_command("rebuild_facets", stdout=StringIO())
+        self.assertEqual(sum(self.cells().values()), 3)
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        sport = Category.objects.create(name="ورزش و سفر", slug="sport")
+        home = Category.objects.create(name="خانه", slug="home")
+        cls.tent, cls.bag, cls.lamp, cls.mug = (
+            make_product(sport, "tent", "100"),
+            make_product(sport, "bag", "100"),
+            make_product(home, "lamp", "100"),
+            make_product(home, "mug", "100"),
+        )
+        cls.fresh = make_product(sport, "fresh", "100")
+        for products, status in (
+            ([cls.tent, cls.lamp], "delivered"),
+            ([cls.tent, cls.lamp, cls.mug], "delivered"),
+            ([cls.tent, cls.bag], "delivered"),
+            ([cls.tent, cls.bag], "cancelled"),
+            ([cls.tent, cls.bag], "cancelled"),
+        ):
+            order = Order.objects.create(
+                status=status, full_name="Sara M", email="sara@example.com", address="Valiasr St",
+                city="Tehran", postal_code="1234567890", subtotal=0, shipping=0, tax=0, total=0,
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, name=product.name, price=product.price) for product in products
+            )
+
+    def neighbours(self, product):
+        return list(
+            ProductRecommendation.objects.filter(product=product).order_by("rank").values_list("recommended__name", flat=True)
+        )
+
+    def test_build_ranks_co_purchases_and_skips_cancelled_orders(self):
+        # One line per query and one product per pass exercise the chunk and partition joins.
+        recommendations.build(chunk_size=1, partition_size=1)
+        self.assertEqual(self.neighbours(self.tent), ["lamp", "bag", "mug"])
+        self.assertEqual(self.neighbours(self.mug), ["lamp", "tent"])
+        self.assertEqual(self.neighbours(self.fresh), [])
+
+    def test_build_replaces_previous_rows(self):
+        recommendations.build(top_k=1)
+        recommendations.build(top_k=1, min_support=2)
+        self.assertEqual(self.neighbours(self.tent), ["lamp"])
+        self.assertEqual(self.neighbours(self.bag), [])
+
+    def test_product_page_uses_table_and_falls_back_to_category(self):
+        call_command("build_recommendations", stdout=StringIO())
+        # Product, gallery, and one join for the neighbours.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.lamp.get_absolute_url())
+        self.assertEqual([p.name for p in response.context["related"]], ["tent", "mug"])
+
+        response = self.client.get(self.fresh.get_absolute_url())
+        self.assertEqual({p.name for p in response.context["related"]}, {"tent", "bag"})
+
+    def test_cart_combines_neighbours_of_all_items(self):
+        recommendations.build()
+        for product in (self.lamp, self.bag):
+            self.client.post(reverse("shop:add_to_cart"), {"product_id": product.id})
+        response = self.client.get(reverse("shop:cart"))
+        self.assertEqual([p.name for p in response.context["recommended"]], ["tent", "mug"])
+
+
+class SalesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("buyer", "buyer@example.com", "pass-1234")
+        category = Category.objects.create(name="ورزش و سفر", slug="sport")
+        cls.tent = make_product(category, "tent", "100.00")
+        cls.bag = make_product(category, "bag", "40.00")
+        cls.hidden = make_product(category, "hidden", "10.00", is_active=False)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def checkout(self, quantities):
+        for product, quantity in quantities.items():
+            self.client.post(reverse("shop:add_to_cart"), {"product_id": product.id, "quantity": quantity})
+        data = {
+            "full_name": "Sara M", "email": "buyer@example.com", "address": "Valiasr St",
+            "city": "Tehran", "postal_code": "1234567890", "country": "ایران",
+        }
+        self.client.post(reverse("shop:checkout"), data)
+        tasks.run_pending()
+        return Order.objects.latest("id")
+
+    def totals(self):
+        return {
+            row.product.name: (row.units, row.revenue, row.units_7d, row.units_30d, row.revenue_30d)
+            for row in ProductSales.objects.select_related("product")
+        }
+
+    def test_checkout_and_cancellation_update_aggregates(self):
+        self.checkout({self.tent: 2, self.bag: 1})
+        order = self.checkout({self.tent: 1})
+        self.assertEqual(self.totals()["tent"], (3, Decimal("300"), 3, 3, Decimal("300")))
+        self.assertEqual(ProductSalesDay.objects.get(product=self.tent).units, 3)
+
+        order.status = "cancelled"
+        order.save()
+        self.assertEqual(self.totals()["tent"], (2, Decimal("200"), 2, 2, Decimal("200")))
+        order.status = "processing"
+        order.save()
+        self.assertEqual(self.totals()["tent"][0], 3)
+
+        incremental = self.totals()
+        sales.rebuild()
+        self.assertEqual(self.totals(), incremental)
+
+    def test_compaction_rolls_windows_forward(self):
+        order = self.checkout({self.tent: 2})
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=10))
+        sales.rebuild()
+        self.assertEqual(self.totals()["tent"], (2, Decimal("200"), 0, 2, Decimal("200")))
+
+        call_command("compact_sales", stdout=StringIO())
+        self.assertEqual(self.totals()["tent"][2:4], (0, 2))
+        sales.compact(today=timezone.localdate() + timedelta(days=25))
+        self.assertEqual(self.totals()["tent"], (2, Decimal("200"), 0, 0, Decimal("0")))
+        self.assertFalse(ProductSalesDay.objects.exists())
+
+    def test_home_ranks_by_recent_sales_and_skips_inactive(self):
+        ProductSales.objects.create(product=self.tent, units=50, units_30d=1)
+        ProductSales.objects.create(product=self.bag, units=5, units_30d=4)
+        ProductSales.objects.create(product=self.hidden, units=90, units_30d=9)
+        response = self.client.get(reverse("shop:home"))
+        self.assertEqual([p.name for p in response.context["best_sellers"]], ["bag", "tent"])
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pass-1234")
+        category = Category.objects.create(name="ورزش و سفر", slug="sport")
+        tent = make_product(category, "tent", "100.00")
+        for status, quantity in (("delivered", 2), ("cancelled", 1), ("pending", 3)):
+            order = Order.objects.create(
+                status=status, full_name="سارا محمدی", email="sara@example.com", address="Valiasr St",
+                city="Tehran", postal_code="1234567890", subtotal=100 * quantity, shipping=0, tax=0, total=100 * quantity,
+            )
+            OrderItem.objects.create(order=order, product=tent, name=tent.name, price=tent.price, quantity=quantity)
+            OrderItem.objects.create(order=order, product=None, name="gift wrap", price=Decimal("5.00"), quantity=1)
+        Order.objects.filter(status="pending").update(created_at=timezone.now() - timedelta(days=40))
+
+    def test_command_filters_and_streams_jsonl(self):
+        out = StringIO()
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        call_command("export_orders", format="jsonl", since=since, status=["delivered", "pending"], stdout=out)
+        orders = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([order["status"] for order in orders], ["delivered"])
+        self.assertEqual(orders[0]["full_name"], "سارا محمدی")
+        self.assertEqual([item["line_total"] for item in orders[0]["items"]], ["200.00", "5.00"])
+
+    def test_command_rejects_impossible_dates(self):
+        for value in ("yesterday", "2024-13-45"):
+            with self.assertRaisesMessage(CommandError, f"Not a date: {value!r}"):
+                call_command("export_orders", since=value, stdout=StringIO())
+
+    def test_prefetches_items_per_chunk(self):
+        # The orders are one query read in chunks; each chunk prefetches its items.
+        with self.assertNumQueries(3):
+            rows = list(exports.csv_rows(Order.objects.all(), chunk_size=2))
+        self.assertEqual(len(rows), 1 + 3 * 2)
+
+    def test_admin_action_streams_csv_of_filtered_changelist(self):
+        self.client.force_login(self.admin)
+        url = reverse("admin:shop_order_changelist")
+        response = self.client.post(
+            f"{url}?status__exact=delivered",
+            {"action": "export_csv", "select_across": "1", "index": "0", "_selected_action": [Order.objects.first().pk]},
+        )
+        self.assertTrue(response.streaming, response.status_code)
+        self.assertIn("attachment", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("delivered", lines[1])
+
+
+class AdminScalingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pass-1234")
+        cls.category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, start, count):
+        for i in range(start, start + count):
+            product = make_product(self.category, f"item-{i}", "100", description="هدفون بی‌سیم" if i == 0 else "کابل")
+            order = Order.objects.create(
+                full_name="Sara M", email=f"buyer{i}@example.com", address="Valiasr St", city="Tehran",
+                postal_code="1234567890", subtotal=100, shipping=0, tax=0, total=100,
+            )
+            OrderItem.objects.create(order=order, product=product, name=product.name, price=product.price)
+
+    def queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        pages = [
+            reverse("admin:shop_product_changelist"),
+            reverse("admin:shop_order_changelist"),
+            reverse("admin:shop_order_change", args=[1]),
+        ]
+        self.add_rows(0, 3)
+        [self.queries(url) for url in pages]
+        small = [self.queries(url) for url in pages]
+        self.add_rows(3, 12)
+        self.assertEqual([self.queries(url) for url in pages], small)
+
+    def test_search_uses_indexes(self):
+        self.add_rows(0, 3)
+        response = self.client.get(reverse("admin:shop_product_changelist"), {"q": "هدفون"})
+        self.assertEqual([p.name for p in response.context["cl"].result_list], ["item-0"])
+        # Inactive products are found too, and a search without hits shows an empty list.
+        Product.objects.filter(name="item-1").update(is_active=False)
+        response = self.client.get(reverse("admin:shop_product_changelist"), {"q": "item-1"})
+        self.assertEqual([p.name for p in response.context["cl"].result_list], ["item-1"])
+        response = self.client.get(reverse("admin:shop_product_changelist"), {"q": "zzzz"})
+        self.assertEqual(response.context["cl"].result_count, 0)
+        results, _ = admin.site._registry[Product].get_search_results(None, Product.objects.order_by(), "item")
+        with connection.cursor() as cursor:
+            sql, params = results.query.sql_with_params()
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertIn("SEARCH shop_product USING INDEX product_name_prefix_idx (name>? AND name<?)", plan)
+        self.assertNotIn("SCAN shop_product", plan)
+        for empty in (Product.objects.none(), Product.objects.filter(pk__in=[])):
+            self.assertEqual(EstimatedCountPaginator(empty, 10).count, 0)
+        order = Order.objects.get(email="buyer2@example.com")
+        for term in (order.order_number, "buyer2@example.com"):
+            response = self.client.get(reverse("admin:shop_order_changelist"), {"q": term})
+            self.assertEqual(list(response.context["cl"].result_list), [order])
+
+    def test_unfiltered_count_is_estimated(self):
+        self.add_rows(0, 3)
+        Product.objects.filter(name="item-1").delete()
+        response = self.client.get(reverse("admin:shop_product_changelist"))
+        # No ANALYZE statistics yet, so the id span stands in for the row count.
+        self.assertEqual(response.context["cl"].result_count, 3)
+        response = self.client.get(reverse("admin:shop_product_changelist"), {"is_active__exact": "1"})
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("buyer", password="pass")
+        cls.category = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.product = make_product(cls.category, "headphone", "189000")
+        cls.other = make_product(cls.category, "speaker", "99000")
+
+    def setUp(self):
+        cache.clear()
+
+    def etag(self, url, params=None):
+        # The first visit sets the CSRF cookie, which the validators include.
+        self.client.get(url, params or {})
+        return self.client.get(url, params or {})["ETag"]
+
+    def assertNotModified(self, url, etag, params=None):
+        with self.assertTemplateNotUsed("base.html"):
+            response = self.client.get(url, params or {}, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_detail_changes_with_product_gallery_category_and_related(self):
+        url = self.product.get_absolute_url()
+        etag = self.etag(url)
+        self.assertNotModified(url, etag)
+
+        changes = [
+            lambda: self.product.save(),
+            lambda: ProductImage.objects.create(product=self.product, image="products/gallery/a.jpg"),
+            lambda: self.category.save(),
+            lambda: self.other.save(),
+        ]
+        for change in changes:
+            time.sleep(0.001)
+            change()
+            response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+
+    def test_product_detail_changes_when_gallery_or_category_membership_does(self):
+        url = self.product.get_absolute_url()
+        older = ProductImage.objects.create(product=self.product, image="products/gallery/a.jpg")
+        ProductImage.objects.create(product=self.product, image="products/gallery/b.jpg")
+        older_category = Category.objects.create(name="کتاب", slug="books")
+        Category.objects.filter(pk=older_category.pk).update(updated_at=self.category.updated_at)
+        etag = self.etag(url)
+
+        # Neither change moves the newest updated_at the validators see.
+        changes = [
+            lambda: ProductImage.objects.filter(pk=older.pk).delete(),
+            lambda: Product.objects.filter(pk=self.product.pk).update(category=older_category),
+        ]
+        for change in changes:
+            change()
+            response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+
+    def test_listing_changes_with_catalog_version(self):
+        url = reverse("shop:product_list")
+        etag = self.etag(url, {"sort": "price_asc"})
+        self.assertNotModified(url, etag, {"sort": "price_asc"})
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+        self.other.save()
+        response = self.client.get(url, {"sort": "price_asc"}, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_listing_changes_when_another_worker_edits_the_catalog(self):
+        url = reverse("shop:product_list")
+        etag = self.etag(url)
+        # That worker's local-memory cache is not this one's; only the row is shared.
+        CatalogVersion.objects.update_or_create(pk=1, defaults={"version": time.time_ns()})
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_visitor_state_is_part_of_the_validators(self):
+        url = reverse("shop:home")
+        etag = self.etag(url)
+        self.assertIn("Last-Modified", self.client.get(reverse("shop:product_list")))
+
+        # Adding to the cart queues a flash message: no validators until it is shown.
+        self.client.post(reverse("shop:add_to_cart"), {"product_id": self.product.id})
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertNotIn("Last-Modified", self.client.get(reverse("shop:product_list")))
+
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.client.get(url)["ETag"], response["ETag"])
+
+    def test_crawler_revalidation_with_if_modified_since(self):
+        url = self.product.get_absolute_url()
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = Client().get(url, headers={"if-modified-since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+
+class StaticAssetTests(TestCase):
+    # Classes the site's own CSS or scripts handle rather than utilities.
+    NON_UTILITY = {"group", "glass", "hide-scrollbar", "thumb", "active", "breadcrumbs", "message-close"}
+
+    def test_every_template_class_compiles(self):
+        missing = set()
+        for template in Path(settings.BASE_DIR, "templates").rglob("*.html"):
+            for value in re.findall(r'class="([^"]*)"', template.read_text(encoding="utf-8")):
+                for name in re.sub(r"\{%.*?%\}|\{\{.*?\}\}", " ", value).split():
+                    if name not in self.NON_UTILITY and assets.compile_class(name) is None:
+                        missing.add(name)
+        self.assertEqual(missing, set())
+
+    def test_stylesheet_has_theme_and_variants(self):
+        rules = assets.compile_classes(assets.candidates(
+            "<div class=\"lg:grid-cols-3 bg-brand-500 hover:shadow-soft bg-white/10 text-[11px] grid-cols-1 prose\">"
+        ))
+        css = assets.stylesheet(rules)
+        self.assertIn(".bg-brand-500{background-color:#10b981}", css)
+        self.assertIn(".hover\\:shadow-soft:hover{box-shadow:0 15px 60px rgba(15,23,42,0.08)}", css)
+        self.assertIn(".bg-white\\/10{background-color:rgb(255 255 255/0.1)}", css)
+        self.assertIn(".text-\\[11px\\]{font-size:11px}", css)
+        self.assertNotIn("prose", css)
+        # Responsive rules come last so they override the base ones.
+        self.assertLess(css.index(".grid-cols-1{"), css.index("@media (min-width:1024px){.lg\\:grid-cols-3{"))
+
+    def test_committed_stylesheet_matches_a_fresh_build(self):
+        self.assertNotIn(Path(settings.BASE_DIR, "shop", "tests.py"), assets.source_files())
+        committed = assets.static_dir() / assets.OUTPUT
+        with tempfile.TemporaryDirectory() as directory:
+            built = Path(directory, "app.css")
+            assets.build_css(output=built)
+            self.assertEqual(built.read_text(encoding="utf-8"), committed.read_text(encoding="utf-8"))
+
+    def test_build_refuses_to_ship_without_the_fonts(self):
+        with tempfile.TemporaryDirectory() as static, override_settings(STATICFILES_DIRS=[static]):
+            with self.assertRaisesMessage(CommandError, "Vazirmatn-Regular.woff2"):
+                call_command("build_assets", "--no-collect", stdout=StringIO())
+            with tempfile.TemporaryDirectory() as release:
+                for name in (*assets.FONT_FILES, assets.FONT_LICENSE):
+                    Path(release, "fonts", "webfonts", name).parent.mkdir(parents=True, exist_ok=True)
+                    Path(release, "fonts", "webfonts", name).write_bytes(b"font")
+                call_command("build_assets", "--no-collect", "--fonts-from", release, stdout=StringIO())
+            self.assertEqual(assets.missing_fonts(), [])
+            css = Path(static, assets.OUTPUT).read_text(encoding="utf-8")
+            self.assertEqual(css.count("@font-face"), len(assets.FONT_FILES))
+
+    def test_pages_make_no_third_party_requests(self):
+        html = self.client.get(reverse("shop:home")).content.decode()
+        self.assertNotIn("cdn.tailwindcss.com", html)
+        self.assertNotIn("fonts.googleapis.com", html)
+        self.assertIn("/static/css/app.css", html)
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            with tempfile.TemporaryDirectory() as source:
+                css = Path(source, "css", "app.css")
+                assets.build_css(output=css, sources=[Path(settings.BASE_DIR, "templates", "base.html")])
+                finders = ["django.contrib.staticfiles.finders.FileSystemFinder"]
+                with override_settings(STATICFILES_DIRS=[source], STATICFILES_FINDERS=finders):
+                    call_command("collectstatic", interactive=False, verbosity=0)
+            url = CompressedManifestStaticFilesStorage().url("css/app.css")
+            self.assertRegex(url, r"css/app\.[0-9a-f]{12}\.css$")
+            hashed = Path(root, url.split("/static/", 1)[1])
+            self.assertTrue(hashed.exists())
+            self.assertTrue(hashed.with_name(hashed.name + ".gz").exists())
+            self.assertTrue(Path(root, "staticfiles.json").exists())
+
+
+@override_settings(SHOP_READ_REPLICAS=["replica"], SHOP_REPLICA_PIN_SECONDS=30)
+class ReplicaRoutingTests(TransactionTestCase):
+    # The backup API cannot copy a database with a write transaction open, so
+    # this class commits its data.
+
+    def setUp(self):
+        category = Category.objects.create(name="کتاب", slug="books")
+        self.product = make_product(category, "snapshot-name", "10.00", slug="replicated")
+        get_user_model().objects.create_user("reader", "reader@example.com", "pass-12345")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.replica_path = Path(directory.name, "replica.sqlite3")
+        # A connection outside settings.DATABASES, which the test runner neither
+        # blocks nor flushes.
+        replica_settings = {
+            **connections["default"].settings_dict,
+            "NAME": f"file:{self.replica_path}?mode=ro",
+            "OPTIONS": {"uri": True},
+        }
+        connections["replica"] = load_backend(replica_settings["ENGINE"]).DatabaseWrapper(replica_settings, "replica")
+        self.addCleanup(connections.__delitem__, "replica")
+        self.addCleanup(lambda: connections["replica"].close())
+        routers.reset_health()
+        self.addCleanup(routers.reset_health)
+        call_command("sync_replica", database="replica", stdout=StringIO())
+        # Changed on the primary only, after the snapshot was taken.
+        Product.objects.filter(pk=self.product.pk).update(name="primary-name")
+        cache.set(CATALOG_VERSION_CACHE_KEY, 0, None)
+        CatalogVersion.objects.update(version=0)
+
+    def get_detail(self):
+        return self.client.get(self.product.get_absolute_url()).content.decode()
+
+    def test_catalog_reads_come_from_the_replica(self):
+        self.assertIn("snapshot-name", self.get_detail())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).name, "primary-name")
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        response = self.client.post(reverse("shop:login"), {"username": "reader", "password": "pass-12345"})
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertIn("primary-name", self.get_detail())
+        self.assertIn("snapshot-name", Client().get(self.product.get_absolute_url()).content.decode())
+
+    def test_recent_catalog_change_reads_from_the_primary(self):
+        bump_catalog_version()
+        self.assertIn("primary-name", self.get_detail())
+
+    def test_catalog_change_by_another_worker_reads_from_the_primary(self):
+        # That worker's local-memory cache is not this one's; only the row is shared.
+        CatalogVersion.objects.update(version=time.time_ns())
+        self.assertIn("primary-name", self.get_detail())
+
+    def test_broken_replica_falls_back_to_the_primary(self):
+        self.replica_path.unlink()
+        with self.assertLogs("shop.routers", "WARNING"):
+            self.assertIn("primary-name", self.get_detail())
+        self.assertFalse(routers.is_available("replica"))
+
+    def test_query_failing_on_the_replica_is_retried_on_the_primary(self):
+        routers.is_available("replica")  # passes and is not re-checked for a while
+        connections["replica"].close()
+        self.replica_path.unlink()
+        sqlite3.connect(self.replica_path).close()  # a valid file without tables
+        with self.assertLogs("shop.routers", "WARNING"):
+            response = self.client.get(self.product.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("primary-name", response.content.decode())
+        self.assertFalse(routers.is_available("replica"))
+
+
+class SqliteProfileTests(TestCase):
+    def test_connection_profile_is_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], settings.SHOP_SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+    def test_write_queue_times_out_while_held(self):
+        queue = WriteQueue()
+        self.assertTrue(queue.acquire(0))
+        self.assertFalse(queue.acquire(0.01))
+        queue.release()
+        self.assertTrue(queue.acquire(0))
+        queue.release()
+
+    def test_concurrent_writers_do_not_hit_lock_errors(self):
+        result = benchmarks.sqlite_write_load(benchmarks.sqlite_profiles()["tuned"], threads=4, transactions=10)
+        self.assertEqual(result.errors, 0)
+        self.assertEqual(len(result.timings_ms), 40)
+
+
+
+class TaskQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("buyer", "buyer@example.com", "pass-1234")
+        category = Category.objects.create(name="ورزش و سفر", slug="sport")
+        cls.tent = make_product(category, "tent", "100.00")
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.client.force_login(self.user)
+
+    def checkout(self):
+        self.client.post(reverse("shop:add_to_cart"), {"product_id": self.tent.id, "quantity": 2})
+        data = {
+            "full_name": "Sara M", "email": "buyer@example.com", "address": "Valiasr St",
+            "city": "Tehran", "postal_code": "1234567890", "country": "ایران",
+        }
+        self.client.post(reverse("shop:checkout"), data)
+        return Order.objects.latest("id")
+
+    def register(self, name, func, **kwargs):
+        tasks.register(name, **kwargs)(func)
+        self.addCleanup(tasks._handlers.pop, name)
+
+    def test_checkout_leaves_follow_ups_to_the_worker(self):
+        order = self.checkout()
+        self.assertFalse(ProductSales.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Task.objects.get().payload, {"order_id": order.id})
+
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(ProductSales.objects.get(product=self.tent).units, 2)
+        self.assertEqual(mail.outbox[0].to, ["buyer@example.com"])
+        self.assertIn(order.order_number, mail.outbox[0].subject)
+        # Recommendations are rebuilt once per SHOP_RECOMMENDATIONS_REBUILD_DELAY, not per order.
+        self.checkout()
+        tasks.run_pending()
+        self.assertEqual(list(Task.objects.values_list("name", flat=True)), ["rebuild_recommendations"])
+        totals = metrics.collect()
+        self.assertEqual(totals[("shop_tasks_total", (("task", "order_placed"), ("outcome", "done")))], 2)
+
+    def test_order_cancelled_before_the_worker_runs_is_never_counted(self):
+        order = self.checkout()
+        order.status = "cancelled"
+        order.save()
+        tasks.run_pending()
+        self.assertFalse(ProductSales.objects.filter(units__gt=0).exists())
+        order.status = "processing"
+        order.save()
+        tasks.enqueue("order_placed", {"order_id": order.id})
+        tasks.run_pending()
+        self.assertEqual(ProductSales.objects.get(product=self.tent).units, 2)
+
+    @override_settings(SHOP_TASK_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_stay_failed(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            raise RuntimeError("smtp down")
+
+        self.register("flaky", flaky)
+        tasks.enqueue("flaky")
+        with self.assertLogs("shop.tasks", "WARNING"):
+            tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts, task.last_error), ("queued", 1, "RuntimeError: smtp down"))
+        self.assertGreater(task.run_at, timezone.now())
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs("shop.tasks", "ERROR"):
+            tasks.run_pending()
+        self.assertEqual(Task.objects.get().status, "failed")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_expired_leases_are_claimed_again(self):
+        self.register("noop", lambda: None)
+        Task.objects.create(name="noop", status="running", locked_by="gone:1:0",
+                            locked_until=timezone.now() - timedelta(seconds=1))
+        Task.objects.create(name="noop", status="running", locked_by="busy:1:0",
+                            locked_until=timezone.now() + timedelta(minutes=5))
+        claimed = tasks.claim("worker", 10)
+        self.assertEqual([task.locked_by.split(":")[0] for task in claimed], ["worker"])
+        self.assertEqual(claimed[0].attempts, 1)
+
+    @override_settings(SHOP_METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_metrics_report_queue_depth_and_lag(self):
+        self.register("noop", lambda: None)
+        tasks.enqueue("noop")
+        Task.objects.update(run_at=timezone.now() - timedelta(seconds=30))
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('shop_task_queue_depth{status="queued"} 1', body)
+        lag = float(re.search(r"^shop_task_queue_lag_seconds (\S+)$", body, re.M)[1])
+        self.assertGreaterEqual(lag, 30)
+
+
+class BulkEditTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pass-1234")
+        cls.digital = Category.objects.create(name="کالای دیجیتال", slug="digital")
+        cls.sport = Category.objects.create(name="ورزش و سفر", slug="sport")
+        cls.phones = [make_product(cls.digital, f"phone-{i}", "240000") for i in range(5)]
+        cls.tent = make_product(cls.sport, "tent", "90000", compare_at_price=Decimal("100000"))
+
+    def setUp(self):
+        cache.clear()
+
+    def prices(self, *names):
+        rows = Product.objects.filter(name__in=names).order_by("name")
+        return [(row.price, row.compare_at_price) for row in rows]
+
+    def test_repricing_moves_both_prices_in_chunks_and_refreshes_caches_once(self):
+        bump_catalog_version()
+        version = cache.get(CATALOG_VERSION_CACHE_KEY)
+        before = get_product_versions([self.tent.id])
+        # Two statements per chunk (ids, UPDATE), then the facet rebuild.
+        with CaptureQueriesContext(connection) as ctx:
+            updated = bulk.reprice(Product.objects.all(), percent=Decimal("10"), chunk_size=2)
+        self.assertEqual(updated, 6)
+        self.assertEqual(sum(q["sql"].startswith("UPDATE") for q in ctx.captured_queries), 3)
+        self.assertEqual(self.prices("phone-0", "tent"), [
+            (Decimal("264000.00"), None), (Decimal("99000.00"), Decimal("110000.00")),
+        ])
+        self.assertGreater(cache.get(CATALOG_VERSION_CACHE_KEY), version)
+        self.assertNotEqual(get_product_versions([self.tent.id]), before)
+        self.assertGreater(Product.objects.get(name="tent").updated_at, self.tent.updated_at)
+        self.assertEqual(FacetCount.objects.get(category=self.digital).bucket,
+                         facets.bucket_for(Decimal("264000")))
+
+        bulk.reprice(Product.objects.filter(category=self.sport), amount=Decimal("-5000"), round_to=Decimal("1000"))
+        self.assertEqual(self.prices("tent"), [(Decimal("94000.00"), Decimal("105000.00"))])
+        # A compare_at_price that is not above the price is dropped.
+        Product.objects.filter(name="tent").update(compare_at_price=Decimal("94000"))
+        bulk.reprice(Product.objects.filter(name="tent"), percent=Decimal("0.5"))
+        self.assertEqual(self.prices("tent"), [(Decimal("94470.00"), None)])
+
+    def test_sale_starts_from_the_regular_price_and_ends_on_it(self):
+        bulk.start_sale(Product.objects.all(), Decimal("25"))
+        self.assertEqual(self.prices("phone-0", "tent"), [
+            (Decimal("180000.00"), Decimal("240000.00")), (Decimal("75000.00"), Decimal("100000.00")),
+        ])
+        self.assertEqual(bulk.end_sale(Product.objects.all()), 6)
+        self.assertEqual(self.prices("phone-0", "tent"), [
+            (Decimal("240000.00"), None), (Decimal("100000.00"), None),
+        ])
+        self.assertEqual(bulk.end_sale(Product.objects.all()), 0)
+
+    def test_admin_actions_cover_the_filtered_changelist(self):
+        self.client.force_login(self.admin)
+        url = reverse("admin:shop_product_changelist") + f"?category__id__exact={self.digital.id}"
+        data = {"action": "start_sale", "index": 0, "select_across": 1, "_selected_action": [self.phones[0].id]}
+        response = self.client.post(url, data)
+        self.assertContains(response, "5 محصول")
+        response = self.client.post(url, {**data, "apply": 1, "percent": "10"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.prices("phone-4", "tent"), [
+            (Decimal("216000.00"), Decimal("240000.00")), (Decimal("90000.00"), Decimal("100000.00")),
+        ])
+
+        self.client.post(url, {"action": "deactivate", "index": 0, "_selected_action": [self.phones[0].id]})
+        self.assertEqual(list(Product.objects.filter(is_active=False).values_list("name", flat=True)), ["phone-0"])
+        self.assertEqual(FacetCount.objects.get(category=self.digital).count, 4)
+
+    def test_activation_updates_the_search_index(self):
+        bulk.set_active(Product.objects.filter(name__startswith="phone"), False, chunk_size=2)
+        self.assertEqual(search.search_product_ids("phone"), [])
+        bulk.set_active(Product.objects.all(), True, chunk_size=2)
+        self.assertEqual(sorted(search.search_product_ids("phone")), sorted(p.id for p in self.phones))
+
+    def test_command_scopes_by_category(self):
+        out = StringIO()
+        call_command("bulk_edit_products", "--category", "sport", "--percent", "-10", stdout=out)
+        self.assertIn("Updated 1 products", out.getvalue())
+        self.assertEqual(self.prices("phone-0", "tent"), [
+            (Decimal("240000.00"), None), (Decimal("81000.00"), Decimal("90000.00")),
+        ])
+        with self.assertRaises(CommandError):
+            call_command("bulk_edit_products", "--category", "nope", "--deactivate", stdout=StringIO())
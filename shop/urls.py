@@ -1,15 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 
-from . import views
+from . import async_views, views
 
 app_name = "shop"
 
-urlpatterns = [
-    path("", views.home, name="home"),
-    path("shop/", views.product_list, name="product_list"),
-    path("shop/<slug:slug>/", views.product_detail, name="product_detail"),
-    path("cart/", views.cart_view, name="cart"),
+
+def catalog_patterns(use_async: bool):
+    """The pages that have async versions; ``use_async`` picks which set is routed."""
+    catalog = async_views if use_async else views
+    return [
+        path("", catalog.home, name="home"),
+        path("shop/", catalog.product_list, name="product_list"),
+        path("shop/<slug:slug>/", catalog.product_detail, name="product_detail"),
+        path("cart/", catalog.cart_view, name="cart"),
+    ]
+
+
+common_patterns = [
     path("cart/add/", views.add_to_cart, name="add_to_cart"),
     path("cart/update/", views.update_cart, name="update_cart"),
     path("cart/remove/", views.remove_from_cart, name="remove_from_cart"),
@@ -39,3 +48,5 @@ urlpatterns = [
         name="password_reset_complete",
     ),
 ]
+
+urlpatterns = catalog_patterns(getattr(settings, "SHOP_ASYNC_VIEWS", False)) + common_patterns
@@ -1,28 +1,92 @@
+import time
 from decimal import Decimal, ROUND_HALF_UP
 from typing import List, Tuple
 
-from .models import Product
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+
+from .models import CatalogVersion, Product
+from .sessions import PROCESS_LOCAL_CACHES
+
+CART_SUMMARY_SESSION_KEY = "cart_summary"
+CATALOG_VERSION_CACHE_KEY = "shop:catalog_version"
 
 
 def get_cart(session) -> dict:
-    return session.get("cart", {})
+    """The cart as ``{"<product id>": quantity}``.
+
+    Carts saved in the older ``{"<product id>": {"quantity": n}}`` form are read
+    too and written back compactly on the next change.
+    """
+    return _compact(session.get("cart", {}))
+
+
+async def aget_cart(session) -> dict:
+    return _compact(await session.aget("cart", {}))
+
+
+def _compact(cart: dict) -> dict:
+    return {pid: qty["quantity"] if isinstance(qty, dict) else qty for pid, qty in cart.items()}
+
+
+async def alist(queryset) -> list:
+    return [obj async for obj in queryset]
 
 
 def save_cart(request, cart: dict):
     request.session["cart"] = cart
+    request.session.pop(CART_SUMMARY_SESSION_KEY, None)
     request.session.modified = True
 
 
-def get_cart_items(request) -> Tuple[List[dict], Decimal, Decimal, Decimal, Decimal]:
+def get_catalog_version() -> int:
+    return cache.get_or_set(CATALOG_VERSION_CACHE_KEY, time.time_ns, None)
+
+
+def bump_catalog_version():
+    version = time.time_ns()
+    cache.set(CATALOG_VERSION_CACHE_KEY, version, None)
+    CatalogVersion.objects.bulk_create(
+        [CatalogVersion(pk=1, version=version)], update_conflicts=True, unique_fields=["id"], update_fields=["version"]
+    )
+
+
+def catalog_changed_at() -> int:
+    """When any worker last bumped the catalog version, in ns since the epoch; 0 if none has.
+
+    A local-memory ``default`` cache only holds this process's bumps, so the
+    ``CatalogVersion`` row is read then; a shared cache is read as usual.
+    """
+    if not isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES):
+        return get_catalog_version()
+    return CatalogVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+
+def get_cart_items(request, lock: bool = False) -> Tuple[List[dict], Decimal, Decimal, Decimal, Decimal]:
     cart = get_cart(request.session)
-    product_ids = [int(pid) for pid in cart.keys()]
-    products = Product.objects.filter(id__in=product_ids, is_active=True).select_related("category").prefetch_related("gallery")
+    products = _cart_products(cart)
+    if lock:
+        products = products.select_for_update(of=("self",))
+    return _cart_lines(cart, list(products))
+
+
+async def aget_cart_items(request) -> Tuple[List[dict], Decimal, Decimal, Decimal, Decimal]:
+    cart = await aget_cart(request.session)
+    return _cart_lines(cart, await alist(_cart_products(cart)))
+
+
+def _cart_products(cart: dict):
+    # Sorting in SQL would need a temp B-tree; _cart_lines keeps the cart's order instead.
+    return Product.objects.filter(id__in=[int(pid) for pid in cart], is_active=True).select_related("category").order_by()
+
+
+def _cart_lines(cart: dict, products: List[Product]):
+    product_ids = [int(pid) for pid in cart]
+    products = sorted(products, key=lambda product: product_ids.index(product.id))
 
     items = []
     subtotal = Decimal("0.00")
     for product in products:
-        data = cart.get(str(product.id), {})
-        quantity = int(data.get("quantity", 1))
+        quantity = int(cart.get(str(product.id), 1))
         price = product.price
         line_total = (price * quantity).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         subtotal += line_total
@@ -35,6 +99,11 @@ def get_cart_items(request) -> Tuple[List[dict], Decimal, Decimal, Decimal, Deci
             }
         )
 
+    subtotal, shipping, tax, total = calculate_totals(subtotal)
+    return items, subtotal, shipping, tax, total
+
+
+def calculate_totals(subtotal: Decimal) -> Tuple[Decimal, Decimal, Decimal, Decimal]:
     subtotal = subtotal.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
     if subtotal == Decimal("0.00"):
         shipping = Decimal("0.00")
@@ -43,5 +112,66 @@ def get_cart_items(request) -> Tuple[List[dict], Decimal, Decimal, Decimal, Deci
         shipping = Decimal("0.00") if subtotal >= Decimal("200") else Decimal("9.00")
         tax = (subtotal * Decimal("0.09")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
     total = (subtotal + shipping + tax).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return subtotal, shipping, tax, total
 
-    return items, subtotal, shipping, tax, total
+
+def _summary(items: List[dict], subtotal: Decimal, total: Decimal) -> dict:
+    return {
+        "count": sum(item["quantity"] for item in items),
+        "subtotal": str(subtotal),
+        "total": str(total),
+        "version": get_catalog_version(),
+    }
+
+
+def _public_summary(summary: dict) -> dict:
+    return {
+        "count": summary["count"],
+        "subtotal": Decimal(summary["subtotal"]),
+        "total": Decimal(summary["total"]),
+    }
+
+
+EMPTY_CART_SUMMARY = {"count": 0, "subtotal": Decimal("0.00"), "total": Decimal("0.00")}
+
+
+def store_cart_summary(request, items: List[dict], subtotal: Decimal, total: Decimal) -> dict:
+    """Remember count/subtotal/total in the session, tagged with the catalog version."""
+    summary = _summary(items, subtotal, total)
+    if get_cart(request.session) and request.session.get(CART_SUMMARY_SESSION_KEY) != summary:
+        request.session[CART_SUMMARY_SESSION_KEY] = summary
+    return summary
+
+
+async def astore_cart_summary(request, items: List[dict], subtotal: Decimal, total: Decimal) -> dict:
+    summary = _summary(items, subtotal, total)
+    if await aget_cart(request.session) and await request.session.aget(CART_SUMMARY_SESSION_KEY) != summary:
+        await request.session.aset(CART_SUMMARY_SESSION_KEY, summary)
+    return summary
+
+
+def get_cart_summary(request) -> dict:
+    """Cart count and totals for the navbar without touching the products table.
+
+    The summary is recomputed only when the cart changed (``save_cart`` drops it)
+    or when the catalog version moved on because a product was edited.
+    """
+    if not get_cart(request.session):
+        return dict(EMPTY_CART_SUMMARY)
+
+    summary = request.session.get(CART_SUMMARY_SESSION_KEY)
+    if not summary or summary.get("version") != get_catalog_version():
+        items, subtotal, shipping, tax, total = get_cart_items(request)
+        summary = store_cart_summary(request, items, subtotal, total)
+    return _public_summary(summary)
+
+
+async def aget_cart_summary(request) -> dict:
+    if not await aget_cart(request.session):
+        return dict(EMPTY_CART_SUMMARY)
+
+    summary = await request.session.aget(CART_SUMMARY_SESSION_KEY)
+    if not summary or summary.get("version") != get_catalog_version():
+        items, subtotal, shipping, tax, total = await aget_cart_items(request)
+        summary = await astore_cart_summary(request, items, subtotal, total)
+    return _public_summary(summary)
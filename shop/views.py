@@ -3,86 +3,160 @@ from decimal import Decimal
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.views.decorators.http import require_POST
 
+from . import conditional, facets, fragments, recommendations, search, tasks
 from .forms import CheckoutForm, RegisterForm, LoginForm
 from .models import Category, Product, Order, OrderItem
-from .utils import get_cart, save_cart, get_cart_items
+from .pagination import KeysetPaginator, cached_count
+from .utils import get_cart, save_cart, get_cart_items, catalog_changed_at, store_cart_summary
 
 
-def home(request):
-    categories = Category.objects.all()[:6]
-    featured_products = Product.objects.filter(is_active=True).order_by("-created_at")[:8]
-    best_sellers = Product.objects.filter(is_active=True).order_by("price")[:8]
-    return render(
-        request,
-        "shop/home.html",
-        {
-            "categories": categories,
-            "featured_products": featured_products,
-            "best_sellers": best_sellers,
-        },
+def home_page_validators(request, sections):
+    # Best sellers come from sales, not the catalog version, so their ids are part of the tag.
+    return conditional.page_validators(
+        request, "home", catalog_changed_at(), *(product.id for product in sections["best_sellers"])
     )
 
 
-def product_list(request):
-    products = Product.objects.filter(is_active=True).select_related("category")
-    categories = Category.objects.all()
+def home_validators(request):
+    request.home_sections = fragments.get_home_sections()
+    return home_page_validators(request, request.home_sections)
+
+
+@conditional.conditional_page(home_validators)
+def home(request):
+    sections = getattr(request, "home_sections", None) or fragments.get_home_sections()
+    return render(request, "shop/home.html", sections)
 
+
+PRODUCT_ORDERINGS = {
+    "newest": ("-created_at", "id"),
+    "price_asc": ("price", "id"),
+    "price_desc": ("-price", "id"),
+}
+
+
+def product_list_params(request):
+    """``(query, category_slug, price_bucket, sort, ordering)`` for the catalog listing."""
     query = request.GET.get("q", "")
     category_slug = request.GET.get("category", "")
+    price_bucket = facets.parse_bucket(request.GET.get("price"))
     sort = request.GET.get("sort", "")
+    if sort in PRODUCT_ORDERINGS:
+        ordering = PRODUCT_ORDERINGS[sort]
+    elif query and search.is_enabled():
+        ordering = ("search_rank", "id")
+    else:
+        ordering = PRODUCT_ORDERINGS["newest"]
+    return query, category_slug, price_bucket, sort, ordering
 
+
+def filter_products(products, query: str, category_slug: str, price_bucket=None):
     if query:
-        products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        products = search.search_products(products, query, category_slug=category_slug)
     if category_slug:
         products = products.filter(category__slug=category_slug)
+    if price_bucket is not None:
+        products = products.filter(facets.price_filter(price_bucket))
+    return products
+
+
+def product_list_context(page_obj, total_count, categories, facet_rows, query, category_slug, price_bucket, sort):
+    category_id = next((category.id for category in categories if category.slug == category_slug), None)
+    facet = facets.summarize(facet_rows, categories, category_id, price_bucket)
+    return {
+        "page_obj": page_obj,
+        "total_count": total_count,
+        "category_facets": facet["categories"],
+        "price_facets": facet["prices"],
+        "query": query,
+        "category_slug": category_slug,
+        "price_bucket": price_bucket,
+        "sort": sort,
+    }
+
+
+def product_list_validators(request):
+    # Everything on a listing (rows, counts, facets) changes with the catalog version.
+    version = catalog_changed_at()
+    return conditional.page_validators(
+        request, "list", request.get_full_path(), version, last_modified=conditional.catalog_last_modified(version),
+    )
 
-    if sort == "price_asc":
-        products = products.order_by("price")
-    elif sort == "price_desc":
-        products = products.order_by("-price")
-    elif sort == "newest":
-        products = products.order_by("-created_at")
-
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
 
-    return render(
-        request,
-        "shop/product_list.html",
-        {
-            "page_obj": page_obj,
-            "categories": categories,
-            "query": query,
-            "category_slug": category_slug,
-            "sort": sort,
-        },
+@conditional.conditional_page(product_list_validators)
+def product_list(request):
+    query, category_slug, price_bucket, sort, ordering = product_list_params(request)
+    products = filter_products(
+        Product.objects.filter(is_active=True).select_related("category"), query, category_slug, price_bucket
     )
 
+    cursor = request.GET.get("cursor")
+    page_obj = KeysetPaginator(products, ordering, per_page=12).get_page(cursor)
+    total_count = None
+    if not cursor:
+        key = f"product_list:{category_slug}:{price_bucket}:{search.normalize(query)}"
+        total_count = cached_count(products, key)
 
-def product_detail(request, slug):
-    product = get_object_or_404(
-        Product.objects.select_related("category").prefetch_related("gallery"),
-        slug=slug,
-        is_active=True,
+    context = product_list_context(
+        page_obj, total_count, list(Category.objects.all()), facets.facet_rows(query),
+        query, category_slug, price_bucket, sort,
+    )
+    return render(request, "shop/product_list.html", context)
+
+
+def detail_product(slug):
+    try:
+        return Product.objects.select_related("category").prefetch_related("gallery").get(slug=slug, is_active=True)
+    except Product.DoesNotExist:
+        return None
+
+
+def product_detail_validators(request, slug):
+    """Validators from the product, its gallery, its category and the related cards.
+
+    The objects are kept on the request so a full render does not load them again.
+    """
+    product = request.detail_product = detail_product(slug)
+    if product is None:
+        return None, None
+    related = request.related_products = recommendations.for_product(product)
+    gallery = product.gallery.all()
+    changed = max(
+        [
+            product.updated_at,
+            product.category.updated_at,
+            *(image.updated_at for image in gallery),
+            *(item.updated_at for item in related),
+        ]
     )
-    related = (
-        Product.objects.filter(category=product.category, is_active=True)
-        .exclude(id=product.id)
-        .order_by("-created_at")[:4]
+    # The ids catch what leaves ``changed`` alone: a deleted image, a move to an older category.
+    return conditional.page_validators(
+        request, "product", product.id, product.category_id, changed.isoformat(),
+        [image.id for image in gallery], [item.id for item in related], last_modified=changed,
     )
+
+
+@conditional.conditional_page(product_detail_validators)
+def product_detail(request, slug):
+    product = getattr(request, "detail_product", None)
+    if product is None:
+        product = get_object_or_404(
+            Product.objects.select_related("category").prefetch_related("gallery"),
+            slug=slug,
+            is_active=True,
+        )
+    related = getattr(request, "related_products", None)
     return render(
         request,
         "shop/product_detail.html",
         {
             "product": product,
-            "related": related,
+            "related": recommendations.for_product(product) if related is None else related,
         },
     )
 
@@ -94,8 +168,7 @@ def add_to_cart(request):
     product = get_object_or_404(Product, id=product_id, is_active=True)
 
     cart = get_cart(request.session)
-    current_qty = cart.get(str(product.id), {}).get("quantity", 0)
-    cart[str(product.id)] = {"quantity": current_qty + max(quantity, 1)}
+    cart[str(product.id)] = cart.get(str(product.id), 0) + max(quantity, 1)
     save_cart(request, cart)
 
     messages.success(request, f"«{product.name}» به سبد خرید افزوده شد.")
@@ -113,7 +186,7 @@ def update_cart(request):
             cart.pop(product_id)
             messages.info(request, "محصول از سبد حذف شد.")
         else:
-            cart[product_id]["quantity"] = quantity
+            cart[product_id] = quantity
             messages.success(request, "تعداد به‌روزرسانی شد.")
         save_cart(request, cart)
     return redirect("shop:cart")
@@ -132,10 +205,18 @@ def remove_from_cart(request):
 
 def cart_view(request):
     items, subtotal, shipping, tax, total = get_cart_items(request)
+    store_cart_summary(request, items, subtotal, total)
     return render(
         request,
         "shop/cart.html",
-        {"items": items, "subtotal": subtotal, "shipping": shipping, "tax": tax, "total": total},
+        {
+            "items": items,
+            "subtotal": subtotal,
+            "shipping": shipping,
+            "tax": tax,
+            "total": total,
+            "recommended": recommendations.for_cart(item["product"] for item in items),
+        },
     )
 
 
@@ -149,24 +230,36 @@ def checkout(request):
     if request.method == "POST":
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            order: Order = form.save(commit=False)
-            order.user = request.user
-            order.subtotal = subtotal
-            order.shipping = shipping
-            order.tax = tax
-            order.total = total
-            order.save()
-
-            for item in items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item["product"],
-                    name=item["product"].name,
-                    price=item["price"],
-                    quantity=item["quantity"],
+            with transaction.atomic():
+                # Re-read prices under a row lock so the order matches what is charged.
+                items, subtotal, shipping, tax, total = get_cart_items(request, lock=True)
+                if not items:
+                    messages.warning(request, "سبد خرید شما خالی است.")
+                    return redirect("shop:product_list")
+                order: Order = form.save(commit=False)
+                order.user = request.user
+                order.subtotal = subtotal
+                order.shipping = shipping
+                order.tax = tax
+                order.total = total
+                order.save()
+
+                OrderItem.objects.bulk_create(
+                    [
+                        OrderItem(
+                            order=order,
+                            product=item["product"],
+                            name=item["product"].name,
+                            price=item["price"],
+                            quantity=item["quantity"],
+                        )
+                        for item in items
+                    ]
                 )
+                # Sales figures, the confirmation email and the rest run in ``run_worker``.
+                tasks.enqueue("order_placed", {"order_id": order.id})
 
-            request.session["cart"] = {}
+            save_cart(request, {})
             messages.success(request, "سفارش شما ثبت شد.")
             return redirect("shop:checkout_success", order_id=order.id)
     else:
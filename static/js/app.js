@@ -36,7 +36,12 @@
   qsa('#thumbs .thumb').forEach(btn => {
     btn.addEventListener('click', ()=>{
       const src = btn.dataset.src;
-      if(src && mainImage){ mainImage.src = src; }
+      if(src && mainImage){
+        mainImage.srcset = btn.dataset.srcset || '';
+        const webp = mainImage.parentElement.querySelector('source[type="image/webp"]');
+        if (webp) webp.srcset = btn.dataset.webpSrcset || src;
+        mainImage.src = src;
+      }
       qsa('#thumbs .thumb').forEach(b=>b.classList.remove('border-emerald-500','active'));
       btn.classList.add('border-emerald-500','active');
     });